@@ -20,6 +20,8 @@
     cutoffs: null,
     search: "",
     sort: { key: null, asc: true },
+    searchIndex: {},
+    changeWindow: "run",
   };
 
   function $(sel) { return document.querySelector(sel); }
@@ -32,6 +34,7 @@
     tableWrap: function () { return $(".table-wrap"); },
     metaInfo: function () { return $("#meta-info"); },
     search: function () { return $("#search"); },
+    changeWindow: function () { return $("#change-window"); },
   };
 
   function formatDate(iso) {
@@ -83,8 +86,9 @@
   function buildRow(entry) {
     var wr = entry.winrate || 0;
     var tr = document.createElement("tr");
-    var rankChange = changeBadge(entry.rkd, false);
-    var ratingChange = changeBadge(entry.rd, false);
+    var change = changeFor(entry);
+    var rankChange = changeBadge(change.rkd, false);
+    var ratingChange = changeBadge(change.rd, false);
     tr.innerHTML =
       '<td class="col-rank ' + rankClass(entry.rank) + '">' + entry.rank + rankChange + "</td>" +
       '<td class="col-name ' + factionClass(entry.faction) + '"><a class="char-link char-name" href="detail.html?name=' + encodeURIComponent(entry.name) + '&realm=' + encodeURIComponent(entry.realm) + '">' + esc(entry.name) + "</a></td>" +
@@ -96,19 +100,237 @@
     return tr;
   }
 
-  function getFiltered() {
-    var entries = state.data[state.bracket] || [];
-    var q = state.search.toLowerCase().trim();
+  // --- Search index (scripts/search_index.py) ---
+
+  var CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ";
+  var JUNGSUNG = ["ㅏ", "ㅐ", "ㅑ", "ㅒ", "ㅓ", "ㅔ", "ㅕ", "ㅖ", "ㅗ", "ㅗㅏ", "ㅗㅐ", "ㅗㅣ", "ㅛ", "ㅜ",
+    "ㅜㅓ", "ㅜㅔ", "ㅜㅣ", "ㅠ", "ㅡ", "ㅡㅣ", "ㅣ"];
+  var JONGSUNG = ["", "ㄱ", "ㄲ", "ㄱㅅ", "ㄴ", "ㄴㅈ", "ㄴㅎ", "ㄷ", "ㄹ", "ㄹㄱ", "ㄹㅁ", "ㄹㅂ", "ㄹㅅ",
+    "ㄹㅌ", "ㄹㅍ", "ㄹㅎ", "ㅁ", "ㅂ", "ㅂㅅ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"];
+  var COMPOUND_JAMO = {
+    "ㄳ": "ㄱㅅ", "ㄵ": "ㄴㅈ", "ㄶ": "ㄴㅎ", "ㄺ": "ㄹㄱ", "ㄻ": "ㄹㅁ", "ㄼ": "ㄹㅂ", "ㄽ": "ㄹㅅ",
+    "ㄾ": "ㄹㅌ", "ㄿ": "ㄹㅍ", "ㅀ": "ㄹㅎ", "ㅄ": "ㅂㅅ", "ㅘ": "ㅗㅏ", "ㅙ": "ㅗㅐ", "ㅚ": "ㅗㅣ",
+    "ㅝ": "ㅜㅓ", "ㅞ": "ㅜㅔ", "ㅟ": "ㅜㅣ", "ㅢ": "ㅡㅣ"
+  };
+
+  function decomposeJamo(text) {
+    var out = "";
+    for (var i = 0; i < text.length; i++) {
+      var code = text.charCodeAt(i);
+      if (code >= 0xac00 && code <= 0xd7a3) {
+        var idx = code - 0xac00;
+        out += CHOSUNG[Math.floor(idx / 588)] + JUNGSUNG[Math.floor((idx % 588) / 28)] + JONGSUNG[idx % 28];
+      } else {
+        out += COMPOUND_JAMO[text[i]] || text[i];
+      }
+    }
+    return out;
+  }
+
+  function chosungOf(text) {
+    var out = "";
+    var hangul = false;
+    for (var i = 0; i < text.length; i++) {
+      var code = text.charCodeAt(i);
+      if (code >= 0xac00 && code <= 0xd7a3) {
+        out += CHOSUNG[Math.floor((code - 0xac00) / 588)];
+        hangul = true;
+      } else {
+        out += text[i];
+      }
+    }
+    return hangul ? out : null;
+  }
+
+  var SEARCH_FIELDS = ["name", "guild", "class", "realm_name"];
+
+  function addSuffixes(keys, chars) {
+    for (var i = 0; i < chars.length; i++) keys[chars.slice(i).join("")] = true;
+  }
+
+  // Same keys as search_index.entry_keys(): every suffix of each decomposed token.
+  function entryKeys(entry) {
+    var keys = {};
+    for (var f = 0; f < SEARCH_FIELDS.length; f++) {
+      var value = (entry[SEARCH_FIELDS[f]] || "").normalize("NFC").toLowerCase();
+      var tokens = value.split(/\s+/).filter(Boolean);
+      if (tokens.length > 1) tokens.push(tokens.join(""));
+      for (var t = 0; t < tokens.length; t++) {
+        var chars = Array.from(tokens[t]);
+        addSuffixes(keys, chars.map(decomposeJamo));
+        var initials = chosungOf(tokens[t]);
+        if (initials) addSuffixes(keys, Array.from(initials));
+      }
+    }
+    return Object.keys(keys);
+  }
+
+  function queryTokens(query) {
+    return query.normalize("NFC").toLowerCase().split(/\s+/).filter(Boolean).map(decomposeJamo);
+  }
+
+  function lowerBound(keys, target) {
+    var lo = 0, hi = keys.length;
+    while (lo < hi) {
+      var mid = (lo + hi) >>> 1;
+      if (keys[mid] < target) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+  }
+
+  // Sorted, de-duplicated positions of entries with a key starting with `prefix`.
+  function lookupPrefix(index, prefix) {
+    var keys = index.keys;
+    var ids = [];
+    for (var i = lowerBound(keys, prefix); i < keys.length && keys[i].lastIndexOf(prefix, 0) === 0; i++) {
+      var posting = index.postings[i];
+      for (var j = 0; j < posting.length; j++) ids.push(posting[j]);
+    }
+    ids.sort(function (a, b) { return a - b; });
+    var out = [];
+    for (var k = 0; k < ids.length; k++) {
+      if (k === 0 || ids[k] !== ids[k - 1]) out.push(ids[k]);
+    }
+    return out;
+  }
+
+  function intersectSorted(a, b) {
+    var out = [];
+    var i = 0, j = 0;
+    while (i < a.length && j < b.length) {
+      if (a[i] === b[j]) { out.push(a[i]); i++; j++; }
+      else if (a[i] < b[j]) i++;
+      else j++;
+    }
+    return out;
+  }
+
+  // Every whitespace-separated query token must prefix-match some key of the
+  // entry, i.e. appear anywhere in one of its tokens.
+  function searchIds(index, query) {
+    var tokens = queryTokens(query);
+    var result = null;
+    for (var t = 0; t < tokens.length; t++) {
+      var ids = lookupPrefix(index, tokens[t]);
+      result = result ? intersectSorted(result, ids) : ids;
+    }
+    return result || [];
+  }
+
+  var searchIndexRequested = {};
+
+  function loadSearchIndex(bracket) {
+    if (searchIndexRequested[bracket]) return;
+    var bm = state.meta && state.meta.brackets && state.meta.brackets[bracket];
+    var info = bm && bm.search;
+    if (!info) return;
+    searchIndexRequested[bracket] = true;
+
+    var load = info.gzip && typeof DecompressionStream !== "undefined"
+      ? fetchBytes(DATA_BASE + "/" + info.gzip).then(parseMaybeGzip)
+      : fetchJSON(DATA_BASE + "/" + info.file);
+    load.then(function (index) {
+      if (!index || index.v !== 2 || index.digest !== info.digest) return;
+      var winrate = index.order.winrate;
+      var rank = new Array(winrate.length);
+      for (var i = 0; i < winrate.length; i++) rank[winrate[i]] = i;
+      index.winrateRank = rank;
+      state.searchIndex[bracket] = index;
+      filterCache.key = null;
+      if (bracket === state.bracket && (state.search.trim() || state.sort.key)) render();
+    }).catch(function () { /* keep scanning */ });
+  }
+
+  // --- Rating trends (scripts/rating_history.py) ---
+
+  var trendsRequested = {};
+
+  // <bracket>.trends.json lists each window's changes in leaderboard order;
+  // they are attached to the entries as entry.trend[window] = {rd, rkd}.
+  function loadTrends(bracket) {
+    if (trendsRequested[bracket]) return;
+    var bm = state.meta && state.meta.brackets && state.meta.brackets[bracket];
+    var info = bm && bm.trends;
+    if (!info) return;
+    trendsRequested[bracket] = true;
+
+    fetchJSON(DATA_BASE + "/" + info.file).then(function (doc) {
+      var entries = state.data[bracket] || [];
+      if (!doc || doc.v !== 1 || doc.digest !== info.digest || doc.count !== entries.length) return;
+      for (var i = 0; i < entries.length; i++) {
+        var trend = {};
+        for (var w in doc.windows) {
+          trend[w] = { rd: doc.windows[w].rd[i], rkd: doc.windows[w].rkd[i] };
+        }
+        entries[i].trend = trend;
+      }
+      if (bracket === state.bracket && state.changeWindow !== "run") render();
+    }).catch(function () { /* keep last-run changes */ });
+  }
+
+  // rd/rkd are the change since the previous run; other windows come from the trends file.
+  function changeFor(entry) {
+    if (state.changeWindow === "run") return entry;
+    return (entry.trend && entry.trend[state.changeWindow]) || {};
+  }
+
+  // ``list`` in descending order of ``value`` turned ascending: runs of equal
+  // values are reversed as a whole but keep their own order, as the stable
+  // sort in filterByScan does.
+  function ascendingRuns(list, value) {
+    var out = [];
+    var end = list.length;
+    while (end > 0) {
+      var v = value(list[end - 1]);
+      var start = end - 1;
+      while (start > 0 && value(list[start - 1]) === v) start--;
+      for (var i = start; i < end; i++) out.push(list[i]);
+      end = start;
+    }
+    return out;
+  }
+
+  // Entries are stored in rating order, so only a winrate sort reorders them.
+  function filterWithIndex(index, entries, q) {
+    var order = q ? searchIds(index, q) : null;
+    var key = state.sort.key;
+    if (key === "winrate") {
+      if (order) {
+        var rank = index.winrateRank;
+        order = order.slice().sort(function (a, b) { return rank[a] - rank[b]; });
+      } else {
+        order = index.order.winrate;
+      }
+    }
+    var out;
+    if (!order) {
+      out = entries;
+    } else {
+      out = new Array(order.length);
+      for (var i = 0; i < order.length; i++) out[i] = entries[order[i]];
+    }
+    if (key && state.sort.asc) {
+      out = ascendingRuns(out, function (e) { return e[key] || 0; });
+    }
+    return out;
+  }
+
+  var scanKeys = new WeakMap();
 
+  // Matches exactly what searchIds() finds in the index, from per-entry keys.
+  function filterByScan(entries, q) {
+    var tokens = queryTokens(q);
     var filtered = entries;
-    if (q) {
+    if (tokens.length) {
       filtered = entries.filter(function (e) {
-        return (
-          (e.name && e.name.toLowerCase().indexOf(q) !== -1) ||
-          (e.guild && e.guild.toLowerCase().indexOf(q) !== -1) ||
-          (e["class"] && e["class"].toLowerCase().indexOf(q) !== -1) ||
-          (e.realm_name && e.realm_name.toLowerCase().indexOf(q) !== -1)
-        );
+        var keys = scanKeys.get(e);
+        if (!keys) {
+          keys = entryKeys(e);
+          scanKeys.set(e, keys);
+        }
+        return tokens.every(function (token) {
+          return keys.some(function (k) { return k.lastIndexOf(token, 0) === 0; });
+        });
       });
     }
 
@@ -130,6 +352,24 @@
     return filtered;
   }
 
+  var filterCache = { key: null, entries: null, result: null };
+
+  // Uses the bracket's search index once it has loaded; scans until then.
+  function getFiltered() {
+    var entries = state.data[state.bracket] || [];
+    var q = state.search.trim();
+    var key = [state.bracket, q, state.sort.key, state.sort.asc].join("\n");
+    if (filterCache.key === key && filterCache.entries === entries) return filterCache.result;
+
+    if (q || state.sort.key) loadSearchIndex(state.bracket);
+    var index = state.searchIndex[state.bracket];
+    var result = index && index.count === entries.length
+      ? filterWithIndex(index, entries, q)
+      : filterByScan(entries, q);
+    filterCache = { key: key, entries: entries, result: result };
+    return result;
+  }
+
   function getTotalPages(filtered) {
     return Math.max(1, Math.ceil(filtered.length / PAGE_SIZE));
   }
@@ -157,6 +397,7 @@
     var end = Math.min(start + PAGE_SIZE, filtered.length);
     var pageItems = filtered.slice(start, end);
 
+    if (state.changeWindow !== "run") loadTrends(state.bracket);
     var fragment = document.createDocumentFragment();
     for (var i = 0; i < pageItems.length; i++) {
       fragment.appendChild(buildRow(pageItems[i]));
@@ -306,18 +547,183 @@
     });
   }
 
+  function fetchBytes(url) {
+    var bustUrl = url + (url.indexOf("?") === -1 ? "?" : "&") + "_t=" + Date.now();
+    return fetch(bustUrl).then(function (resp) {
+      if (!resp.ok) throw new Error("HTTP " + resp.status);
+      return resp.arrayBuffer();
+    });
+  }
+
+  // Pages serves .gz files as-is, so they are inflated here. If a server
+  // already decoded them (Content-Encoding: gzip) the gzip magic is gone.
+  function parseMaybeGzip(buf) {
+    var head = new Uint8Array(buf, 0, Math.min(2, buf.byteLength));
+    if (head[0] !== 0x1f || head[1] !== 0x8b) {
+      return Promise.resolve(JSON.parse(new TextDecoder().decode(buf)));
+    }
+    var stream = new Blob([buf]).stream().pipeThrough(new DecompressionStream("gzip"));
+    return new Response(stream).text().then(JSON.parse);
+  }
+
+  var DICT_FIELDS = ["realm", "realm_name", "class", "race", "faction", "guild"];
+  var VALUE_FIELDS = ["name", "rating", "won", "lost", "played", "winrate", "rank", "rd", "rkd"];
+
+  // Columnar <bracket>.c.json (scripts/compact_output.py) back to entry objects.
+  function decodeCompact(doc) {
+    if (!doc || doc.v !== 1) throw new Error("unknown compact format");
+    var cols = doc.cols;
+    var entries = new Array(doc.count);
+    for (var i = 0; i < doc.count; i++) {
+      var e = {};
+      for (var d = 0; d < DICT_FIELDS.length; d++) {
+        var f = DICT_FIELDS[d];
+        e[f] = doc.dicts[f][cols[f][i]];
+      }
+      for (var v = 0; v < VALUE_FIELDS.length; v++) {
+        e[VALUE_FIELDS[v]] = cols[VALUE_FIELDS[v]][i];
+      }
+      entries[i] = e;
+    }
+    return entries;
+  }
+
+  function fetchFullLeaderboard(bm, bracket) {
+    var legacyUrl = DATA_BASE + "/" + ((bm && bm.file) || bracket + ".json");
+    var compact = bm && bm.compact;
+    if (!compact) return fetchJSON(legacyUrl);
+
+    var load = compact.gzip && typeof DecompressionStream !== "undefined"
+      ? fetchBytes(DATA_BASE + "/" + compact.gzip).then(parseMaybeGzip)
+      : fetchJSON(DATA_BASE + "/" + compact.file);
+    return load.then(decodeCompact).catch(function () { return fetchJSON(legacyUrl); });
+  }
+
+  // --- Cached leaderboards + delta patches (scripts/leaderboard_patch.py) ---
+
+  var CACHE_DB = "arena-leaderboard";
+  var CACHE_STORE = "brackets";
+  var cacheDB = null;
+
+  function openCache() {
+    if (cacheDB) return cacheDB;
+    cacheDB = new Promise(function (resolve, reject) {
+      if (typeof indexedDB === "undefined") { reject(new Error("no IndexedDB")); return; }
+      var req = indexedDB.open(CACHE_DB, 1);
+      req.onupgradeneeded = function () { req.result.createObjectStore(CACHE_STORE); };
+      req.onsuccess = function () { resolve(req.result); };
+      req.onerror = function () { reject(req.error); };
+    });
+    return cacheDB;
+  }
+
+  function cacheRequest(mode, fn) {
+    return openCache().then(function (db) {
+      return new Promise(function (resolve, reject) {
+        var req = fn(db.transaction(CACHE_STORE, mode).objectStore(CACHE_STORE));
+        req.onsuccess = function () { resolve(req.result); };
+        req.onerror = function () { reject(req.error); };
+      });
+    });
+  }
+
+  function cacheGet(bracket) {
+    return cacheRequest("readonly", function (s) { return s.get(bracket); }).catch(function () { return null; });
+  }
+
+  function cachePut(bracket, version, entries) {
+    return cacheRequest("readwrite", function (s) {
+      return s.put({ version: version, entries: entries }, bracket);
+    }).catch(function () { /* cache is optional */ });
+  }
+
+  // Patches leading from version `from` to `to`, or null if the chain doesn't reach back that far.
+  function patchChain(patches, from, to) {
+    for (var i = 0; i < (patches || []).length; i++) {
+      if (patches[i].from !== from) continue;
+      var chain = patches.slice(i);
+      return chain[chain.length - 1].to === to ? chain : null;
+    }
+    return null;
+  }
+
+  function entryKey(e) { return e.realm + "/" + e.name; }
+
+  // Same steps as apply_patch() in scripts/leaderboard_patch.py.
+  function applyPatch(entries, patch) {
+    if (!patch || patch.v !== 1) throw new Error("unknown patch format");
+    var gone = {}, oldRank = {}, i;
+    patch.removed.forEach(function (k) { gone[k[0] + "/" + k[1]] = true; });
+    patch.upsert.forEach(function (u) { gone[entryKey(u[1])] = true; });
+    var rest = [];
+    for (i = 0; i < entries.length; i++) {
+      oldRank[entryKey(entries[i])] = entries[i].rank;
+      if (!gone[entryKey(entries[i])]) rest.push(entries[i]);
+    }
+    var out = new Array(patch.count), upserted = {};
+    patch.upsert.forEach(function (u) { out[u[0]] = u[1]; upserted[u[0]] = true; });
+    var next = 0, rank = 0;
+    for (i = 0; i < out.length; i++) {
+      if (!upserted[i]) {
+        if (next >= rest.length) throw new Error("patch does not fit");
+        var e = Object.assign({}, rest[next++]);
+        delete e.trend;
+        if (!patch.carry) {
+          delete e.rd;
+          delete e.rkd;
+        }
+        out[i] = e;
+      }
+      if (i === 0 || out[i].rating !== out[i - 1].rating) rank = i + 1;
+      if (!upserted[i]) {
+        var rkd = oldRank[entryKey(out[i])] - rank;
+        out[i].rank = rank;
+        if (rkd && !patch.carry) out[i].rkd = rkd;
+      }
+    }
+    if (next !== rest.length) throw new Error("patch does not fit");
+    return out;
+  }
+
+  // Brings the cached copy up to date with the patches in meta.json when it
+  // is at most PATCH_CHAIN versions behind; otherwise downloads the full file.
+  function fetchLeaderboard(bracket) {
+    var bm = state.meta && state.meta.brackets && state.meta.brackets[bracket];
+    if (!bm || !bm.version) return fetchFullLeaderboard(bm, bracket);
+
+    return cacheGet(bracket).then(function (cached) {
+      if (cached && cached.version === bm.version) return cached.entries;
+      var chain = cached && patchChain(bm.patches, cached.version, bm.version);
+      if (!chain) throw new Error("cache too old");
+      return Promise.all(chain.map(function (p) { return fetchJSON(DATA_BASE + "/" + p.file); }))
+        .then(function (patches) {
+          var entries = patches.reduce(applyPatch, cached.entries);
+          cachePut(bracket, bm.version, entries);
+          return entries;
+        });
+    }).catch(function () {
+      return fetchFullLeaderboard(bm, bracket).then(function (entries) {
+        cachePut(bracket, bm.version, entries);
+        return entries;
+      });
+    });
+  }
+
   function loadData() {
     showLoading(true);
-    var promises = [fetchJSON(DATA_BASE + "/meta.json")];
-    BRACKETS.forEach(function (b) {
-      promises.push(fetchJSON(DATA_BASE + "/" + b + ".json").catch(function () { return []; }));
-    });
-    promises.push(fetchJSON(DATA_BASE + "/cutoffs.json").catch(function () { return null; }));
+    var cutoffs = fetchJSON(DATA_BASE + "/cutoffs.json").catch(function () { return null; });
 
-    Promise.all(promises).then(function (results) {
-      state.meta = results[0];
-      BRACKETS.forEach(function (b, i) { state.data[b] = results[i + 1]; });
-      state.cutoffs = results[BRACKETS.length + 1];
+    // meta.json says which brackets have compact files, so it is read first.
+    fetchJSON(DATA_BASE + "/meta.json").then(function (meta) {
+      state.meta = meta;
+      var promises = BRACKETS.map(function (b) {
+        return fetchLeaderboard(b).catch(function () { return []; });
+      });
+      promises.push(cutoffs);
+      return Promise.all(promises);
+    }).then(function (results) {
+      BRACKETS.forEach(function (b, i) { state.data[b] = results[i]; });
+      state.cutoffs = results[BRACKETS.length];
     }).catch(function () {
       state.meta = null;
       BRACKETS.forEach(function (b) { state.data[b] = []; });
@@ -401,6 +807,7 @@
 
   function initSearch() {
     var timer;
+    els.search().addEventListener("focus", function () { loadSearchIndex(state.bracket); });
     els.search().addEventListener("input", function (e) {
       clearTimeout(timer);
       timer = setTimeout(function () {
@@ -411,6 +818,15 @@
     });
   }
 
+  function initChangeWindow() {
+    var select = els.changeWindow();
+    if (!select) return;
+    select.addEventListener("change", function () {
+      state.changeWindow = this.value;
+      render();
+    });
+  }
+
   function initSort() {
     var ths = $$(".leaderboard th.sortable");
     for (var i = 0; i < ths.length; i++) {
@@ -465,6 +881,7 @@
     initTabs();
     initSearch();
     initSort();
+    initChangeWindow();
     initModal();
     initPagination();
     loadData();
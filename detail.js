@@ -5,7 +5,9 @@
   var SUPABASE_ANON_KEY = "";
   var CONFIG_PATH = "config/supabase.json";
   var ALL_CHARS_PATH = "data/all_characters.json";
+  var SHARDS_DIR = "data/characters";
   var TALENT_DEFS_PATH = "data/talent_defs.json";
+  var ATLAS_DIR = "icons/atlas";
 
   var BRACKET_COLORS = {
     "2v2": { line: "#58a6ff", bg: "rgba(88,166,255,0.1)" },
@@ -104,7 +106,34 @@
     return snaps || [];
   }
 
+  // 32-bit FNV-1a over UTF-8 bytes, same as scripts/character_shards.py.
+  function fnv1a32(text) {
+    var bytes = new TextEncoder().encode(text);
+    var h = 0x811c9dc5;
+    for (var i = 0; i < bytes.length; i++) {
+      h ^= bytes[i];
+      h = Math.imul(h, 0x01000193) >>> 0;
+    }
+    return h;
+  }
+
+  // Shards are content-addressed, so only the small index is cache-busted.
+  async function loadFromShard(name, realm) {
+    var index = await fetchJSON(SHARDS_DIR + "/index.json");
+    if (!index || index.v !== 1) throw new Error("unknown shard index");
+    var key = realm + "/" + name.toLowerCase();
+    var file = index.shards[fnv1a32(key) % index.buckets];
+    if (!file) return null;
+    var resp = await fetch(SHARDS_DIR + "/" + file);
+    if (!resp.ok) throw new Error("HTTP " + resp.status);
+    var shard = await resp.json();
+    return shard[key] || null;
+  }
+
   async function loadCharacterExtras(name, realm) {
+    try {
+      return await loadFromShard(name, realm);
+    } catch (e) { /* no shards yet: fall back to the full file */ }
     try {
       var all = await fetchJSON(ALL_CHARS_PATH);
       var nameLower = name.toLowerCase();
@@ -200,6 +229,45 @@
     return null;
   }
 
+  // --- Icon sprites ---
+
+  var iconAtlases = null;
+
+  // Atlas images are content-addressed; only the class map is cache-busted.
+  async function loadIconAtlases(className) {
+    iconAtlases = null;
+    if (!talentDefs) return;
+    for (var key in talentDefs) {
+      if (talentDefs[key].ko !== className) continue;
+      try {
+        var map = await fetchJSON(ATLAS_DIR + "/" + key.toLowerCase() + ".json");
+        if (map && map.v === 1) iconAtlases = map;
+      } catch (e) { /* no atlases built: single icon files */ }
+      return;
+    }
+  }
+
+  function spritePercent(offset, size, cell) {
+    return (size > cell ? offset / (size - cell) * 100 : 0) + "%";
+  }
+
+  // Cell of the class atlas when the icon is in it, otherwise icons/<name>.jpg.
+  function iconTag(kind, name, cls, label) {
+    var atlas = iconAtlases && iconAtlases.atlases[kind];
+    var pos = atlas && atlas.icons[name];
+    if (!pos) {
+      return '<img' + (cls ? ' class="' + cls + '"' : '') + ' src="icons/' + esc(name) + '.jpg" alt="' +
+        esc(label || "") + '" loading="lazy" />';
+    }
+    var cell = iconAtlases.cell;
+    var style = "background-image:url('" + ATLAS_DIR + "/" + atlas.file + "');" +
+      "background-size:" + (atlas.width / cell * 100) + "% " + (atlas.height / cell * 100) + "%;" +
+      "background-position:" + spritePercent(pos[0], atlas.width, cell) + " " +
+      spritePercent(pos[1], atlas.height, cell);
+    return '<span class="' + (cls ? cls + " " : "") + 'icon-sprite" role="img" aria-label="' +
+      esc(label || "") + '" style="' + style + '"></span>';
+  }
+
   function findTreeDef(classDef, treeName) {
     if (!classDef) return null;
     for (var i = 0; i < classDef.trees.length; i++) {
@@ -359,7 +427,7 @@
         node.style.gridColumn = String(col);
 
         node.innerHTML =
-          '<img src="icons/' + def.icon + '.jpg" alt="' + esc(def.name) + '" loading="lazy" />' +
+          iconTag("talents", def.icon, "", def.name) +
           '<span class="talent-rank-label">' + curRank + '/' + maxRank + '</span>';
 
         node._talentDef = def;
@@ -388,9 +456,8 @@
         tree.points + '</span></div><div class="talent-list-fallback">';
       for (var j = 0; j < tree.talents.length; j++) {
         var t = tree.talents[j];
-        var iconSrc = t.icon ? 'icons/' + t.icon + '.jpg' : '';
         html += '<div class="talent-fb-item">';
-        if (iconSrc) html += '<img src="' + iconSrc + '" class="talent-fb-icon" />';
+        if (t.icon) html += iconTag("talents", t.icon, "talent-fb-icon", "");
         html += '<span>' + esc(t.name) + '</span><span class="talent-fb-rank">' + t.rank + '</span></div>';
       }
       html += '</div>';
@@ -476,12 +543,13 @@
       div.className = "equip-item";
 
       var iconHtml = '';
-      if (item.icon && itemUrl) {
+      var iconName = item.icon ? item.icon.replace(/^.*\//, "").replace(/\.jpg$/, "") : "";
+      if (iconName && itemUrl) {
         iconHtml = '<a href="' + itemUrl + '" data-wowhead="domain=ko.tbc" target="_blank">' +
-          '<img class="equip-icon ' + borderClass + '" src="' + esc(item.icon) + '" alt="" loading="lazy" />' +
+          iconTag("gear", iconName, "equip-icon " + borderClass, "") +
           '</a>';
-      } else if (item.icon) {
-        iconHtml = '<img class="equip-icon ' + borderClass + '" src="' + esc(item.icon) + '" alt="" loading="lazy" />';
+      } else if (iconName) {
+        iconHtml = iconTag("gear", iconName, "equip-icon " + borderClass, "");
       } else {
         iconHtml = '<div class="equip-icon equip-icon-empty ' + borderClass + '"></div>';
       }
@@ -642,6 +710,7 @@
     var configured = await configPromise;
     var extras = await extrasPromise;
     await talentDefsPromise;
+    var atlasPromise = loadIconAtlases((extras && extras["class"]) || "");
 
     var char = null;
     var snapshots = [];
@@ -674,6 +743,7 @@
       renderHistory(snapshots, state.activeBracket);
     }
 
+    await atlasPromise;
     renderEquipment(extras);
     renderTalents(extras);
 
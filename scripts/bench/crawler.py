@@ -0,0 +1,182 @@
+"""Benchmark the full fetch_leaderboard.py pipeline against a local fake Battle.net.
+
+Each size gets a fresh copy of scripts/ in a temp directory (so data/, icons/
+and .cache/ are written there, not into the repo) and a FakeBattleNet with
+that many characters. main() runs in a child process pointed at the fake
+server, ``--runs`` times in the same tree, so later runs measure the
+steady state (response cache, change gating, non-arena index).
+
+Reports wall time, requests per second, peak RSS of the crawler process
+and Battle.net API calls per character. With --baseline, exits 1 if wall
+time or calls per character regressed by more than --max-regression.
+
+    python scripts/bench/crawler.py --sizes 1000,10000 --runs 2 -- --engine async --change-gated
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_bnet import FakeBattleNet
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+# Endpoint classes served on behalf of kr.api.blizzard.com.
+API_ENDPOINTS = {"roster", "profile", "pvp-bracket", "specializations", "equipment", "media",
+                 "item-media", "pvp-reward"}
+
+
+def _child(tree: str, base_url: str, api_rate: float, result_path: str, main_args: list[str]):
+    """Run fetch_leaderboard.main() from ``tree`` against ``base_url`` (child process)."""
+    import resource
+
+    sys.path.insert(0, os.path.join(tree, "scripts"))
+    import fetch_leaderboard as fl
+    from rate_limiter import RateLimiter
+
+    fl.API_BASE = base_url
+    fl.OAUTH_URL = f"{base_url}/token"
+    fl.WOWHEAD_ICON_CDN = f"{base_url}/icons/medium"
+    fl.WOWHEAD_TOOLTIP = f"{base_url}/tooltip/spell"
+    # 0 lifts the quota so the run measures the crawler, not the limiter.
+    rate = api_rate if api_rate > 0 else 1e9
+    fl.bnet_limiter = RateLimiter("battle.net", rate, headroom=1.0)
+    fl.wowhead_limiter = RateLimiter("wowhead", rate, headroom=1.0)
+
+    fl.main(main_args)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}, f)
+
+
+def make_tree(fake: FakeBattleNet) -> Path:
+    tree = Path(tempfile.mkdtemp(prefix="bench-crawler-"))
+    shutil.copytree(SCRIPTS_DIR, tree / "scripts",
+                    ignore=shutil.ignore_patterns("bench", "__pycache__"))
+    (tree / "config").mkdir()
+    (tree / "data").mkdir()
+    with open(tree / "config" / "sources.json", "w", encoding="utf-8") as f:
+        json.dump({"guilds": fake.guilds, "characters": []}, f)
+    return tree
+
+
+def run_once(fake: FakeBattleNet, tree: Path, run: int, args) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env.update(BLIZZARD_CLIENT_ID="bench", BLIZZARD_CLIENT_SECRET="bench")
+    result_path = tree / f"result-{run}.json"
+    log_path = tree / f"run-{run}.log"
+
+    fake.reset_counts()
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", str(tree), fake.base_url, str(args.api_rate),
+             str(result_path), *args.main_args],
+            stdout=log, stderr=subprocess.STDOUT, env=env,
+        )
+    wall = time.monotonic() - started
+    counts = fake.reset_counts()
+    if proc.returncode != 0:
+        raise RuntimeError(f"run {run} at {fake.characters} characters failed, see {log_path}")
+
+    with open(result_path, "r", encoding="utf-8") as f:
+        child = json.load(f)
+    api_calls = sum(n for kind, n in counts.items() if kind in API_ENDPOINTS)
+    return {
+        "characters": fake.characters,
+        "run": run,
+        "wall_seconds": round(wall, 2),
+        "requests": sum(counts.values()),
+        "requests_per_second": round(sum(counts.values()) / wall, 1),
+        "api_calls_per_character": round(api_calls / fake.characters, 3),
+        "peak_rss_mb": round(child["peak_rss_kb"] / 1024, 1),
+        "by_endpoint": dict(sorted(counts.items())),
+    }
+
+
+def compare(results: list[dict], baseline: list[dict], max_regression: float) -> list[str]:
+    """Regressions of ``results`` against ``baseline`` beyond ``max_regression``."""
+    base = {(r["characters"], r["run"]): r for r in baseline}
+    failures = []
+    for r in results:
+        b = base.get((r["characters"], r["run"]))
+        if not b:
+            continue
+        for metric in ("wall_seconds", "api_calls_per_character"):
+            if b[metric] and r[metric] > b[metric] * (1 + max_regression):
+                failures.append(f"{r['characters']} characters, run {r['run']}: {metric} "
+                                f"{b[metric]} -> {r[metric]} (+{r[metric] / b[metric] - 1:.0%})")
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--child":
+        return _child(argv[1], argv[2], float(argv[3]), argv[4], argv[5:])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000",
+                        help="comma-separated character counts")
+    parser.add_argument("--runs", type=int, default=1, help="consecutive runs per size")
+    parser.add_argument("--per-guild", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--api-rate", type=float, default=0,
+                        help="requests/second allowed by the rate limiters (0: unlimited)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    parser.add_argument("--keep", action="store_true", help="keep the temp trees")
+    parser.add_argument("main_args", nargs=argparse.REMAINDER,
+                        help="arguments for fetch_leaderboard.py, after --")
+    args = parser.parse_args(argv)
+    if args.main_args[:1] == ["--"]:
+        args.main_args = args.main_args[1:]
+
+    results = []
+    print(f"{'characters':>10} {'run':>3} {'wall s':>9} {'req/s':>9} {'calls/char':>10} "
+          f"{'peak RSS MB':>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        fake = FakeBattleNet(size, args.per_guild, args.latency, args.error_rate,
+                             args.rate_429).start()
+        tree = make_tree(fake)
+        try:
+            for run in range(1, args.runs + 1):
+                r = run_once(fake, tree, run, args)
+                results.append(r)
+                print(f"{r['characters']:>10} {r['run']:>3} {r['wall_seconds']:>9.1f} "
+                      f"{r['requests_per_second']:>9.1f} {r['api_calls_per_character']:>10.3f} "
+                      f"{r['peak_rss_mb']:>11.1f}")
+        finally:
+            fake.stop()
+            if args.keep:
+                print(f"  tree kept at {tree}")
+            else:
+                shutil.rmtree(tree, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"main_args": args.main_args, "latency": args.latency,
+                       "error_rate": args.error_rate, "rate_429": args.rate_429,
+                       "api_rate": args.api_rate, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures = compare(results, json.load(f)["results"], args.max_regression)
+        if failures:
+            print("\nRegressions:")
+            for line in failures:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regression beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Local stand-in for the Battle.net OAuth/API, Wowhead tooltip and icon CDN hosts.
+
+Serves a deterministic synthetic realm: ``characters`` level-70 characters
+spread over guilds of ``per_guild`` members (plus a few low-level members the
+crawler filters out). Every response can be delayed, failed with a 500 or
+refused with a 429. JSON responses carry ETags and honour
+``If-None-Match`` like the real API.
+
+    python scripts/bench/fake_bnet.py --characters 1000 --port 8765
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+REALM = "fengus-ferocity"
+REALM_NAME = "펜구스의 흉포"
+CLASSES = ["전사", "도적", "사냥꾼", "마법사", "흑마법사", "사제", "드루이드", "주술사", "성기사"]
+RACES = ["인간", "드워프", "나이트 엘프", "노움", "드레나이", "오크", "언데드", "타우렌", "트롤", "블러드 엘프"]
+SLOTS = ["HEAD", "NECK", "SHOULDER", "BACK", "CHEST", "WRIST", "HANDS", "WAIST", "LEGS", "FEET",
+         "FINGER_1", "FINGER_2", "TRINKET_1", "TRINKET_2", "MAIN_HAND", "OFF_HAND", "RANGED"]
+ITEM_POOL = 800
+SPELL_POOL = 400
+
+ROSTER_RE = re.compile(r"^/data/wow/guild/([^/]+)/bench-guild-(\d+)/roster$")
+CHARACTER_RE = re.compile(r"^/profile/wow/character/([^/]+)/bench(\d+)(/.*)?$")
+ITEM_MEDIA_RE = re.compile(r"^/data/wow/media/item/(\d+)$")
+TOOLTIP_RE = re.compile(r"^/tooltip/spell/(\d+)$")
+
+
+class FakeBattleNet:
+    """Synthetic data plus a threaded HTTP server; ``base_url`` stands in for every host.
+
+    ``arena_share`` of characters have a rating in at least one bracket; the
+    rest get 404 for every pvp-bracket request. Guild slugs are
+    ``bench-guild-<n>`` and character names ``bench<id>``.
+    """
+
+    def __init__(self, characters: int, per_guild: int = 100, latency: float = 0.02,
+                 error_rate: float = 0.0, rate_429: float = 0.0, arena_share: float = 0.6,
+                 seed: int = 0, port: int = 0):
+        self.characters = characters
+        self.per_guild = per_guild
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.arena_share = arena_share
+        self.seed = seed
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def guilds(self) -> list[dict]:
+        count = -(-self.characters // self.per_guild)
+        return [{"name": f"bench-guild-{i}", "realm": REALM} for i in range(count)]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeBattleNet":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self) -> Counter:
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+    # -- synthetic data ------------------------------------------------------
+
+    def _char_rng(self, char_id: int, salt: str = "") -> random.Random:
+        return random.Random(f"{self.seed}/{char_id}/{salt}")
+
+    def roster(self, guild: int) -> dict | None:
+        first = guild * self.per_guild + 1
+        if first > self.characters:
+            return None
+        members = []
+        for char_id in range(first, min(first + self.per_guild, self.characters + 1)):
+            members.append({"character": {"name": f"bench{char_id}", "id": char_id, "level": 70,
+                                          "realm": {"slug": REALM}}})
+        # Alts below the level cut and the guild master of the previous guild
+        # (a cross-guild duplicate) are filtered out by the crawler.
+        for i in range(max(1, self.per_guild // 10)):
+            alt_id = 10_000_000 + guild * 1000 + i
+            members.append({"character": {"name": f"bench{alt_id}", "id": alt_id, "level": 60,
+                                          "realm": {"slug": REALM}}})
+        if guild:
+            dup = first - self.per_guild
+            members.append({"character": {"name": f"bench{dup}", "id": dup, "level": 70,
+                                          "realm": {"slug": REALM}}})
+        return {"members": members}
+
+    def profile(self, char_id: int) -> dict:
+        rng = self._char_rng(char_id)
+        return {
+            "id": char_id,
+            "name": f"bench{char_id}",
+            "level": 70,
+            "realm": {"name": REALM_NAME, "slug": REALM},
+            "character_class": {"name": rng.choice(CLASSES)},
+            "race": {"name": rng.choice(RACES)},
+            "faction": {"type": rng.choice(["HORDE", "ALLIANCE"])},
+            "guild": {"name": f"bench-guild-{(char_id - 1) // self.per_guild}"},
+        }
+
+    def pvp_bracket(self, char_id: int, bracket: str) -> dict | None:
+        rng = self._char_rng(char_id, bracket)
+        if self._char_rng(char_id).random() >= self.arena_share or rng.random() < 0.3:
+            return None
+        won, lost = rng.randint(0, 300), rng.randint(0, 300)
+        return {
+            "bracket": {"type": f"ARENA_{bracket.upper()}"},
+            "rating": rng.randint(1200, 2600),
+            "season": {"id": 1},
+            "season_match_statistics": {"won": won, "lost": lost, "played": won + lost},
+        }
+
+    def specializations(self, char_id: int) -> dict:
+        rng = self._char_rng(char_id, "spec")
+        groups = []
+        for active in (True, False):
+            specs = []
+            for tree in range(3):
+                talents = [{"talent_rank": rng.randint(1, 5),
+                            "spell_tooltip": {"spell": {"name": f"talent-{sid}", "id": sid}}}
+                           for sid in rng.sample(range(1, SPELL_POOL + 1), rng.randint(3, 15))]
+                specs.append({"specialization_name": f"tree-{tree}",
+                              "spent_points": sum(t["talent_rank"] for t in talents),
+                              "talents": talents})
+            groups.append({"is_active": active, "specializations": specs})
+        return {"specialization_groups": groups}
+
+    def equipment(self, char_id: int) -> dict:
+        rng = self._char_rng(char_id, "equipment")
+        items = []
+        for slot in SLOTS:
+            item_id = rng.randint(1, ITEM_POOL)
+            items.append({
+                "slot": {"type": slot, "name": slot.lower()},
+                "item": {"id": item_id},
+                "name": f"item-{item_id}",
+                "quality": {"type": "EPIC", "name": "영웅"},
+                "enchantments": [{"display_string": "+10 회복력",
+                                  "enchantment_slot": {"type": "PERMANENT"}}],
+            })
+        return {"equipped_items": items}
+
+    def media(self, char_id: int) -> dict:
+        return {"assets": [{"key": "avatar", "value": f"{self.base_url}/avatar/{char_id}.jpg"}]}
+
+    def route(self, path: str) -> tuple[str, dict | bytes | None]:
+        """(endpoint class, body) for ``path``; a None body is a 404."""
+        if path == "/token":
+            return "oauth", {"access_token": "bench-token", "token_type": "bearer", "expires_in": 86399}
+        m = ROSTER_RE.match(path)
+        if m:
+            return "roster", self.roster(int(m.group(2)))
+        m = CHARACTER_RE.match(path)
+        if m:
+            char_id, sub = int(m.group(2)), m.group(3) or ""
+            if char_id > self.characters:
+                return "profile", None
+            if sub == "":
+                return "profile", self.profile(char_id)
+            if sub.startswith("/pvp-bracket/"):
+                return "pvp-bracket", self.pvp_bracket(char_id, sub.rsplit("/", 1)[-1])
+            if sub == "/specializations":
+                return "specializations", self.specializations(char_id)
+            if sub == "/equipment":
+                return "equipment", self.equipment(char_id)
+            if sub == "/character-media":
+                return "media", self.media(char_id)
+            return "other", None
+        m = ITEM_MEDIA_RE.match(path)
+        if m:
+            return "item-media", {"assets": [{"key": "icon",
+                                              "value": f"https://x/icons/inv_{m.group(1)}.jpg"}]}
+        m = TOOLTIP_RE.match(path)
+        if m:
+            return "tooltip", {"icon": f"Spell_Bench_{m.group(1)}"}
+        if path.startswith("/icons/"):
+            return "icon", b"\xff\xd8\xff\xe0bench"
+        if path.startswith("/data/wow/pvp-season/"):
+            return "pvp-reward", {"rewards": []}
+        return "other", None
+
+    # -- HTTP ----------------------------------------------------------------
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: bytes = b"", headers: dict | None = None):
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body and self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _serve(self):
+                path = unquote(urlparse(self.path).path)
+                if self.command == "POST":
+                    self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                kind, body = fake.route(path)
+                with fake._lock:
+                    fake.counts[kind] += 1
+                    roll = fake._rng.random()
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if kind != "oauth":
+                    if roll < fake.rate_429:
+                        return self._send(429, headers={"Retry-After": "1"})
+                    if roll < fake.rate_429 + fake.error_rate:
+                        return self._send(500)
+                if body is None:
+                    return self._send(404, b"{}", {"Content-Type": "application/json"})
+                if isinstance(body, bytes):
+                    return self._send(200, body, {"Content-Type": "image/jpeg"})
+                raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                etag = '"%s"' % hashlib.md5(raw).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, headers={"ETag": etag})
+                self._send(200, raw, {"Content-Type": "application/json", "ETag": etag})
+
+            do_GET = _serve
+            do_POST = _serve
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--characters", type=int, default=1000)
+    parser.add_argument("--per-guild", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    fake = FakeBattleNet(args.characters, args.per_guild, args.latency, args.error_rate,
+                         args.rate_429, port=args.port)
+    print(f"Serving {args.characters} characters in {len(fake.guilds)} guilds at {fake.base_url}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
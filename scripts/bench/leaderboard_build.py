@@ -0,0 +1,163 @@
+"""Benchmark building every bracket's leaderboard against the original build.
+
+Generates a synthetic character list plus a previous run's leaderboard files
+in a scratch data directory, then times the original build (one pass over
+every character dict per bracket, previous file loaded as full entries)
+against build_leaderboards(), and checks both produce the same entries.
+With --compact, build_leaderboards() reads previous ranks from the
+compact files, which is where its gain comes from.
+
+    python scripts/bench/leaderboard_build.py --characters 100000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.stdout.reconfigure(encoding="utf-8")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fetch_leaderboard as fl  # noqa: E402
+
+CLASSES = ["전사", "도적", "사냥꾼", "마법사", "흑마법사", "사제", "드루이드", "주술사", "성기사"]
+REALMS = [("fengus-ferocity", "펜구스의 흉포"), ("moldars-moxie", "몰다르의 투지")]
+
+
+def legacy_build_leaderboard(all_pvp_data: list[dict], bracket: str) -> list[dict]:
+    """build_leaderboard() as it originally was, kept as the reference."""
+    prev_map = {}
+    path = fl.DATA_DIR / f"{bracket}.json"
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            prev_map = {(e["name"], e["realm"]): e for e in json.load(f)}
+
+    entries = []
+    for char in all_pvp_data:
+        bdata = char.get("brackets", {}).get(bracket)
+        if not bdata or bdata["rating"] == 0:
+            continue
+        total = bdata["won"] + bdata["lost"]
+        winrate = (bdata["won"] / total * 100) if total > 0 else 0
+        entries.append({
+            "name": char["name"],
+            "realm": char["realm"],
+            "realm_name": char.get("realm_name", ""),
+            "class": char.get("class", ""),
+            "race": char.get("race", ""),
+            "faction": char.get("faction", ""),
+            "guild": char.get("guild", ""),
+            "rating": bdata["rating"],
+            "won": bdata["won"],
+            "lost": bdata["lost"],
+            "played": bdata["played"],
+            "winrate": round(winrate, 1),
+        })
+
+    entries.sort(key=lambda x: x["rating"], reverse=True)
+
+    rank = 1
+    for i, entry in enumerate(entries):
+        if i > 0 and entry["rating"] < entries[i - 1]["rating"]:
+            rank = i + 1
+        entry["rank"] = rank
+
+        key = (entry["name"], entry["realm"])
+        prev = prev_map.get(key)
+        if prev:
+            rating_diff = entry["rating"] - prev.get("rating", 0)
+            if rating_diff != 0:
+                entry["rd"] = rating_diff
+            rank_diff = prev.get("rank", 0) - entry["rank"]
+            if rank_diff != 0:
+                entry["rkd"] = rank_diff
+
+    return entries
+
+
+def synthetic_characters(count: int, seed: int, churn: float = 0.0, base=None) -> list[dict]:
+    """``count`` characters; with ``base``, a later run where ``churn`` of the ratings moved."""
+    rng = random.Random(seed)
+    if base is not None:
+        chars = json.loads(json.dumps(base))
+        for char in chars:
+            for bdata in char["brackets"].values():
+                if rng.random() < churn:
+                    delta = rng.randint(-25, 25)
+                    bdata["rating"] = max(0, bdata["rating"] + delta)
+                    bdata["won" if delta > 0 else "lost"] += 1
+                    bdata["played"] += 1
+        return chars
+
+    chars = []
+    for i in range(count):
+        realm, realm_name = rng.choice(REALMS)
+        brackets = {}
+        for bracket in fl.BRACKETS:
+            if rng.random() < 0.4:
+                continue
+            won, lost = rng.randint(0, 300), rng.randint(0, 300)
+            brackets[bracket] = {"rating": rng.choice([0, rng.randint(1000, 2600)]) if rng.random() < 0.05
+                                 else rng.randint(1000, 2600),
+                                 "won": won, "lost": lost, "played": won + lost}
+        chars.append({
+            "name": f"bench{i}", "realm": realm, "realm_name": realm_name,
+            "class": rng.choice(CLASSES), "race": "오크", "faction": rng.choice(["HORDE", "ALLIANCE"]),
+            "guild": f"guild-{rng.randint(0, count // 50)}", "brackets": brackets,
+        })
+    return chars
+
+
+def time_build(fn, runs: int) -> tuple[float, dict]:
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--characters", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--churn", type=float, default=0.2,
+                        help="share of bracket ratings that changed since the previous run")
+    parser.add_argument("--compact", action="store_true",
+                        help="also write the previous run's compact files and load ranks from them")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="leaderboard-bench-") as tmp:
+        fl.DATA_DIR = Path(tmp)
+        print(f"Generating {args.characters} characters...")
+        previous = synthetic_characters(args.characters, seed=1)
+        current = synthetic_characters(args.characters, seed=2, churn=args.churn, base=previous)
+
+        meta = {"brackets": {}}
+        for bracket, leaderboard in fl.build_leaderboards(previous).items():
+            meta["brackets"][bracket] = fl.write_leaderboard(bracket, leaderboard, compact=args.compact)
+        with open(fl.DATA_DIR / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        legacy_s, legacy = time_build(
+            lambda: {b: legacy_build_leaderboard(current, b) for b in fl.BRACKETS}, args.runs)
+        current_s, built = time_build(lambda: fl.build_leaderboards(current), args.runs)
+
+    for bracket in fl.BRACKETS:
+        if legacy[bracket] != built[bracket]:
+            sys.exit(f"{bracket}: build_leaderboards() output differs from the legacy build")
+    entries = sum(len(v) for v in built.values())
+    source = "compact" if args.compact else "json"
+    print(f"{entries} entries over {len(fl.BRACKETS)} brackets, previous ranks from {source} files")
+    print(f"{'build':<12}{'median s':>10}")
+    print(f"{'legacy':<12}{legacy_s:>10.3f}")
+    print(f"{'current':<12}{current_s:>10.3f}")
+    print(f"speedup {legacy_s / current_s:.2f}x, outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Hash-bucketed, content-addressed shards of all_characters.json for the detail page."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+FORMAT_VERSION = 1
+TARGET_PER_SHARD = 16
+MIN_BUCKETS = 16
+MAX_BUCKETS = 65536
+
+
+def fnv1a32(text: str) -> int:
+    """32-bit FNV-1a of the UTF-8 bytes of ``text`` (mirrored in detail.js)."""
+    h = 0x811C9DC5
+    for byte in text.encode("utf-8"):
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def shard_key(name: str, realm: str) -> str:
+    return f"{realm}/{name.lower()}"
+
+
+def _bucket_count(total: int, previous: int | None) -> int:
+    # Keep the previous count while shards stay within 4x of the target size,
+    # so a roster growing or shrinking a little doesn't reshuffle every shard.
+    if previous and previous * TARGET_PER_SHARD // 4 <= total <= previous * TARGET_PER_SHARD * 2:
+        return previous
+    buckets = MIN_BUCKETS
+    while buckets * TARGET_PER_SHARD < total and buckets < MAX_BUCKETS:
+        buckets *= 2
+    return buckets
+
+
+def load_manifest(directory: Path) -> dict:
+    path = Path(directory) / "index.json"
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_shards(directory: Path, characters: list[dict]) -> dict:
+    """Split ``characters`` into ``<bucket>.<hash>.json`` files plus ``index.json``.
+
+    A character lives in bucket ``fnv1a32(shard_key()) % buckets``; each
+    shard maps shard_key() to the character record. File names carry a
+    hash of their content, so a shard whose characters didn't change keeps
+    its name and is not rewritten, and browsers may cache shards
+    indefinitely. Shards no longer listed in the new index are deleted.
+    Returns the index.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    buckets = _bucket_count(len(characters), load_manifest(directory).get("buckets"))
+
+    grouped: list[dict] = [{} for _ in range(buckets)]
+    for char in characters:
+        key = shard_key(char["name"], char["realm"])
+        grouped[fnv1a32(key) % buckets][key] = char
+
+    width = len(f"{buckets - 1:x}")
+    shards = []
+    written = 0
+    for bucket, members in enumerate(grouped):
+        if not members:
+            shards.append(None)
+            continue
+        raw = json.dumps(members, ensure_ascii=False, sort_keys=True,
+                         separators=(",", ":")).encode("utf-8")
+        name = f"{bucket:0{width}x}.{hashlib.sha1(raw).hexdigest()[:12]}.json"
+        path = directory / name
+        if not path.exists():
+            tmp = path.with_name(name + ".tmp")
+            tmp.write_bytes(raw)
+            os.replace(tmp, path)
+            written += 1
+        shards.append(name)
+
+    manifest = {"v": FORMAT_VERSION, "hash": "fnv1a32", "buckets": buckets,
+                "count": len(characters), "shards": shards}
+    tmp = directory / "index.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, directory / "index.json")
+
+    keep = {s for s in shards if s} | {"index.json"}
+    removed = 0
+    for path in directory.glob("*.json"):
+        if path.name not in keep:
+            path.unlink()
+            removed += 1
+    print(f"Character shards: {buckets} buckets, {written} written, "
+          f"{len(keep) - 1 - written} unchanged, {removed} removed")
+    return manifest
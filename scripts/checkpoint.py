@@ -0,0 +1,75 @@
+"""Append-only JSONL journal of a fetch run's completed work, used to resume it after a crash."""
+
+import json
+import threading
+from pathlib import Path
+
+
+class CheckpointJournal:
+    """Resolved guild rosters and fetched characters of one run, one JSON object per line.
+
+    Every record is flushed as soon as it is written, so a run killed at any
+    point leaves a journal that ``resume=True`` can pick up; a partially
+    written last line is ignored. Opening without ``resume`` starts the
+    journal over.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._rosters: dict[tuple[str, str], list[dict]] = {}
+        self._characters: dict[tuple[str, str], tuple[dict, dict]] = {}
+        if resume and self.path.exists():
+            self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("type") == "roster":
+                    self._rosters[(rec["guild"].lower(), rec["realm"])] = rec["members"]
+                elif rec.get("type") == "character":
+                    char = rec["char"]
+                    self._characters[(char["name"].lower(), char["realm"])] = (char, rec["pvp"])
+
+    def _append(self, rec: dict):
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def roster(self, guild: dict) -> list[dict] | None:
+        """Members journaled for ``guild``, or None if its roster still has to be fetched."""
+        return self._rosters.get((guild["name"].lower(), guild["realm"]))
+
+    def record_roster(self, guild: dict, members: list[dict]):
+        self._append({"type": "roster", "guild": guild["name"], "realm": guild["realm"],
+                      "members": members})
+
+    def has_character(self, char: dict) -> bool:
+        return (char["name"].lower(), char["realm"]) in self._characters
+
+    def record_character(self, char: dict, pvp: dict):
+        self._append({"type": "character", "char": char, "pvp": pvp})
+
+    def characters(self) -> list[tuple[dict, dict]]:
+        """(character, pvp) pairs loaded from the journal when it was opened."""
+        return list(self._characters.values())
+
+    @property
+    def resumed_rosters(self) -> int:
+        return len(self._rosters)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def discard(self):
+        """Close and delete the journal once the run has finished."""
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,72 @@
+"""Minified, columnar and precompressed copies of the leaderboard files for the frontend."""
+
+import gzip
+import json
+import os
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+FORMAT_VERSION = 1
+
+# Repeated strings are stored once per file and referenced by index.
+DICT_FIELDS = ("realm", "realm_name", "class", "race", "faction", "guild")
+VALUE_FIELDS = ("name", "rating", "won", "lost", "played", "winrate", "rank", "rd", "rkd")
+
+
+def encode_leaderboard(entries: list[dict]) -> dict:
+    """Columnar form of build_leaderboard() output: one array per field.
+
+    ``dicts[field]`` lists the distinct strings of a dictionary-encoded
+    field and ``cols[field]`` holds indexes into it. Missing ``rd``/``rkd``
+    (no change since the last run) are stored as 0.
+    """
+    dicts = {f: [] for f in DICT_FIELDS}
+    index = {f: {} for f in DICT_FIELDS}
+    cols = {f: [] for f in DICT_FIELDS + VALUE_FIELDS}
+    for entry in entries:
+        for f in DICT_FIELDS:
+            value = entry.get(f, "")
+            idx = index[f].get(value)
+            if idx is None:
+                idx = index[f][value] = len(dicts[f])
+                dicts[f].append(value)
+            cols[f].append(idx)
+        for f in VALUE_FIELDS:
+            cols[f].append(entry.get(f, 0))
+    return {"v": FORMAT_VERSION, "count": len(entries), "dicts": dicts, "cols": cols}
+
+
+def _write_bytes(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_compact(directory: Path, bracket: str, entries: list[dict]) -> dict:
+    """Write ``<bracket>.c.json`` plus ``.gz`` (and ``.br`` if brotli is installed).
+
+    Returns the file names and sizes for meta.json. The gzip header carries
+    no timestamp, so unchanged data produces byte-identical files.
+    """
+    directory = Path(directory)
+    name = f"{bracket}.c.json"
+    raw = json.dumps(encode_leaderboard(entries), ensure_ascii=False,
+                     separators=(",", ":")).encode("utf-8")
+    _write_bytes(directory / name, raw)
+    gz = gzip.compress(raw, compresslevel=9, mtime=0)
+    _write_bytes(directory / f"{name}.gz", gz)
+    info = {"file": name, "gzip": f"{name}.gz", "bytes": len(raw), "gzip_bytes": len(gz)}
+
+    br_path = directory / f"{name}.br"
+    if brotli is not None:
+        br = brotli.compress(raw, quality=11)
+        _write_bytes(br_path, br)
+        info.update(brotli=br_path.name, brotli_bytes=len(br))
+    else:
+        # Don't leave a stale .br behind from a run that had brotli.
+        br_path.unlink(missing_ok=True)
+    return info
@@ -1,50 +1,61 @@
 """Fetch PvP data only for newly added guilds/characters and merge into existing data."""
 
+import argparse
 import json
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 sys.stdout.reconfigure(encoding="utf-8")
 
 from fetch_leaderboard import (
     get_access_token,
-    fetch_guild_members,
-    fetch_character_pvp,
-    fetch_character_worker,
-    build_leaderboard,
+    fetch_characters,
+    iter_characters,
+    update_non_arena_index,
+    update_tombstones,
+    CharacterDeduper,
+    build_leaderboards,
+    log_rating_history,
+    update_leaderboards,
+    write_leaderboard,
+    enable_response_cache,
+    save_response_cache,
     sync_to_supabase,
     resolve_icons,
-    BRACKETS,
-    MAX_WORKERS,
-    MIN_LEVEL,
+    build_icon_atlases,
+    ASYNC_CONCURRENCY,
+    CHARACTER_SHARDS_DIR,
+    DEFAULT_NON_ARENA_RECHECK_DAYS,
+    DEFAULT_TOMBSTONE_MAX_DAYS,
+    DEFAULT_TOMBSTONE_RECHECK_DAYS,
+    ENGINES,
+    NON_ARENA_PATH,
+    TOMBSTONES_PATH,
 )
+from character_shards import write_shards
+from rate_limiter import bnet_limiter
+from recheck_index import RecheckIndex, TombstoneIndex
+from state_store import StateStore
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
-ADDED_FILE = BASE_DIR / "config" / "_added.json"
 
 
-def load_existing_characters() -> list[dict]:
-    path = DATA_DIR / "all_characters.json"
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch newly added guilds/characters only.")
+    parser.add_argument("--engine", choices=ENGINES, default=os.environ.get("FETCH_ENGINE", "threads"))
+    parser.add_argument("--concurrency", type=int, default=ASYNC_CONCURRENCY)
+    parser.add_argument("--no-http-cache", action="store_true")
+    parser.add_argument("--compact-output", action="store_true",
+                        default=os.environ.get("COMPACT_OUTPUT", "") == "1")
+    args = parser.parse_args(argv)
 
-
-def main():
-    if not ADDED_FILE.exists():
-        print("No _added.json found, nothing to do.")
-        return
-
-    with open(ADDED_FILE, "r", encoding="utf-8") as f:
-        added = json.load(f)
-
-    new_guilds = added.get("guilds", [])
-    new_characters = added.get("characters", [])
+    store = StateStore()
+    added = store.pending()
+    new_guilds = added["guilds"]
+    new_characters = added["characters"]
 
     if not new_guilds and not new_characters:
         print("No new entries to fetch.")
@@ -58,75 +69,42 @@ def main():
 
     print("Authenticating...")
     token = get_access_token(client_id, client_secret)
-
-    existing = load_existing_characters()
-    existing_keys = {(c["name"].lower(), c["realm"]) for c in existing}
-
-    chars_to_fetch = []
-
-    for guild in new_guilds:
-        gname, grealm = guild["name"], guild["realm"]
-        print(f"Fetching guild roster: {gname} ({grealm})...")
-        members = fetch_guild_members(token, gname, grealm)
-        print(f"  {len(members)} eligible members (lvl >= {MIN_LEVEL})")
-        for m in members:
-            key = (m["name"].lower(), m["realm"])
-            if key not in existing_keys:
-                existing_keys.add(key)
-                chars_to_fetch.append(m)
-
-    for char in new_characters:
-        key = (char["name"].lower(), char["realm"])
-        if key not in existing_keys:
-            existing_keys.add(key)
-            chars_to_fetch.append({"name": char["name"], "realm": char["realm"], "level": 70, "id": 0})
-
-    total = len(chars_to_fetch)
-    if total == 0:
+    if not args.no_http_cache:
+        enable_response_cache()
+
+    deduper = CharacterDeduper(store.character_keys())
+    print("\nFetching new guild rosters and characters...")
+    characters = iter_characters(token, {"guilds": new_guilds, "characters": new_characters}, deduper)
+    results = fetch_characters(token, characters, args.engine, args.concurrency, progress_every=20)
+    if not results:
         print("All new entries already exist in data. Nothing to fetch.")
-        ADDED_FILE.unlink(missing_ok=True)
+        store.clear_pending()
+        store.export("added")
         return
 
-    print(f"\nNew characters to fetch: {total}")
-    print(f"Using {MAX_WORKERS} parallel workers...")
-
-    new_pvp = []
-    done = 0
-    tasks = [(token, c["name"], c["realm"], i, total) for i, c in enumerate(chars_to_fetch)]
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(fetch_character_worker, t): t for t in tasks}
-        for future in as_completed(futures):
-            idx, name, pvp = future.result()
-            done += 1
-            if done % 20 == 0 or done == total:
-                print(f"  Progress: {done}/{total}")
-            if pvp:
-                new_pvp.append(pvp)
+    new_pvp = [pvp for _, pvp in results if pvp]
+    non_arena = RecheckIndex(NON_ARENA_PATH, timedelta(days=DEFAULT_NON_ARENA_RECHECK_DAYS))
+    update_non_arena_index(non_arena, results)
+    # Submitted characters are always queried; this lifts tombstones of those found again.
+    update_tombstones(TombstoneIndex(TOMBSTONES_PATH, timedelta(days=DEFAULT_TOMBSTONE_RECHECK_DAYS),
+                                     timedelta(days=DEFAULT_TOMBSTONE_MAX_DAYS)), results)
 
     print(f"\nNew characters with data: {len(new_pvp)}")
 
-    resolve_icons(token, new_pvp)
+    resolve_icons(token, new_pvp, store)
+    save_response_cache()
 
-    # Merge into existing data
-    merged = list(existing)
-    merged_keys = {(c["name"].lower(), c["realm"]) for c in merged}
-    added_count = 0
-    for pvp in new_pvp:
-        key = (pvp["name"].lower(), pvp["realm"])
-        if key not in merged_keys:
-            merged.append(pvp)
-            merged_keys.add(key)
-            added_count += 1
-
-    print(f"Merged {added_count} new characters into all_characters.json (total: {len(merged)})")
+    # Merge into the stored characters; existing records are left as they are.
+    added_count = store.add_characters(new_pvp)
+    print(f"Merged {added_count} new characters into all_characters.json "
+          f"(total: {store.count_characters()})")
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
+    store.export("all_characters")
+    write_shards(CHARACTER_SHARDS_DIR, list(store.characters()))
+    build_icon_atlases(store)
 
-    with open(DATA_DIR / "all_characters.json", "w", encoding="utf-8") as f:
-        json.dump(merged, f, ensure_ascii=False, indent=2)
-
-    # Rebuild leaderboards
+    # Update leaderboards
     meta_path = DATA_DIR / "meta.json"
     meta = {}
     if meta_path.exists():
@@ -134,15 +112,20 @@ def main():
             meta = json.load(f)
 
     meta["updated_at"] = datetime.now(timezone.utc).isoformat()
-    meta["total_with_pvp"] = len([c for c in merged if c.get("brackets")])
+    meta["total_with_pvp"] = store.count_characters(with_brackets=True)
     meta["brackets"] = meta.get("brackets", {})
 
-    for bracket in BRACKETS:
-        leaderboard = build_leaderboard(merged, bracket)
+    # Merge the new characters into the existing bracket files; a full
+    # rebuild is only needed when one of them is missing.
+    leaderboards = update_leaderboards(new_pvp)
+    if leaderboards is None:
+        leaderboards = build_leaderboards(store.leaderboard_characters())
+    # Only the new characters can have changed since the last logged run.
+    trends = log_rating_history(new_pvp, leaderboards)
+    for bracket, leaderboard in leaderboards.items():
         print(f"  {bracket}: {len(leaderboard)} ranked players")
-        with open(DATA_DIR / f"{bracket}.json", "w", encoding="utf-8") as f:
-            json.dump(leaderboard, f, ensure_ascii=False, indent=2)
-        meta["brackets"][bracket] = {"count": len(leaderboard), "file": f"{bracket}.json"}
+        meta["brackets"][bracket] = write_leaderboard(bracket, leaderboard, args.compact_output,
+                                                      trends[bracket])
 
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
@@ -155,7 +138,10 @@ def main():
         synced = sync_to_supabase(supabase_url, supabase_key, new_pvp)
         print(f"  Synced {synced} snapshots")
 
-    ADDED_FILE.unlink(missing_ok=True)
+    store.clear_pending()
+    store.export("added")
+    store.close()
+    print(f"Rate limiter: {bnet_limiter.summary()}")
     print("Done (incremental).")
 
 
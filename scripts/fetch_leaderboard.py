@@ -2,18 +2,44 @@ import os
 import sys
 import json
 import time
+import asyncio
+import argparse
+import shutil
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Iterable, Iterator
 from urllib.parse import quote
 
 sys.stdout.reconfigure(encoding="utf-8")
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from character_shards import write_shards
+from checkpoint import CheckpointJournal
+from compact_output import write_compact
+from icon_cache import IconCache
+from icon_atlas import build_atlases, load_talent_defs
+from leaderboard_patch import write_patch
+from leaderboard_entries import build_entries, mark_changes, merge_entries
+from http_cache import DEFAULT_MAX_BYTES, ResponseCache, cache_key
+from rate_limiter import bnet_limiter, limited_get, wowhead_limiter
+from rating_history import RatingHistory, write_trends
+from recheck_index import RecheckIndex, TombstoneIndex
+from run_stats import run_stats
+from search_index import write_search_index
+from shard_results import (load_results, load_stats, owns, parse_shard, shard_label, stats_path,
+                           write_result)
+from state_store import StateStore
+from token_provider import TokenProvider
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
-CONFIG_DIR = BASE_DIR / "config"
+HTTP_CACHE_DIR = BASE_DIR / ".cache" / "http"
+CHECKPOINT_DIR = BASE_DIR / ".cache" / "checkpoint"
+SHARD_RESULTS_DIR = BASE_DIR / ".cache" / "shards"
 
 REGION = "kr"
 API_BASE = f"https://{REGION}.api.blizzard.com"
@@ -25,40 +51,119 @@ LOCALE = "ko_KR"
 BRACKETS = ["2v2", "3v3", "5v5"]
 MIN_LEVEL = 70
 MAX_WORKERS = 10
+ROSTER_WORKERS = 10
+ENGINES = ("threads", "async")
+ASYNC_CONCURRENCY = 32
+DETAIL_FIELDS = ("spec_groups", "equipment", "avatar", "details_at")
+DEFAULT_MAX_DETAIL_AGE_HOURS = 24
+NON_ARENA_PATH = DATA_DIR / "_non_arena.json"
+TOMBSTONES_PATH = DATA_DIR / "_tombstones.json"
+RUN_STATS_PATH = DATA_DIR / "_run_stats.json"
+CHARACTER_SHARDS_DIR = DATA_DIR / "characters"
+RATING_HISTORY_PATH = DATA_DIR / "_rating_history.jsonl.gz"
+PATCHES_DIR = DATA_DIR / "patches"
+DEFAULT_NON_ARENA_RECHECK_DAYS = 7
+# A missing profile is re-checked after 1, 2, 4, ... days, at most every 14.
+DEFAULT_TOMBSTONE_RECHECK_DAYS = 1
+DEFAULT_TOMBSTONE_MAX_DAYS = 14
+# Re-check interval options (argparse dest -> default), recorded in shard results.
+RECHECK_OPTIONS = {
+    "non_arena_recheck_days": DEFAULT_NON_ARENA_RECHECK_DAYS,
+    "tombstone_recheck_days": DEFAULT_TOMBSTONE_RECHECK_DAYS,
+    "tombstone_max_days": DEFAULT_TOMBSTONE_MAX_DAYS,
+}
+
+
+_token_provider: TokenProvider | None = None
 
 
 def get_access_token(client_id: str, client_secret: str) -> str:
-    resp = requests.post(
-        OAUTH_URL,
-        data={"grant_type": "client_credentials"},
-        auth=(client_id, client_secret),
-        timeout=30,
-    )
-    resp.raise_for_status()
-    return resp.json()["access_token"]
+    """Start the shared token provider; api_get uses (and renews) its token from then on."""
+    global _token_provider
+    _token_provider = TokenProvider(client_id, client_secret, OAUTH_URL)
+    token = _token_provider.token()
+    print(f"  Token valid for {_token_provider.expires_in / 3600:.1f}h"
+          f"{' (cached)' if not _token_provider.refreshes else ''}")
+    return token
+
+
+def current_token(token: str) -> str:
+    """The provider's current token, or ``token`` when no provider was started."""
+    return _token_provider.token() if _token_provider else token
 
 
 _session = requests.Session()
+_response_cache: ResponseCache | None = None
+
+
+def enable_response_cache(max_bytes: int = DEFAULT_MAX_BYTES,
+                          directory: Path = HTTP_CACHE_DIR) -> ResponseCache:
+    """Route api_get through the on-disk conditional-request cache."""
+    global _response_cache
+    _response_cache = ResponseCache(directory, max_bytes)
+    return _response_cache
 
 
-def api_get(token: str, url: str, namespace: str, retries: int = 2) -> dict | None:
-    headers = {"Authorization": f"Bearer {token}"}
+def save_response_cache():
+    if _response_cache:
+        _response_cache.save()
+        print(f"HTTP cache: {_response_cache.summary()}")
+
+
+def write_run_stats(started: float, path: Path = RUN_STATS_PATH, **fields):
+    """Write per-endpoint metrics, limiter and cache state to data/_run_stats.json (or ``path``)."""
+    print("\nRequests by endpoint:")
+    for line in run_stats.summary_lines():
+        print(line)
+    run_stats.write(path, {
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "wall_seconds": round(time.monotonic() - started, 1),
+        **fields,
+        "rate_limiters": {"battle.net": bnet_limiter.stats(), "wowhead": wowhead_limiter.stats()},
+        "http_cache": _response_cache.stats() if _response_cache else None,
+    })
+
+
+def api_get(token: str, url: str, namespace: str, retries: int = 2,
+            not_found: set | None = None) -> dict | None:
+    """The JSON document at ``url``, or None; a 404 also adds ``url`` to ``not_found``."""
+    bearer = current_token(token)
+    headers = {"Authorization": f"Bearer {bearer}"}
     params = {"namespace": namespace, "locale": LOCALE}
+    key = cache_key(url, namespace) if _response_cache else None
+    if key:
+        headers.update(_response_cache.validators(key))
 
+    reauthorized = False
     for attempt in range(retries + 1):
         try:
-            resp = _session.get(url, headers=headers, params=params, timeout=15)
+            resp = limited_get(_session, bnet_limiter, url, headers=headers, params=params, timeout=15)
+            if resp.status_code == 401 and _token_provider and not reauthorized:
+                # Expired or revoked early: renew once and repeat the request.
+                reauthorized = True
+                bearer = _token_provider.refresh(bearer)
+                headers["Authorization"] = f"Bearer {bearer}"
+                resp = limited_get(_session, bnet_limiter, url, headers=headers, params=params, timeout=15)
+            if resp.status_code == 304:
+                cached = _response_cache.load(key)
+                if cached is not None:
+                    return cached
+                # Body evicted between the lookup and the 304: ask again
+                # unconditionally within this attempt, as nothing failed.
+                headers = {"Authorization": f"Bearer {bearer}"}
+                resp = limited_get(_session, bnet_limiter, url, headers=headers, params=params, timeout=15)
             if resp.status_code == 404:
+                if not_found is not None:
+                    not_found.add(url)
                 return None
-            if resp.status_code == 429:
-                wait = int(resp.headers.get("Retry-After", 5))
-                print(f"  [RATE LIMIT] waiting {wait}s...")
-                time.sleep(wait)
-                continue
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            if key:
+                _response_cache.store(key, resp)
+            return data
         except requests.RequestException as e:
             if attempt < retries:
+                run_stats.record_retry(url)
                 time.sleep(2 ** attempt)
                 continue
             print(f"  [ERROR] {url}: {e}")
@@ -66,10 +171,8 @@ def api_get(token: str, url: str, namespace: str, retries: int = 2) -> dict | No
     return None
 
 
-def load_sources() -> dict:
-    path = CONFIG_DIR / "sources.json"
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_sources(store: StateStore) -> dict:
+    return store.sources()
 
 
 def fetch_guild_members(token: str, guild_name: str, realm_slug: str) -> list[dict]:
@@ -96,11 +199,95 @@ def fetch_guild_members(token: str, guild_name: str, realm_slug: str) -> list[di
     return members
 
 
-def fetch_character_pvp(token: str, name: str, realm_slug: str) -> dict | None:
-    encoded = quote(name.lower())
-    base_url = f"{API_BASE}/profile/wow/character/{realm_slug}/{encoded}"
+# Profile URLs that answered 404 this run (as opposed to failing).
+_missing_profiles: set[str] = set()
+
+
+def _character_url(name: str, realm_slug: str) -> str:
+    return f"{API_BASE}/profile/wow/character/{realm_slug}/{quote(name.lower())}"
+
+
+def profile_missing(char: dict) -> bool:
+    """True if ``char``'s profile request this run answered 404."""
+    return _character_url(char["name"], char["realm"]) in _missing_profiles
+
+
+def _parse_bracket(pvp_data: dict) -> dict:
+    stats = pvp_data.get("season_match_statistics", {})
+    return {
+        "rating": pvp_data.get("rating", 0),
+        "won": stats.get("won", 0),
+        "lost": stats.get("lost", 0),
+        "played": stats.get("played", 0),
+        "season_id": pvp_data.get("season", {}).get("id"),
+    }
 
-    profile = api_get(token, base_url, NS_PROFILE)
+
+def _parse_spec_groups(spec_data: dict) -> list[dict]:
+    spec_groups = []
+    for group in spec_data.get("specialization_groups", []):
+        trees = []
+        for spec in group.get("specializations", []):
+            tree = {
+                "name": spec.get("specialization_name", ""),
+                "points": spec.get("spent_points", 0),
+                "talents": [],
+            }
+            for t in spec.get("talents", []):
+                tooltip = t.get("spell_tooltip", {})
+                spell = tooltip.get("spell", {})
+                tree["talents"].append({
+                    "name": spell.get("name", ""),
+                    "rank": t.get("talent_rank", 0),
+                    "spell_id": spell.get("id", 0),
+                })
+            trees.append(tree)
+        spec_groups.append({
+            "active": bool(group.get("is_active")),
+            "trees": trees,
+        })
+    return spec_groups
+
+
+def _parse_equipment(eq_data: dict) -> tuple[list[dict], list[int]]:
+    items = []
+    item_ids_needed = set()
+    for item in eq_data.get("equipped_items", []):
+        slot_type = item.get("slot", {}).get("type", "")
+        if slot_type in ("SHIRT", "TABARD"):
+            continue
+        item_id = item.get("item", {}).get("id", 0)
+        entry = {
+            "slot": item.get("slot", {}).get("name", ""),
+            "slot_type": slot_type,
+            "name": item.get("name", ""),
+            "quality": item.get("quality", {}).get("name", ""),
+            "quality_type": item.get("quality", {}).get("type", ""),
+            "item_id": item_id,
+        }
+        enchants = []
+        for ench in item.get("enchantments", []):
+            e = {"text": ench.get("display_string", "")}
+            slot_info = ench.get("enchantment_slot", {})
+            if slot_info.get("type") == "PERMANENT":
+                e["type"] = "PERMANENT"
+            else:
+                e["type"] = "GEM"
+                src = ench.get("source_item", {})
+                if src.get("name"):
+                    e["source"] = src["name"]
+            enchants.append(e)
+        if enchants:
+            entry["enchants"] = enchants
+        items.append(entry)
+        if item_id:
+            item_ids_needed.add(item_id)
+    return items, list(item_ids_needed)
+
+
+def _assemble_character(name: str, realm_slug: str, profile: dict | None,
+                        bracket_docs: dict) -> dict | None:
+    """Build a character record from the profile and pvp-bracket documents."""
     if not profile:
         return None
 
@@ -120,117 +307,355 @@ def fetch_character_pvp(token: str, name: str, realm_slug: str) -> dict | None:
         result["realm_name"] = result["realm_name"].get("ko_KR", result["realm_name"].get("en_US", ""))
 
     for bracket in BRACKETS:
-        pvp_url = f"{base_url}/pvp-bracket/{bracket}"
-        pvp_data = api_get(token, pvp_url, NS_PROFILE)
+        pvp_data = bracket_docs.get(bracket)
         if pvp_data:
-            stats = pvp_data.get("season_match_statistics", {})
-            result["brackets"][bracket] = {
-                "rating": pvp_data.get("rating", 0),
-                "won": stats.get("won", 0),
-                "lost": stats.get("lost", 0),
-                "played": stats.get("played", 0),
-                "season_id": pvp_data.get("season", {}).get("id"),
-            }
+            result["brackets"][bracket] = _parse_bracket(pvp_data)
+
+    return result
+
+
+def _attach_details(result: dict, spec_data: dict | None, eq_data: dict | None,
+                    media_data: dict | None):
+    """Add talents, equipment and avatar from their sub-resource documents."""
+    result["details_at"] = datetime.now(timezone.utc).isoformat()
 
     # Specializations (all groups for dual spec)
-    spec_data = api_get(token, f"{base_url}/specializations", NS_PROFILE)
     if spec_data:
-        spec_groups = []
-        for group in spec_data.get("specialization_groups", []):
-            trees = []
-            for spec in group.get("specializations", []):
-                tree = {
-                    "name": spec.get("specialization_name", ""),
-                    "points": spec.get("spent_points", 0),
-                    "talents": [],
-                }
-                for t in spec.get("talents", []):
-                    tooltip = t.get("spell_tooltip", {})
-                    spell = tooltip.get("spell", {})
-                    tree["talents"].append({
-                        "name": spell.get("name", ""),
-                        "rank": t.get("talent_rank", 0),
-                        "spell_id": spell.get("id", 0),
-                    })
-                trees.append(tree)
-            spec_groups.append({
-                "active": bool(group.get("is_active")),
-                "trees": trees,
-            })
-        result["spec_groups"] = spec_groups
+        result["spec_groups"] = _parse_spec_groups(spec_data)
 
     # Equipment
-    eq_data = api_get(token, f"{base_url}/equipment", NS_PROFILE)
     if eq_data:
-        items = []
-        item_ids_needed = set()
-        for item in eq_data.get("equipped_items", []):
-            slot_type = item.get("slot", {}).get("type", "")
-            if slot_type in ("SHIRT", "TABARD"):
-                continue
-            item_id = item.get("item", {}).get("id", 0)
-            entry = {
-                "slot": item.get("slot", {}).get("name", ""),
-                "slot_type": slot_type,
-                "name": item.get("name", ""),
-                "quality": item.get("quality", {}).get("name", ""),
-                "quality_type": item.get("quality", {}).get("type", ""),
-                "item_id": item_id,
-            }
-            enchants = []
-            for ench in item.get("enchantments", []):
-                e = {"text": ench.get("display_string", "")}
-                slot_info = ench.get("enchantment_slot", {})
-                if slot_info.get("type") == "PERMANENT":
-                    e["type"] = "PERMANENT"
-                else:
-                    e["type"] = "GEM"
-                    src = ench.get("source_item", {})
-                    if src.get("name"):
-                        e["source"] = src["name"]
-                enchants.append(e)
-            if enchants:
-                entry["enchants"] = enchants
-            items.append(entry)
-            if item_id:
-                item_ids_needed.add(item_id)
-        result["equipment"] = items
-        result["_item_ids"] = list(item_ids_needed)
+        result["equipment"], result["_item_ids"] = _parse_equipment(eq_data)
 
     # Character media (avatar)
-    media_data = api_get(token, f"{base_url}/character-media", NS_PROFILE)
     if media_data:
         for asset in media_data.get("assets", []):
             if asset.get("key") == "avatar":
                 result["avatar"] = asset.get("value", "")
                 break
 
+
+def _played_signature(char: dict) -> dict:
+    return {b: d.get("played", 0) for b, d in char.get("brackets", {}).items()}
+
+
+def _can_carry_forward(result: dict, prev: dict | None, max_age: timedelta | None) -> bool:
+    """True if ``prev``'s talents/gear/avatar can stand in for a fresh fetch.
+
+    Requires the same played count in every bracket as the previous run and
+    details no older than ``max_age``.
+    """
+    if not prev or max_age is None or not prev.get("details_at"):
+        return False
+    try:
+        details_at = datetime.fromisoformat(prev["details_at"])
+    except ValueError:
+        return False
+    if datetime.now(timezone.utc) - details_at > max_age:
+        return False
+    return _played_signature(result) == _played_signature(prev)
+
+
+def _carry_forward_details(result: dict, prev: dict):
+    for field in DETAIL_FIELDS:
+        if field in prev:
+            result[field] = prev[field]
+    item_ids = {eq.get("item_id", 0) for eq in prev.get("equipment", [])}
+    result["_item_ids"] = [i for i in item_ids if i]
+
+
+def fetch_character_pvp(token: str, name: str, realm_slug: str, prev: dict | None = None,
+                        max_detail_age: timedelta | None = None) -> dict | None:
+    """Fetch a character's profile, brackets, talents, equipment and avatar.
+
+    With ``prev`` (the character's record from the previous run) and
+    ``max_detail_age``, talents/equipment/avatar are carried forward instead
+    of refetched when _can_carry_forward() allows it.
+    """
+    base_url = _character_url(name, realm_slug)
+
+    profile = api_get(token, base_url, NS_PROFILE, not_found=_missing_profiles)
+    if not profile:
+        return None
+
+    bracket_docs = {
+        bracket: api_get(token, f"{base_url}/pvp-bracket/{bracket}", NS_PROFILE)
+        for bracket in BRACKETS
+    }
+    result = _assemble_character(name, realm_slug, profile, bracket_docs)
+    if not result["brackets"]:
+        # No arena data: talents/gear/avatar would be dropped with the character anyway.
+        return result
+
+    if _can_carry_forward(result, prev, max_detail_age):
+        _carry_forward_details(result, prev)
+        return result
+
+    spec_data = api_get(token, f"{base_url}/specializations", NS_PROFILE)
+    eq_data = api_get(token, f"{base_url}/equipment", NS_PROFILE)
+    media_data = api_get(token, f"{base_url}/character-media", NS_PROFILE)
+    _attach_details(result, spec_data, eq_data, media_data)
+    return result
+
+
+async def _api_get_async(token: str, url: str, namespace: str,
+                         not_found: set | None = None) -> dict | None:
+    """Run the blocking api_get on the event loop's executor."""
+    return await asyncio.to_thread(api_get, token, url, namespace, not_found=not_found)
+
+
+async def fetch_character_pvp_async(token: str, name: str, realm_slug: str,
+                                    prev: dict | None = None,
+                                    max_detail_age: timedelta | None = None) -> dict | None:
+    """Async variant of fetch_character_pvp.
+
+    The profile is requested first, so a missing character costs one call;
+    then the bracket documents together, and the talents/equipment/media
+    documents together if they are needed.
+    """
+    base_url = _character_url(name, realm_slug)
+    profile = await _api_get_async(token, base_url, NS_PROFILE, _missing_profiles)
+    if not profile:
+        return None
+    urls = [f"{base_url}/pvp-bracket/{bracket}" for bracket in BRACKETS]
+    docs = await asyncio.gather(*(_api_get_async(token, u, NS_PROFILE) for u in urls))
+    result = _assemble_character(name, realm_slug, profile, dict(zip(BRACKETS, docs)))
+    if not result["brackets"]:
+        return result
+
+    if _can_carry_forward(result, prev, max_detail_age):
+        _carry_forward_details(result, prev)
+        return result
+
+    urls = [f"{base_url}/specializations", f"{base_url}/equipment", f"{base_url}/character-media"]
+    spec_data, eq_data, media_data = await asyncio.gather(
+        *(_api_get_async(token, u, NS_PROFILE) for u in urls))
+    _attach_details(result, spec_data, eq_data, media_data)
     return result
 
 
-def fetch_character_worker(args):
-    """Worker for parallel character PvP fetching."""
-    token, name, realm, idx, total = args
-    pvp = fetch_character_pvp(token, name, realm)
-    return idx, name, pvp
+def character_key(char: dict) -> tuple[str, str]:
+    return (char["name"].lower(), char["realm"])
+
+
+def load_previous_characters(store: StateStore) -> dict:
+    """Last run's characters keyed by character_key()."""
+    return {character_key(c): c for c in store.characters()}
+
+
+class CharacterDeduper:
+    """Thread-safe record of queued characters, keyed by (name, realm) and by character id."""
+
+    def __init__(self, keys=()):
+        self._keys = set(keys)
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def add(self, char: dict) -> bool:
+        """Mark ``char`` as queued; returns False if it was already seen."""
+        key = character_key(char)
+        char_id = char.get("id", 0)
+        with self._lock:
+            if key in self._keys or (char_id and char_id in self._ids):
+                return False
+            self._keys.add(key)
+            if char_id:
+                self._ids.add(char_id)
+            return True
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def iter_guild_rosters(token: str, guilds: list[dict],
+                       journal: CheckpointJournal | None = None) -> Iterator[tuple[dict, list[dict]]]:
+    """Fetch guild rosters concurrently, yielding (guild, members) as each one arrives.
+
+    With a ``journal``, rosters it already holds are yielded without a
+    request and newly fetched non-empty rosters are added to it.
+    """
+    pending = []
+    for g in guilds:
+        members = journal.roster(g) if journal else None
+        if members is None:
+            pending.append(g)
+        else:
+            yield g, members
+
+    with ThreadPoolExecutor(max_workers=ROSTER_WORKERS) as executor:
+        futures = {executor.submit(fetch_guild_members, token, g["name"], g["realm"]): g
+                   for g in pending}
+        for future in as_completed(futures):
+            guild, members = futures[future], future.result()
+            if journal and members:
+                journal.record_roster(guild, members)
+            yield guild, members
+
+
+def iter_characters(token: str, sources: dict, deduper: CharacterDeduper,
+                    skip_indexes: tuple[RecheckIndex, ...] = (),
+                    journal: CheckpointJournal | None = None,
+                    shard: tuple[int, int] | None = None) -> Iterator[dict]:
+    """Yield unique characters from guild rosters, then from the manual character list.
+
+    Roster members are yielded as soon as their roster arrives, so a consumer
+    can start fetching profiles while the remaining rosters are still loading.
+    Characters that any of ``skip_indexes`` says to leave alone, or that
+    ``journal`` already holds a result for, are not yielded. With ``shard``
+    (``(i, N)``), only the characters shard_results.owns() assigns to it are
+    yielded; ``deduper`` still sees all of them.
+    """
+    def wanted(char: dict) -> bool:
+        if not deduper.add(char):
+            return False
+        if shard and not owns(shard, char):
+            return False
+        if journal and journal.has_character(char):
+            return False
+        return not any(idx.should_skip(char) for idx in skip_indexes)
+
+    for guild, members in iter_guild_rosters(token, sources.get("guilds", []), journal):
+        print(f"Guild roster {guild['name']} ({guild['realm']}): "
+              f"{len(members)} eligible members (lvl >= {MIN_LEVEL})")
+        for m in members:
+            if wanted(m):
+                yield m
+
+    for char in sources.get("characters", []):
+        entry = {"name": char["name"], "realm": char["realm"], "level": 70, "id": 0}
+        if wanted(entry):
+            yield entry
+
+
+def update_non_arena_index(index: RecheckIndex, results: list[tuple[dict, dict | None]]):
+    """Record characters that came back without any bracket; forget those that have one now."""
+    for char, pvp in results:
+        if pvp is None:
+            continue
+        if pvp["brackets"]:
+            index.discard(char)
+        else:
+            index.record(char)
+    index.save()
+
+
+def update_tombstones(index: TombstoneIndex, results: list[tuple[dict, dict | None]]):
+    """Tombstone characters whose profile answered 404; lift the tombstone of those found."""
+    for char, pvp in results:
+        if pvp is not None:
+            index.discard(char)
+        elif profile_missing(char):
+            index.record(char)
+    index.save()
+
+
+def _fetch_characters_threaded(token: str, characters: Iterable[dict], progress_every: int,
+                               previous: dict, max_detail_age: timedelta | None,
+                               journal: CheckpointJournal | None
+                               ) -> list[tuple[dict, dict | None]]:
+    results = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_character_pvp, token, c["name"], c["realm"],
+                            previous.get(character_key(c)), max_detail_age): c
+            for c in characters
+        }
+        total = len(futures)
+        for done, future in enumerate(as_completed(futures), 1):
+            if done % progress_every == 0 or done == total:
+                print(f"  Progress: {done}/{total}")
+            char, pvp = futures[future], future.result()
+            if journal and pvp:
+                journal.record_character(char, pvp)
+            results.append((char, pvp))
+    return results
+
+
+async def _fetch_characters_async(token: str, characters: Iterable[dict], concurrency: int,
+                                  progress_every: int, previous: dict,
+                                  max_detail_age: timedelta | None,
+                                  journal: CheckpointJournal | None
+                                  ) -> list[tuple[dict, dict | None]]:
+    # Every api_get runs on the default executor, so its size is the cap on
+    # HTTP requests in flight. ``characters`` may block (e.g. on guild
+    # rosters), so it is drained on its own thread into a queue that
+    # ``concurrency`` workers consume.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    queue: asyncio.Queue = asyncio.Queue()
+    results = []
+    queued = 0
+
+    def pump():
+        nonlocal queued
+        try:
+            for char in characters:
+                queued += 1
+                loop.call_soon_threadsafe(queue.put_nowait, char)
+        finally:
+            for _ in range(concurrency):
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def worker():
+        while True:
+            char = await queue.get()
+            if char is None:
+                return
+            pvp = await fetch_character_pvp_async(token, char["name"], char["realm"],
+                                                  previous.get(character_key(char)), max_detail_age)
+            if journal and pvp:
+                journal.record_character(char, pvp)
+            results.append((char, pvp))
+            if len(results) % progress_every == 0:
+                print(f"  Progress: {len(results)}/{queued}")
+
+    with ThreadPoolExecutor(max_workers=1) as pump_executor:
+        await asyncio.gather(loop.run_in_executor(pump_executor, pump),
+                             *(worker() for _ in range(concurrency)))
+    print(f"  Progress: {len(results)}/{queued}")
+    return results
+
+
+def fetch_characters(token: str, characters: Iterable[dict], engine: str = "threads",
+                     concurrency: int = ASYNC_CONCURRENCY, progress_every: int = 50,
+                     previous: dict | None = None,
+                     max_detail_age: timedelta | None = None,
+                     journal: CheckpointJournal | None = None) -> list[tuple[dict, dict | None]]:
+    """Fetch PvP data for every character; returns (character, pvp) pairs in completion order.
+
+    ``characters`` may be a lazy iterator such as iter_characters(): fetching
+    starts with the first character it yields. ``engine="threads"`` fans
+    fetch_character_pvp out over MAX_WORKERS threads, ``engine="async"``
+    keeps up to ``concurrency`` requests in flight and issues each
+    character's sub-resource requests concurrently.
+
+    ``previous`` maps character_key() to last run's records; together with
+    ``max_detail_age`` it enables change-gated detail fetching. Each
+    character that returns a record is appended to ``journal`` as it completes.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown fetch engine: {engine}")
+    previous = previous or {}
+
+    if engine == "async":
+        print(f"Using async engine ({concurrency} concurrent requests)...")
+        _session.mount("https://", HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency))
+        return asyncio.run(_fetch_characters_async(token, characters, concurrency, progress_every,
+                                                   previous, max_detail_age, journal))
+
+    print(f"Using {MAX_WORKERS} parallel workers...")
+    return _fetch_characters_threaded(token, characters, progress_every, previous, max_detail_age,
+                                      journal)
 
 
-ICON_CACHE_PATH = DATA_DIR / "_icon_cache.json"
 ICONS_DIR = BASE_DIR / "icons"
 NS_STATIC = "static-2.5.5_65000-classicann-kr"
 WOWHEAD_ICON_CDN = "https://wow.zamimg.com/images/wow/icons/medium"
+WOWHEAD_TOOLTIP = "https://nether.wowhead.com/tbc/tooltip/spell"
 
 
-def load_icon_cache() -> dict:
-    if ICON_CACHE_PATH.exists():
-        with open(ICON_CACHE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-
-def save_icon_cache(cache: dict):
-    with open(ICON_CACHE_PATH, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False)
+def load_icon_cache(store: StateStore) -> IconCache:
+    return IconCache(store, NS_STATIC)
 
 
 def _extract_icon_name(blizzard_url: str) -> str:
@@ -264,7 +689,7 @@ def _download_icon(icon_name: str) -> bool:
         return True
     url = f"{WOWHEAD_ICON_CDN}/{icon_name}.jpg"
     try:
-        resp = _session.get(url, timeout=10)
+        resp = limited_get(_session, wowhead_limiter, url, timeout=10)
         if resp.status_code == 200 and resp.content:
             dest.write_bytes(resp.content)
             return True
@@ -273,16 +698,12 @@ def _download_icon(icon_name: str) -> bool:
     return False
 
 
-def resolve_icons(token: str, all_pvp: list[dict]):
-    """Resolve item icons: fetch names via Blizzard API, download from Wowhead CDN."""
-    ICONS_DIR.mkdir(parents=True, exist_ok=True)
-    cache = load_icon_cache()
-
+def lookup_icon_names(token: str, all_pvp: list[dict], cache: IconCache):
+    """Look up the icon names of items and talent spells that ``cache`` needs; records them in ``cache``."""
     needed_ids = set()
     for char in all_pvp:
         for item_id in char.pop("_item_ids", []):
-            sid = str(item_id)
-            if sid not in cache:
+            if item_id not in needed_ids and cache.needs_lookup(str(item_id)):
                 needed_ids.add(item_id)
 
     if needed_ids:
@@ -297,34 +718,7 @@ def resolve_icons(token: str, all_pvp: list[dict]):
                 done += 1
                 if done % 50 == 0 or done == total:
                     print(f"  Icon names: {done}/{total}")
-                cache[str(item_id)] = icon_name or ""
-        save_icon_cache(cache)
-
-    icons_to_download = set()
-    for name in cache.values():
-        if name:
-            icons_to_download.add(name)
-
-    existing = {p.stem for p in ICONS_DIR.glob("*.jpg")}
-    missing = icons_to_download - existing
-    if missing:
-        print(f"\nDownloading {len(missing)} icon images from CDN...")
-        done = 0
-        total = len(missing)
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {executor.submit(_download_icon, n): n for n in missing}
-            for future in as_completed(futures):
-                done += 1
-                if done % 100 == 0 or done == total:
-                    print(f"  Downloads: {done}/{total}")
-    else:
-        print("\nAll icon images already downloaded.")
-
-    for char in all_pvp:
-        for eq in char.get("equipment", []):
-            icon_name = cache.get(str(eq.get("item_id", 0)), "")
-            if icon_name:
-                eq["icon"] = f"icons/{icon_name}.jpg"
+                cache.record(str(item_id), icon_name)
 
     # Resolve talent spell icons via Wowhead TBC tooltip API
     talent_spell_ids = set()
@@ -333,16 +727,15 @@ def resolve_icons(token: str, all_pvp: list[dict]):
             for tree in group.get("trees", []):
                 for t in tree.get("talents", []):
                     sid = t.get("spell_id", 0)
-                    if sid and not cache.get(f"spell_{sid}"):
+                    if sid and sid not in talent_spell_ids and cache.needs_lookup(f"spell_{sid}"):
                         talent_spell_ids.add(sid)
 
     if talent_spell_ids:
         print(f"\nFetching {len(talent_spell_ids)} talent spell icons from Wowhead...")
-        WOWHEAD_TOOLTIP = "https://nether.wowhead.com/tbc/tooltip/spell"
 
         def _spell_icon_worker_wh(spell_id):
             try:
-                resp = _session.get(f"{WOWHEAD_TOOLTIP}/{spell_id}", timeout=10)
+                resp = limited_get(_session, wowhead_limiter, f"{WOWHEAD_TOOLTIP}/{spell_id}", timeout=10)
                 if resp.status_code == 200:
                     icon = resp.json().get("icon", "")
                     if icon:
@@ -361,18 +754,57 @@ def resolve_icons(token: str, all_pvp: list[dict]):
                 done += 1
                 if done % 50 == 0 or done == total:
                     print(f"  Talent icons: {done}/{total}")
-                cache[f"spell_{sid}"] = icon_name
-        save_icon_cache(cache)
+                cache.record(f"spell_{sid}", icon_name)
+
+    if cache.skipped:
+        print(f"Icon lookups skipped (not found before, retry not due): {cache.skipped} "
+              f"of {cache.negatives()} negative entries")
+
+
+def resolve_icons(token: str, all_pvp: list[dict], store: StateStore, cache: IconCache | None = None):
+    """Resolve item icons: fetch names via Blizzard API, download from Wowhead CDN."""
+    ICONS_DIR.mkdir(parents=True, exist_ok=True)
+    cache = cache or load_icon_cache(store)
+    lookup_icon_names(token, all_pvp, cache)
+    cache.save()
+
+    icons_to_download = cache.icon_names()
+
+    existing = {p.stem for p in ICONS_DIR.glob("*.jpg")}
+    missing = icons_to_download - existing
+    if missing:
+        print(f"\nDownloading {len(missing)} icon images from CDN...")
+        done = 0
+        total = len(missing)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {executor.submit(_download_icon, n): n for n in missing}
+            for future in as_completed(futures):
+                done += 1
+                if done % 100 == 0 or done == total:
+                    print(f"  Downloads: {done}/{total}")
+    else:
+        print("\nAll icon images already downloaded.")
+
+    for char in all_pvp:
+        for eq in char.get("equipment", []):
+            icon_name = cache.get(str(eq.get("item_id", 0)))
+            if icon_name:
+                eq["icon"] = f"icons/{icon_name}.jpg"
 
     for char in all_pvp:
         for group in char.get("spec_groups", []):
             for tree in group.get("trees", []):
                 for t in tree.get("talents", []):
-                    icon_name = cache.get(f"spell_{t.get('spell_id', 0)}", "")
+                    icon_name = cache.get(f"spell_{t.get('spell_id', 0)}")
                     if icon_name:
                         t["icon"] = icon_name
 
 
+def build_icon_atlases(store: StateStore):
+    """Rebuild the class sprite atlases, ranking gear by every stored character."""
+    build_atlases(load_talent_defs(), store.equipment_icon_counts(), namespace=NS_STATIC)
+
+
 def fetch_cutoffs(token: str):
     """Fetch PvP season reward cutoffs and save to data/cutoffs.json."""
     BRACKET_MAP = {"ARENA_2v2": "2v2", "ARENA_3v3": "3v3", "ARENA_5v5": "5v5"}
@@ -412,23 +844,15 @@ def fetch_cutoffs(token: str):
             print(f"  {bracket}: {c['title']} = {c['rating']}")
 
 
-def discover_new_guilds(all_pvp: list[dict], sources: dict):
+def discover_new_guilds(all_pvp: list[dict], sources: dict, store: StateStore):
     """Auto-add newly discovered guild names from character data to sources.json."""
-    existing = {(g["name"].lower(), g["realm"]) for g in sources.get("guilds", [])}
-    new_guilds = []
-
-    for char in all_pvp:
-        guild = char.get("guild", "")
-        realm = char.get("realm", "")
-        if guild and (guild.lower(), realm) not in existing:
-            existing.add((guild.lower(), realm))
-            new_guilds.append({"name": guild, "realm": realm})
+    guilds = ({"name": char["guild"], "realm": char.get("realm", "")}
+              for char in all_pvp if char.get("guild"))
+    new_guilds = store.add_sources("guild", guilds)
 
     if new_guilds:
         sources.setdefault("guilds", []).extend(new_guilds)
-        sources_path = CONFIG_DIR / "sources.json"
-        with open(sources_path, "w", encoding="utf-8") as f:
-            json.dump(sources, f, ensure_ascii=False, indent=2)
+        store.export("sources")
         print(f"\nAuto-discovered {len(new_guilds)} new guilds:")
         for g in new_guilds[:20]:
             print(f"  + {g['name']} ({g['realm']})")
@@ -438,128 +862,180 @@ def discover_new_guilds(all_pvp: list[dict], sources: dict):
         print("\nNo new guilds discovered.")
 
 
-def load_previous_leaderboard(bracket: str) -> dict:
-    """Load previous leaderboard data and return a lookup dict keyed by (name, realm)."""
-    path = DATA_DIR / f"{bracket}.json"
-    if not path.exists():
-        return {}
+def load_previous_ranks(bracket: str) -> dict:
+    """Last run's (rating, rank) for each (name, realm) of a bracket.
+
+    Reads the columnar compact file when the previous run wrote one, which
+    avoids building a dict per entry; otherwise the regular bracket file.
+    """
     try:
+        with open(DATA_DIR / "meta.json", "r", encoding="utf-8") as f:
+            compact = json.load(f).get("brackets", {}).get(bracket, {}).get("compact")
+    except (OSError, ValueError):
+        compact = None
+    try:
+        if compact:
+            with open(DATA_DIR / compact["file"], "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            cols, realms = doc["cols"], doc["dicts"]["realm"]
+            keys = zip(cols["name"], (realms[i] for i in cols["realm"]))
+            return dict(zip(keys, zip(cols["rating"], cols["rank"])))
+        path = DATA_DIR / f"{bracket}.json"
+        if not path.exists():
+            return {}
         with open(path, "r", encoding="utf-8") as f:
-            prev = json.load(f)
-        return {(e["name"], e["realm"]): e for e in prev}
+            return {(e["name"], e["realm"]): (e.get("rating", 0), e.get("rank", 0))
+                    for e in json.load(f)}
     except Exception:
         return {}
 
 
-def build_leaderboard(all_pvp_data: list[dict], bracket: str) -> list[dict]:
-    prev_map = load_previous_leaderboard(bracket)
-
-    entries = []
-    for char in all_pvp_data:
-        bdata = char.get("brackets", {}).get(bracket)
-        if not bdata or bdata["rating"] == 0:
-            continue
-        total = bdata["won"] + bdata["lost"]
-        winrate = (bdata["won"] / total * 100) if total > 0 else 0
-        entries.append({
-            "name": char["name"],
-            "realm": char["realm"],
-            "realm_name": char.get("realm_name", ""),
-            "class": char.get("class", ""),
-            "race": char.get("race", ""),
-            "faction": char.get("faction", ""),
-            "guild": char.get("guild", ""),
-            "rating": bdata["rating"],
-            "won": bdata["won"],
-            "lost": bdata["lost"],
-            "played": bdata["played"],
-            "winrate": round(winrate, 1),
-        })
-
-    entries.sort(key=lambda x: x["rating"], reverse=True)
-
-    rank = 1
-    for i, entry in enumerate(entries):
-        if i > 0 and entry["rating"] < entries[i - 1]["rating"]:
-            rank = i + 1
-        entry["rank"] = rank
-
-        key = (entry["name"], entry["realm"])
-        prev = prev_map.get(key)
-        if prev:
-            rating_diff = entry["rating"] - prev.get("rating", 0)
-            if rating_diff != 0:
-                entry["rd"] = rating_diff
-            rank_diff = prev.get("rank", 0) - entry["rank"]
-            if rank_diff != 0:
-                entry["rkd"] = rank_diff
+def build_leaderboards(all_pvp_data: list[dict], brackets: list[str] = BRACKETS) -> dict[str, list[dict]]:
+    """Ranked entries for every bracket, with changes against the previous run's files."""
+    return {b: build_entries(all_pvp_data, b, load_previous_ranks(b)) for b in brackets}
 
-    return entries
 
+def build_leaderboard(all_pvp_data: list[dict], bracket: str) -> list[dict]:
+    return build_leaderboards(all_pvp_data, [bracket])[bracket]
 
-def main():
-    client_id = os.environ.get("BLIZZARD_CLIENT_ID", "")
-    client_secret = os.environ.get("BLIZZARD_CLIENT_SECRET", "")
-
-    if not client_id or not client_secret:
-        print("ERROR: BLIZZARD_CLIENT_ID and BLIZZARD_CLIENT_SECRET must be set")
-        sys.exit(1)
-
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    sources = load_sources()
-
-    print("Authenticating...")
-    token = get_access_token(client_id, client_secret)
-    print("Authenticated.")
-
-    print("\nFetching PvP reward cutoffs...")
-    fetch_cutoffs(token)
-
-    seen = set()
-    characters = []
-
-    for guild in sources.get("guilds", []):
-        gname = guild["name"]
-        grealm = guild["realm"]
-        print(f"Fetching guild roster: {gname} ({grealm})...")
-        members = fetch_guild_members(token, gname, grealm)
-        print(f"  {len(members)} eligible members (lvl >= {MIN_LEVEL})")
-        for m in members:
-            key = (m["name"].lower(), m["realm"])
-            if key not in seen:
-                seen.add(key)
-                characters.append(m)
-
-    for char in sources.get("characters", []):
-        key = (char["name"].lower(), char["realm"])
-        if key not in seen:
-            seen.add(key)
-            characters.append({"name": char["name"], "realm": char["realm"], "level": 70, "id": 0})
-
-    total = len(characters)
-    print(f"\nTotal unique characters to query: {total}")
-    print(f"Using {MAX_WORKERS} parallel workers...")
-
-    all_pvp = []
-    done = 0
-    tasks = [(token, c["name"], c["realm"], i, total) for i, c in enumerate(characters)]
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(fetch_character_worker, t): t for t in tasks}
-        for future in as_completed(futures):
-            idx, name, pvp = future.result()
-            done += 1
-            if done % 50 == 0 or done == total:
-                print(f"  Progress: {done}/{total}")
-            if pvp and pvp["brackets"]:
-                all_pvp.append(pvp)
+def update_leaderboards(characters: list[dict], brackets: list[str] = BRACKETS) -> dict[str, list[dict]] | None:
+    """The current bracket files with ``characters`` merged in, or None if a bracket file is missing.
 
-    print(f"\nCharacters with PvP data: {len(all_pvp)}")
+    Characters already ranked are replaced; their ``rd``/``rkd`` compare
+    the replaced entry's rating and rank with the new entry's rank in the
+    merged leaderboard. Everyone else keeps their entry apart from ranks
+    shifted by the merge. For a handful of characters this
+    avoids rebuilding every leaderboard from all characters.
+    """
+    leaderboards = {}
+    keys = {(c["name"], c["realm"]) for c in characters}
+    for bracket in brackets:
+        try:
+            with open(DATA_DIR / f"{bracket}.json", "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return None
+        previous = {(e["name"], e["realm"]): (e["rating"], e["rank"])
+                    for e in entries if (e["name"], e["realm"]) in keys}
+        updates = build_entries(characters, bracket)
+        first = merge_entries(entries, updates, set(previous))
+        mark_changes(updates, previous)
+        print(f"  {bracket}: merged {len(updates)} entries, ranks recomputed from #{first + 1}")
+        leaderboards[bracket] = entries
+    return leaderboards
+
+
+def write_leaderboard(bracket: str, leaderboard: list[dict], compact: bool = False,
+                      trends: dict | None = None) -> dict:
+    """Write data/<bracket>.json, its search index, compact copies, trends and the delta patch
+    from the previous file; returns the meta.json entry."""
+    path = DATA_DIR / f"{bracket}.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = None
+    try:
+        with open(DATA_DIR / "meta.json", "r", encoding="utf-8") as f:
+            previous = json.load(f).get("brackets", {}).get(bracket)
+    except (OSError, ValueError):
+        previous = None
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(leaderboard, f, ensure_ascii=False, indent=2)
+    entry = {"count": len(leaderboard), "file": f"{bracket}.json",
+             **write_patch(PATCHES_DIR, bracket, old, leaderboard, previous),
+             "search": write_search_index(DATA_DIR, bracket, leaderboard)}
+    if compact:
+        entry["compact"] = write_compact(DATA_DIR, bracket, leaderboard)
+    if trends is not None:
+        entry["trends"] = write_trends(DATA_DIR, bracket, leaderboard, trends)
+    return entry
+
+
+def log_rating_history(characters: list[dict], leaderboards: dict[str, list[dict]]) -> dict:
+    """Append changed bracket stats to the rating history; returns every bracket's window trends."""
+    history = RatingHistory(RATING_HISTORY_PATH)
+    logged = history.append(characters)
+    print(f"Rating history: {logged} changed bracket ratings logged")
+    return history.trends(leaderboards)
+
+
+def add_recheck_args(parser: argparse.ArgumentParser, from_shards: bool = False):
+    """The re-check interval options; with ``from_shards`` they default to the values the shards ran with."""
+    def default(dest):
+        return None if from_shards else RECHECK_OPTIONS[dest]
+    suffix = " (default: the shards' value)" if from_shards else ""
+    parser.add_argument("--non-arena-recheck-days", type=float, default=default("non_arena_recheck_days"),
+                        help="days before a character without arena data is queried again" + suffix)
+    parser.add_argument("--tombstone-recheck-days", type=float, default=default("tombstone_recheck_days"),
+                        help="days before a character whose profile answered 404 is queried again; "
+                             "doubles with every further miss" + suffix)
+    parser.add_argument("--tombstone-max-days", type=float, default=default("tombstone_max_days"),
+                        help="longest wait between checks of a missing character" + suffix)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fetch arena leaderboard data from Battle.net.")
+    parser.add_argument("--engine", choices=ENGINES, default=os.environ.get("FETCH_ENGINE", "threads"),
+                        help="character fetch engine (default: $FETCH_ENGINE or threads)")
+    parser.add_argument("--concurrency", type=int, default=ASYNC_CONCURRENCY,
+                        help="max in-flight requests for the async engine")
+    parser.add_argument("--change-gated", action="store_true",
+                        default=os.environ.get("CHANGE_GATED", "") == "1",
+                        help="reuse last run's talents/gear/avatar for characters whose "
+                             "bracket played counts are unchanged (default: $CHANGE_GATED=1)")
+    parser.add_argument("--max-detail-age", type=float, default=DEFAULT_MAX_DETAIL_AGE_HOURS,
+                        help="hours after which change-gated details are refetched anyway")
+    add_recheck_args(parser)
+    parser.add_argument("--no-http-cache", action="store_true",
+                        help="disable the conditional-request response cache")
+    parser.add_argument("--http-cache-mb", type=int,
+                        default=int(os.environ.get("HTTP_CACHE_MB", DEFAULT_MAX_BYTES // 1024 // 1024)),
+                        help="response cache size cap in MB (default: $HTTP_CACHE_MB or 256)")
+    parser.add_argument("--compact-output", action="store_true",
+                        default=os.environ.get("COMPACT_OUTPUT", "") == "1",
+                        help="also write minified columnar <bracket>.c.json(.gz/.br) files "
+                             "(default: $COMPACT_OUTPUT=1)")
+    parser.add_argument("--run-id", default=os.environ.get("GITHUB_RUN_ID", "local"),
+                        help="checkpoint journal name (default: $GITHUB_RUN_ID or 'local')")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rosters and characters already in this run ID's journal")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="don't write a checkpoint journal")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="query only shard i of N of the character list and write its results "
+                             "to .cache/shards/<run-id>/ for a later 'merge' run")
+    return parser.parse_args(argv)
+
+
+def publish(token: str, store: StateStore, sources: dict, results: list[tuple[dict, dict | None]],
+            total: int, non_arena: RecheckIndex, tombstones: TombstoneIndex, skipped: dict[str, int],
+            compact_output: bool = False, icon_cache: IconCache | None = None) -> list[dict]:
+    """Write everything a crawl produces from its (character, pvp) results.
+
+    Updates the re-check indexes, discovers guilds, resolves icons, writes
+    the bracket files, all_characters.json, character shards and meta.json
+    and syncs Supabase. Shared by a single-process run and ``merge`` of
+    ``--shard`` results. Returns the characters with PvP data.
+    """
+    all_pvp = [pvp for _, pvp in results if pvp and pvp["brackets"]]
+    update_non_arena_index(non_arena, results)
+    update_tombstones(tombstones, results)
+
+    print(f"\nTotal unique characters: {total} ({len(results)} queried)")
+    print(f"Characters with PvP data: {len(all_pvp)}")
+    print(f"Non-arena characters skipped: {skipped['non_arena']} "
+          f"(index: {len(non_arena)}, re-check after {non_arena.interval / timedelta(days=1):g} days)")
+    not_found = sum(1 for char, pvp in results if pvp is None and profile_missing(char))
+    print(f"Missing characters skipped: {skipped['tombstones']} "
+          f"(tombstones: {len(tombstones)}, {not_found} profiles not found this run)")
 
     # Auto-discover new guilds from fetched character data
-    discover_new_guilds(all_pvp, sources)
+    discover_new_guilds(all_pvp, sources, store)
 
-    resolve_icons(token, all_pvp)
+    resolve_icons(token, all_pvp, store, icon_cache)
+    save_response_cache()
 
     meta = {
         "region": REGION,
@@ -572,28 +1048,26 @@ def main():
         "brackets": {},
     }
 
-    for bracket in BRACKETS:
-        leaderboard = build_leaderboard(all_pvp, bracket)
+    leaderboards = build_leaderboards(all_pvp)
+    trends = log_rating_history(all_pvp, leaderboards)
+    for bracket, leaderboard in leaderboards.items():
         print(f"{bracket}: {len(leaderboard)} ranked players")
+        meta["brackets"][bracket] = write_leaderboard(bracket, leaderboard, compact_output,
+                                                      trends[bracket])
 
-        out_path = DATA_DIR / f"{bracket}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(leaderboard, f, ensure_ascii=False, indent=2)
-
-        meta["brackets"][bracket] = {
-            "count": len(leaderboard),
-            "file": f"{bracket}.json",
-        }
-
-    all_pvp_path = DATA_DIR / "all_characters.json"
-    with open(all_pvp_path, "w", encoding="utf-8") as f:
-        json.dump(all_pvp, f, ensure_ascii=False, indent=2)
+    changes = store.replace_characters(all_pvp)
+    store.export("all_characters")
+    print("State store: " + ", ".join(f"{v} {k}" for k, v in changes.items()))
+    write_shards(CHARACTER_SHARDS_DIR, all_pvp)
+    build_icon_atlases(store)
 
     meta_path = DATA_DIR / "meta.json"
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
 
     print(f"\nData saved to {DATA_DIR}")
+    print(f"Rate limiter: {bnet_limiter.summary()}")
+    print(f"Rate limiter: {wowhead_limiter.summary()}")
 
     supabase_url = os.environ.get("SUPABASE_URL", "")
     supabase_key = os.environ.get("SUPABASE_SERVICE_KEY", "")
@@ -604,78 +1078,318 @@ def main():
         print(f"  Synced {synced} new/changed snapshots")
     else:
         print("\nSkipping Supabase (SUPABASE_URL / SUPABASE_SERVICE_KEY not set)")
+    return all_pvp
+
+
+def authenticate() -> str:
+    client_id = os.environ.get("BLIZZARD_CLIENT_ID", "")
+    client_secret = os.environ.get("BLIZZARD_CLIENT_SECRET", "")
+
+    if not client_id or not client_secret:
+        print("ERROR: BLIZZARD_CLIENT_ID and BLIZZARD_CLIENT_SECRET must be set")
+        sys.exit(1)
+
+    print("Authenticating...")
+    token = get_access_token(client_id, client_secret)
+    print("Authenticated.")
+    return token
+
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["merge"]:
+        merge(argv[1:])
+        return
+    args = parse_args(argv)
+    started = time.monotonic()
+    shard = args.shard
+    label = shard_label(shard) if shard else None
+    shard_dir = SHARD_RESULTS_DIR / args.run_id
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    store = StateStore()
+    sources = load_sources(store)
+    if not args.no_http_cache:
+        if shard:
+            # One cache per shard: a shared index would be overwritten by
+            # whichever process saves last. Shards own the same characters
+            # every run, so each cache stays warm.
+            enable_response_cache(args.http_cache_mb * 1024 * 1024 // shard[1], HTTP_CACHE_DIR / label)
+        else:
+            enable_response_cache(args.http_cache_mb * 1024 * 1024)
+
+    token = authenticate()
+
+    if shard:
+        print(f"\nShard {shard[0]}/{shard[1]}: PvP reward cutoffs are left to merge")
+    else:
+        print("\nFetching PvP reward cutoffs...")
+        fetch_cutoffs(token)
+
+    journal = None
+    if not args.no_checkpoint:
+        name = f"{args.run_id}.{label}" if shard else args.run_id
+        journal = CheckpointJournal(CHECKPOINT_DIR / f"{name}.jsonl", resume=args.resume)
+        if args.resume:
+            print(f"\nResuming run {name}: {journal.resumed_rosters} rosters, "
+                  f"{len(journal.characters())} characters already journaled")
+
+    non_arena = RecheckIndex(NON_ARENA_PATH, timedelta(days=args.non_arena_recheck_days))
+    tombstones = TombstoneIndex(TOMBSTONES_PATH, timedelta(days=args.tombstone_recheck_days),
+                                timedelta(days=args.tombstone_max_days))
+    print("\nFetching guild rosters and characters...")
+    deduper = CharacterDeduper()
+    characters = iter_characters(token, sources, deduper, (non_arena, tombstones), journal, shard)
+    previous, max_detail_age = {}, None
+    if args.change_gated:
+        previous = load_previous_characters(store)
+        if shard:
+            previous = {k: c for k, c in previous.items() if owns(shard, c)}
+        max_detail_age = timedelta(hours=args.max_detail_age)
+        print(f"Change-gated details: {len(previous)} previous records, "
+              f"max age {args.max_detail_age:g}h")
+
+    results = fetch_characters(token, characters, args.engine, args.concurrency,
+                               previous=previous, max_detail_age=max_detail_age, journal=journal)
+    if journal:
+        results = journal.characters() + results
+    all_pvp = [pvp for _, pvp in results if pvp and pvp["brackets"]]
+    total = len(deduper)
+    skipped = {"non_arena": non_arena.skipped, "tombstones": tombstones.skipped}
+    if args.change_gated:
+        carried = sum(1 for pvp in all_pvp
+                      if pvp.get("details_at")
+                      and pvp["details_at"] == previous.get(character_key(pvp), {}).get("details_at"))
+        print(f"\nDetails carried forward (unchanged PvP stats): {carried}/{len(all_pvp)}")
+
+    if shard:
+        # The shared outputs (indexes, store, data/) are left to merge; the
+        # shard only makes the icon lookups for its own characters.
+        icon_cache = load_icon_cache(store)
+        lookup_icon_names(token, all_pvp, icon_cache)
+        save_response_cache()
+        path = write_result(shard_dir, shard, {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "unique": total,
+            "skipped": skipped,
+            "results": [[char, pvp] for char, pvp in results],
+            "not_found": sorted(_missing_profiles),
+            "icons": icon_cache.changes(),
+            "recheck": {dest: getattr(args, dest) for dest in RECHECK_OPTIONS},
+        })
+        print(f"\nShard {shard[0]}/{shard[1]}: {len(results)} of {total} characters queried, "
+              f"{len(all_pvp)} with PvP data -> {path}")
+        print(f"Rate limiter: {bnet_limiter.summary()}")
+        print(f"Rate limiter: {wowhead_limiter.summary()}")
+    else:
+        publish(token, store, sources, results, total, non_arena, tombstones, skipped, args.compact_output)
+
+    write_run_stats(started, path=stats_path(shard_dir, shard) if shard else RUN_STATS_PATH,
+                    script="fetch_leaderboard", engine=args.engine,
+                    **({"shard": f"{shard[0]}/{shard[1]}"} if shard else {}),
+                    characters={"unique": total, "queried": len(results), "with_pvp": len(all_pvp),
+                                "non_arena_skipped": non_arena.skipped,
+                                "tombstone_skipped": tombstones.skipped,
+                                "resumed": len(journal.characters()) if journal else 0})
+    if journal:
+        journal.discard()
+    store.close()
     print("Done.")
 
 
-def supabase_request(url: str, key: str, method: str, path: str, body=None):
+def parse_merge_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="fetch_leaderboard.py merge",
+                                     description="Combine the results of a --shard i/N run.")
+    parser.add_argument("--run-id", default=os.environ.get("GITHUB_RUN_ID", "local"),
+                        help="run ID the shards were started with (default: $GITHUB_RUN_ID or 'local')")
+    parser.add_argument("--compact-output", action="store_true",
+                        default=os.environ.get("COMPACT_OUTPUT", "") == "1",
+                        help="also write minified columnar <bracket>.c.json(.gz/.br) files "
+                             "(default: $COMPACT_OUTPUT=1)")
+    parser.add_argument("--keep-shards", action="store_true",
+                        help="keep the shard result files after a successful merge")
+    add_recheck_args(parser, from_shards=True)
+    return parser.parse_args(argv)
+
+
+def recheck_days(docs: list[dict], args: argparse.Namespace) -> dict[str, float]:
+    """The re-check intervals for merging ``docs``: the shards' recorded values, which must agree
+    with each other and with any given on the merge command line.
+
+    Raises ValueError on a mismatch; an interval nobody recorded or gave is the default.
+    """
+    days = dict.fromkeys(RECHECK_OPTIONS)
+    for doc in docs:
+        for dest, value in doc.get("recheck", {}).items():
+            if days.get(dest) not in (None, value):
+                raise ValueError(f"shards ran with different --{dest.replace('_', '-')} "
+                                 f"({days[dest]:g} and {value:g})")
+            days[dest] = value
+    for dest, default in RECHECK_OPTIONS.items():
+        given = getattr(args, dest)
+        if given is not None and days[dest] not in (None, given):
+            raise ValueError(f"--{dest.replace('_', '-')} {given:g} differs from the "
+                             f"{days[dest]:g} the shards ran with")
+        days[dest] = next(v for v in (given, days[dest], default) if v is not None)
+    return days
+
+
+def merge(argv=None):
+    """Write the outputs of a sharded run from all of its shard result files."""
+    args = parse_merge_args(argv)
+    started = time.monotonic()
+    shard_dir = SHARD_RESULTS_DIR / args.run_id
+    try:
+        docs = load_results(shard_dir)
+        days = recheck_days(docs, args)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print(f"Merging {len(docs)} shards of run {args.run_id}")
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    store = StateStore()
+    sources = load_sources(store)
+    token = authenticate()
+    print("\nFetching PvP reward cutoffs...")
+    fetch_cutoffs(token)
+
+    # Shards don't overlap, but a character reached under two ids could
+    # land in two of them; sorting makes the output independent of the
+    # order shards (and their workers) finished in.
+    merged: dict[tuple[str, str], tuple[dict, dict | None]] = {}
+    icon_cache = load_icon_cache(store)
+    for doc in docs:
+        for char, pvp in doc["results"]:
+            key = character_key(char)
+            if key not in merged or merged[key][1] is None:
+                merged[key] = (char, pvp)
+        _missing_profiles.update(doc["not_found"])
+        icon_cache.merge(doc["icons"])
+    results = [merged[key] for key in sorted(merged)]
+    total = max(doc["unique"] for doc in docs)
+    skipped = {k: sum(doc["skipped"][k] for doc in docs) for k in ("non_arena", "tombstones")}
+
+    non_arena = RecheckIndex(NON_ARENA_PATH, timedelta(days=days["non_arena_recheck_days"]))
+    tombstones = TombstoneIndex(TOMBSTONES_PATH, timedelta(days=days["tombstone_recheck_days"]),
+                                timedelta(days=days["tombstone_max_days"]))
+    all_pvp = publish(token, store, sources, results, total, non_arena, tombstones, skipped,
+                      args.compact_output, icon_cache)
+
+    write_run_stats(started, script="fetch_leaderboard merge", shards=load_stats(shard_dir),
+                    characters={"unique": total, "queried": len(results), "with_pvp": len(all_pvp),
+                                "non_arena_skipped": skipped["non_arena"],
+                                "tombstone_skipped": skipped["tombstones"]})
+    if not args.keep_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    store.close()
+    print("Done (merge).")
+
+
+SUPABASE_BATCH_SIZE = 500
+SUPABASE_ID_CHUNK = 200
+SUPABASE_WORKERS = 4
+
+_supabase_session = requests.Session()
+
+
+def supabase_request(url: str, key: str, method: str, path: str, body=None,
+                     params: dict | None = None, prefer: str = "return=representation"):
     headers = {
         "apikey": key,
         "Authorization": f"Bearer {key}",
         "Content-Type": "application/json",
-        "Prefer": "return=representation",
+        "Prefer": prefer,
     }
     full_url = f"{url}/rest/v1/{path}"
-    resp = requests.request(method, full_url, headers=headers, json=body, timeout=15)
+    try:
+        resp = _supabase_session.request(method, full_url, headers=headers, json=body,
+                                         params=params, timeout=60)
+    except requests.RequestException as e:
+        print(f"  [SUPABASE ERROR] {method} {path}: {e}")
+        return None
     if resp.status_code >= 400:
         print(f"  [SUPABASE ERROR] {method} {path}: {resp.status_code} {resp.text[:200]}")
         return None
     if resp.text:
         return resp.json()
-    return None
+    # Success without a body (Prefer: return=minimal); None means the request failed.
+    return []
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _run_batches(fn, batches: list) -> list:
+    """Run ``fn`` over ``batches`` on SUPABASE_WORKERS pooled threads; returns results in order."""
+    with ThreadPoolExecutor(max_workers=SUPABASE_WORKERS) as executor:
+        return list(executor.map(fn, batches))
 
 
 def sync_to_supabase(url: str, key: str, all_pvp: list[dict]) -> int:
+    """Upsert characters and insert a rating snapshot for every changed bracket.
+
+    Characters are upserted in batches of SUPABASE_BATCH_SIZE, the latest
+    snapshot of every (character, bracket) is read from ``leaderboard_latest``
+    in chunks of SUPABASE_ID_CHUNK ids, and new snapshots are inserted in
+    batches, each stage running on SUPABASE_WORKERS threads sharing one
+    session.
+    """
     now = datetime.now(timezone.utc).isoformat()
-    synced = 0
 
+    chars = {}
     for char in all_pvp:
-        char_row = {
-            "name": char["name"],
-            "realm": char["realm"],
-            "class": char.get("class", ""),
-            "race": char.get("race", ""),
-            "faction": char.get("faction", ""),
-            "guild": char.get("guild", ""),
-            "updated_at": now,
-        }
-
-        headers = {
-            "apikey": key,
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-            "Prefer": "return=representation,resolution=merge-duplicates",
-        }
-        resp = requests.post(
-            f"{url}/rest/v1/characters",
-            headers=headers,
-            json=char_row,
-            params={"on_conflict": "name,realm"},
-            timeout=15,
+        chars[(char["name"], char["realm"])] = char
+    char_rows = [{
+        "name": char["name"],
+        "realm": char["realm"],
+        "class": char.get("class", ""),
+        "race": char.get("race", ""),
+        "faction": char.get("faction", ""),
+        "guild": char.get("guild", ""),
+        "updated_at": now,
+    } for char in chars.values()]
+
+    def upsert(batch):
+        return supabase_request(
+            url, key, "POST", "characters", batch,
+            params={"on_conflict": "name,realm", "select": "id,name,realm"},
+            prefer="return=representation,resolution=merge-duplicates",
         )
-        if resp.status_code >= 400:
-            print(f"  [SUPABASE] character upsert failed for {char['name']}: {resp.text[:100]}")
-            continue
 
-        char_data = resp.json()
-        if not char_data:
+    char_ids = {}
+    batches = _chunks(char_rows, SUPABASE_BATCH_SIZE)
+    for batch, rows in zip(batches, _run_batches(upsert, batches)):
+        if rows is None:
+            print(f"  [SUPABASE] character upsert failed for a batch of {len(batch)}")
             continue
-        char_id = char_data[0]["id"]
-
-        for bracket, bdata in char.get("brackets", {}).items():
-            last = supabase_request(
-                url, key, "GET",
-                f"rating_snapshots?character_id=eq.{char_id}&bracket=eq.{bracket}"
-                f"&order=recorded_at.desc&limit=1",
-            )
-            if last and isinstance(last, list) and len(last) > 0:
-                prev = last[0]
-                if (prev["rating"] == bdata["rating"]
-                        and prev["won"] == bdata["won"]
-                        and prev["lost"] == bdata["lost"]):
-                    continue
-
-            snapshot = {
+        for row in rows:
+            char_ids[(row["name"], row["realm"])] = row["id"]
+
+    def latest(ids):
+        return supabase_request(
+            url, key, "GET", "leaderboard_latest",
+            params={
+                "select": "character_id,bracket,rating,won,lost",
+                "character_id": f"in.({','.join(str(i) for i in ids)})",
+            },
+        ) or []
+
+    last = {}
+    for rows in _run_batches(latest, _chunks(sorted(char_ids.values()), SUPABASE_ID_CHUNK)):
+        for row in rows:
+            last[(row["character_id"], row["bracket"])] = row
+
+    snapshots = []
+    for char_key, char_id in char_ids.items():
+        for bracket, bdata in chars[char_key].get("brackets", {}).items():
+            prev = last.get((char_id, bracket))
+            if (prev and prev["rating"] == bdata["rating"]
+                    and prev["won"] == bdata["won"]
+                    and prev["lost"] == bdata["lost"]):
+                continue
+            snapshots.append({
                 "character_id": char_id,
                 "bracket": bracket,
                 "rating": bdata["rating"],
@@ -683,11 +1397,14 @@ def sync_to_supabase(url: str, key: str, all_pvp: list[dict]) -> int:
                 "lost": bdata["lost"],
                 "played": bdata["played"],
                 "recorded_at": now,
-            }
-            supabase_request(url, key, "POST", "rating_snapshots", snapshot)
-            synced += 1
+            })
+
+    def insert(batch):
+        result = supabase_request(url, key, "POST", "rating_snapshots", batch,
+                                  prefer="return=minimal")
+        return len(batch) if result is not None else 0
 
-    return synced
+    return sum(_run_batches(insert, _chunks(snapshots, SUPABASE_BATCH_SIZE)))
 
 
 if __name__ == "__main__":
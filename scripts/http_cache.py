@@ -0,0 +1,149 @@
+"""On-disk HTTP response cache with ETag / Last-Modified revalidation and LRU eviction."""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import requests
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(url: str, namespace: str) -> str:
+    return hashlib.sha1(f"{namespace}\n{url}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Response bodies stored gzipped under ``directory``, one file per URL+namespace.
+
+    ``index.json`` holds each entry's validators, compressed size and a
+    last-used counter. Entries are evicted least-recently-used first once the
+    total size exceeds ``max_bytes``. The index is only written by
+    ``save()``; body files missing from the index are removed then.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}
+        index_path = self.directory / "index.json"
+        if index_path.exists():
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        self._clock = max((e["used"] for e in self._index.values()), default=0)
+        self._total = sum(e["size"] for e in self._index.values())
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def validators(self, key: str) -> dict:
+        """Conditional request headers for ``key``, empty if it isn't cached."""
+        with self._lock:
+            entry = self._index.get(key)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, key: str) -> dict | None:
+        """Return the cached body after a 304, or None if it is gone."""
+        try:
+            raw = gzip.decompress(self._path(key).read_bytes())
+        except OSError:
+            with self._lock:
+                entry = self._index.pop(key, None)
+                if entry:
+                    self._total -= entry["size"]
+            return None
+        with self._lock:
+            entry = self._index.get(key)
+            if entry:
+                self._clock += 1
+                entry["used"] = self._clock
+            self.hits += 1
+            self.bytes_saved += len(raw)
+        return json.loads(raw)
+
+    def store(self, key: str, resp: requests.Response):
+        """Cache a 200 response if the server sent validators for it."""
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        with self._lock:
+            self.misses += 1
+        if not etag and not last_modified:
+            return
+        data = gzip.compress(resp.content, compresslevel=6)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            old = self._index.get(key)
+            if old:
+                self._total -= old["size"]
+            self._clock += 1
+            self._index[key] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": len(data),
+                "used": self._clock,
+            }
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Caller holds the lock. Evict down to 90% so eviction isn't re-run on every store.
+        target = self.max_bytes * 0.9
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1]["used"]):
+            if self._total <= target:
+                break
+            del self._index[key]
+            self._total -= entry["size"]
+            self._path(key).unlink(missing_ok=True)
+
+    def save(self):
+        """Write the index and drop body files that are no longer indexed."""
+        with self._lock:
+            if self._total > self.max_bytes:
+                self._evict()
+            index = dict(self._index)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob("*/*.json.gz"):
+            if path.name[:-len(".json.gz")] not in index:
+                path.unlink(missing_ok=True)
+        tmp = self.directory / "index.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.directory / "index.json")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self._index),
+                "bytes": self._total,
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"{s['hits']} not-modified hits, {s['misses']} full responses, "
+                f"{s['bytes_saved'] / 1024 / 1024:.1f} MB not re-downloaded, "
+                f"{s['entries']} entries / {s['bytes'] / 1024 / 1024:.1f} MB")
@@ -0,0 +1,220 @@
+"""Sprite atlases of the icons/ JPEGs for the detail page.
+
+Each class gets a talent atlas (every icon in its talent_defs.json trees)
+and a gear atlas (the most worn item icons among all stored characters of
+that class, up to MAX_GEAR_CELLS; the rest stay individual files),
+described by ``icons/atlas/<class>.json``::
+
+    {"v": 1, "cell": 36, "namespace": "static-...", "atlases": {"talents": {...}, "gear": {...}}}
+
+where each atlas is ``{"file", "width", "height", "icons": {name: [x, y]}}``.
+Icons keep their cell once placed and new icons are appended, so an
+atlas is only re-rendered when it gains icons. A gear atlas is repacked
+from the current popularity order instead once more than
+REPACK_STALE_SHARE of its cells hold icons no character wears any more,
+or when the item namespace (``namespace``) changes. Atlas file names
+carry a hash of their content and can be cached indefinitely.
+
+Needs Pillow (optional: pip install pillow); without it no atlases are
+written and detail.js keeps loading the individual icons.
+
+    python scripts/icon_atlas.py
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+try:
+    from PIL import Image
+except ImportError:  # optional: pip install pillow
+    Image = None
+
+FORMAT_VERSION = 1
+CELL = 36
+COLUMNS = 16
+JPEG_QUALITY = 90
+# About 1KB per cell: the whole gear atlas is fetched for a page that shows
+# 17 items, so it only holds each class's most common gear.
+MAX_GEAR_CELLS = 128
+# Repack a gear atlas when more than this share of its cells are unworn.
+REPACK_STALE_SHARE = 0.25
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ICONS_DIR = BASE_DIR / "icons"
+ATLAS_DIR = ICONS_DIR / "atlas"
+TALENT_DEFS_PATH = BASE_DIR / "data" / "talent_defs.json"
+ALL_CHARS_PATH = BASE_DIR / "data" / "all_characters.json"
+
+
+def _load_json(path: Path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def load_talent_defs() -> dict:
+    return _load_json(TALENT_DEFS_PATH, {})
+
+
+def icon_name(path: str) -> str:
+    """``icons/<name>.jpg`` as stored on equipment entries -> ``<name>``."""
+    return path.rsplit("/", 1)[-1].removesuffix(".jpg")
+
+
+def gear_counts(characters: Iterable[dict]) -> dict[str, dict[str, int]]:
+    """{class: {equipment icon path: characters wearing it}}, like StateStore.equipment_icon_counts()."""
+    counts: dict[str, Counter] = {}
+    for char in characters:
+        icons = {eq["icon"] for eq in char.get("equipment", []) if eq.get("icon")}
+        if icons:
+            counts.setdefault(char.get("class"), Counter()).update(icons)
+    return counts
+
+
+def class_icon_sets(talent_defs: dict, gear_icons: dict[str, dict[str, int]]) -> dict[str, dict[str, list[str]]]:
+    """{class slug: {"talents": [...], "gear": [...]}} of icon names.
+
+    Talent icons are in tree order, gear icons by how many characters of
+    the class wear them (``gear_icons``, see gear_counts()), most first.
+    Classes are keyed by their talent_defs.json key in lower case (the
+    detail page maps the character's Korean class name the same way);
+    classes missing from talent_defs are ignored.
+    """
+    slugs = {d.get("ko"): key.lower() for key, d in talent_defs.items()}
+    talents = {slug: {} for slug in slugs.values()}
+    for key, d in talent_defs.items():
+        for tree in d.get("trees", []):
+            for cell in tree.get("grid", []):
+                if cell and cell.get("icon"):
+                    talents[key.lower()][cell["icon"]] = None
+    gear = {slug: Counter() for slug in slugs.values()}
+    for cls, icons in gear_icons.items():
+        slug = slugs.get(cls)
+        if slug is None:
+            continue
+        for path, n in icons.items():
+            gear[slug][icon_name(path)] += n
+    return {slug: {"talents": list(talents[slug]), "gear": [n for n, _ in gear[slug].most_common()]}
+            for slug in slugs.values()}
+
+
+def _layout(previous: dict | None, names: list[str], available: set[str],
+            limit: int | None = None) -> dict[str, list[int]]:
+    """Cell of every icon: previous cells kept, new icons appended after the last one."""
+    cells = dict((previous or {}).get("icons", {}))
+    for name in names:
+        if limit is not None and len(cells) >= limit:
+            break
+        if name in cells or name not in available:
+            continue
+        i = len(cells)
+        cells[name] = [i % COLUMNS * CELL, i // COLUMNS * CELL]
+    return cells
+
+
+def _render(cells: dict[str, list[int]]) -> tuple[bytes, int, int]:
+    rows = -(-len(cells) // COLUMNS)
+    width, height = min(len(cells), COLUMNS) * CELL, rows * CELL
+    atlas = Image.new("RGB", (width, height), (0, 0, 0))
+    for name, (x, y) in cells.items():
+        try:
+            with Image.open(ICONS_DIR / f"{name}.jpg") as icon:
+                icon = icon.convert("RGB")
+                if icon.size != (CELL, CELL):
+                    icon = icon.resize((CELL, CELL), Image.LANCZOS)
+                atlas.paste(icon, (x, y))
+        except OSError:
+            continue  # unreadable download: leave the cell blank
+    out = io.BytesIO()
+    atlas.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue(), width, height
+
+
+def _needs_repack(cells: dict, worn: set[str]) -> bool:
+    stale = sum(1 for name in cells if name not in worn)
+    return stale > REPACK_STALE_SHARE * len(cells)
+
+
+def build_atlases(talent_defs: dict, gear_icons: dict[str, dict[str, int]], directory: Path = ATLAS_DIR,
+                  namespace: str | None = None) -> dict | None:
+    """Add new icons to the class atlases and rewrite the ones that changed.
+
+    Gear atlases grow until full and are repacked when too many of their
+    cells are unworn or ``namespace`` (the item icon namespace; None keeps
+    the recorded one) differs from the manifest's. Returns {class slug:
+    manifest}, or None when Pillow is not installed.
+    """
+    if Image is None:
+        print("Icon atlases: Pillow not installed, skipped (pip install pillow)")
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    available = {p.stem for p in ICONS_DIR.glob("*.jpg")}
+
+    manifests = {}
+    rendered = repacked = 0
+    for slug, kinds in class_icon_sets(talent_defs, gear_icons).items():
+        manifest_path = directory / f"{slug}.json"
+        previous = _load_json(manifest_path, {})
+        if previous.get("v") != FORMAT_VERSION or previous.get("cell") != CELL:
+            previous = {}
+        recorded = previous.get("namespace")
+        current = namespace or recorded
+        atlases = {}
+        for kind, names in kinds.items():
+            old = previous.get("atlases", {}).get(kind)
+            base, limit = old, None
+            if kind == "gear":
+                limit = MAX_GEAR_CELLS
+                moved = recorded is not None and recorded != current
+                if old and (moved or _needs_repack(old.get("icons", {}), set(names))):
+                    base = None
+                    repacked += 1
+            cells = _layout(base, names, available, limit)
+            if not cells:
+                continue
+            if old and old.get("icons") == cells and (directory / old["file"]).exists():
+                atlases[kind] = old
+                continue
+            data, width, height = _render(cells)
+            name = f"{kind}-{slug}.{hashlib.sha1(data).hexdigest()[:12]}.jpg"
+            tmp = directory / f"{name}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, directory / name)
+            atlases[kind] = {"file": name, "width": width, "height": height, "icons": cells}
+            rendered += 1
+        manifest = {"v": FORMAT_VERSION, "cell": CELL, "namespace": current, "atlases": atlases}
+        if manifest != previous:
+            tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, manifest_path)
+        manifests[slug] = manifest
+
+    keep = {a["file"] for m in manifests.values() for a in m["atlases"].values()}
+    removed = 0
+    for path in directory.glob("*.jpg"):
+        if path.name not in keep:
+            path.unlink()
+            removed += 1
+    icons = sum(len(a["icons"]) for m in manifests.values() for a in m["atlases"].values())
+    print(f"Icon atlases: {len(keep)} atlases for {len(manifests)} classes ({icons} cells), "
+          f"{rendered} rendered ({repacked} gear atlases repacked), {removed} removed")
+    return manifests
+
+
+def main():
+    sys.stdout.reconfigure(encoding="utf-8")
+    build_atlases(load_talent_defs(), gear_counts(_load_json(ALL_CHARS_PATH, [])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Icon-name cache for item and talent spell lookups, with expiring negative results."""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from state_store import StateStore
+
+SPELL_PREFIX = "spell_"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IconCache:
+    """Icon name per item id (``"<id>"``) or talent spell (``"spell_<id>"``).
+
+    Every entry records when it was looked up. A lookup that found no icon
+    is kept as a negative entry and retried after ``retry_after *
+    2**(fails - 1)``, capped at ``max_retry``, so a permanently missing icon
+    costs a request every couple of weeks instead of every run while a
+    fixed one is still picked up.
+
+    Entries live in the state store's ``icon_mappings`` table (exported to
+    data/_icon_cache.json). Item icons come from the Blizzard static
+    namespace, so the store records ``namespace`` and item entries from
+    another namespace are dropped; spell icons come from Wowhead and are
+    kept.
+    """
+
+    def __init__(self, store: StateStore, namespace: str, retry_after: timedelta = timedelta(days=1),
+                 max_retry: timedelta = timedelta(days=14)):
+        self.store = store
+        self.namespace = namespace
+        self.retry_after = retry_after
+        self.max_retry = max_retry
+        self._skipped: set[str] = set()
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+        self._entries = store.icon_entries()
+        self._stale: list[str] = []
+        stored = store.icon_namespace()
+        if stored is not None and stored != namespace:
+            self._stale = [k for k in self._entries if not k.startswith(SPELL_PREFIX)]
+            for key in self._stale:
+                del self._entries[key]
+
+    def retry_interval(self, entry: dict) -> timedelta:
+        return min(self.retry_after * 2 ** max(entry.get("fails", 1) - 1, 0), self.max_retry)
+
+    def get(self, key: str) -> str:
+        """The cached icon name, or "" when unknown or not found."""
+        entry = self._entries.get(key)
+        return entry["icon"] if entry else ""
+
+    def needs_lookup(self, key: str, now: datetime | None = None) -> bool:
+        """True if ``key`` was never looked up or its negative entry is due for a retry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return True
+        if entry["icon"]:
+            return False
+        if entry.get("at") is None:
+            return True
+        now = now or _now()
+        if now - datetime.fromisoformat(entry["at"]) >= self.retry_interval(entry):
+            return True
+        with self._lock:
+            self._skipped.add(key)
+        return False
+
+    def record(self, key: str, icon: str | None):
+        """Store a lookup result; an empty ``icon`` counts as another failure."""
+        at = _now().isoformat(timespec="seconds")
+        with self._lock:
+            if icon:
+                self._entries[key] = {"icon": icon, "at": at}
+            else:
+                fails = self._entries.get(key, {}).get("fails", 0) + 1
+                self._entries[key] = {"icon": "", "at": at, "fails": fails}
+            self._dirty.add(key)
+
+    def changes(self) -> dict[str, dict]:
+        """The entries recorded since the last save, without saving them."""
+        with self._lock:
+            return {k: dict(self._entries[k]) for k in self._dirty}
+
+    def merge(self, entries: dict[str, dict]):
+        """Take entries recorded by another process (a crawl shard).
+
+        A found icon wins over a miss; between two misses the later lookup wins.
+        """
+        with self._lock:
+            for key, entry in entries.items():
+                current = self._entries.get(key)
+                if current and current["icon"] and not entry["icon"]:
+                    continue
+                if (current and not current["icon"] and not entry["icon"]
+                        and (current.get("at") or "") >= (entry.get("at") or "")):
+                    continue
+                self._entries[key] = entry
+                self._dirty.add(key)
+
+    @property
+    def skipped(self) -> int:
+        """Distinct negative entries not retried yet because their backoff hasn't elapsed."""
+        return len(self._skipped)
+
+    def icon_names(self) -> set[str]:
+        return {e["icon"] for e in self._entries.values() if e["icon"]}
+
+    def negatives(self) -> int:
+        return sum(1 for e in self._entries.values() if not e["icon"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self):
+        """Write the entries recorded since the last save to the store and export the cache file."""
+        with self._lock:
+            dirty = {k: self._entries[k] for k in self._dirty}
+            self._dirty.clear()
+        self.store.save_icons(dirty, self.namespace, delete=self._stale)
+        self._stale = []
+        self.store.export("icon_cache")
@@ -0,0 +1,95 @@
+"""Ranked bracket entries built from the character list, and merging a few entries into one."""
+
+from bisect import bisect_right
+
+IDENTITY_FIELDS = ("realm_name", "class", "race", "faction", "guild")
+
+
+def build_entries(characters: list[dict], bracket: str, previous: dict | None = None) -> list[dict]:
+    """Ranked entries for ``bracket``, the same as the old per-bracket build_leaderboard().
+
+    Entries are ordered by rating, highest first, with ties in character
+    order, and share a rank when their ratings are equal (1, 1, 3).
+    ``previous`` maps (name, realm) to last run's (rating, rank) and adds
+    the ``rd``/``rkd`` change fields.
+
+    This is one pass building the output dicts directly. Columnar builds
+    (``array`` or NumPy columns, ranking, winrates and diffs in bulk)
+    measured no faster at 100k characters: every caller needs the entry
+    dicts, and creating them plus the (name, realm) lookups of previous
+    ranks costs the same either way.
+    """
+    entries = []
+    append = entries.append
+    for char in characters:
+        bdata = char.get("brackets", {}).get(bracket)
+        if not bdata or not bdata["rating"]:
+            continue
+        w, l = bdata["won"], bdata["lost"]
+        entry = {"name": char["name"], "realm": char["realm"]}
+        for f in IDENTITY_FIELDS:
+            entry[f] = char.get(f, "")
+        entry["rating"] = bdata["rating"]
+        entry["won"] = w
+        entry["lost"] = l
+        entry["played"] = bdata["played"]
+        entry["winrate"] = round(w / (w + l) * 100, 1) if w + l > 0 else 0
+        append(entry)
+    entries.sort(key=lambda e: e["rating"], reverse=True)
+
+    previous_get = (previous or {}).get
+    rank = 0
+    last_rating = None
+    for i, entry in enumerate(entries):
+        r = entry["rating"]
+        if r != last_rating:
+            rank, last_rating = i + 1, r
+        entry["rank"] = rank
+        prev = previous_get((entry["name"], entry["realm"]))
+        if prev:
+            if r != prev[0]:
+                entry["rd"] = r - prev[0]
+            if prev[1] != rank:
+                entry["rkd"] = prev[1] - rank
+    return entries
+
+
+def merge_entries(entries: list[dict], updates: list[dict], replace: set[tuple[str, str]] = frozenset()) -> int:
+    """Insert ``updates`` into the ranked ``entries`` in place, dropping the ``replace`` (name, realm) keys first.
+
+    Each update goes after the entries with a rating at least as high
+    (found by binary search), like a character appended to the end of the
+    list in a full build. Ranks are recomputed from the first changed
+    position on; ``rd``/``rkd`` of the other entries are left as they were.
+    Returns that first position (``len(entries)`` if nothing changed).
+    """
+    lo = len(entries)
+    if replace:
+        kept = [e for e in entries if (e["name"], e["realm"]) not in replace]
+        if len(kept) != len(entries):
+            lo = next(i for i, e in enumerate(entries) if (e["name"], e["realm"]) in replace)
+            entries[:] = kept
+    for entry in sorted(updates, key=lambda e: -e["rating"]):
+        i = bisect_right(entries, -entry["rating"], key=lambda e: -e["rating"])
+        entries.insert(i, entry)
+        lo = min(lo, i)
+    rank = entries[lo - 1]["rank"] if 0 < lo <= len(entries) else 0
+    for i in range(lo, len(entries)):
+        if i == 0 or entries[i]["rating"] != entries[i - 1]["rating"]:
+            rank = i + 1
+        entries[i]["rank"] = rank
+    return min(lo, len(entries))
+
+
+def mark_changes(entries: list[dict], previous: dict) -> None:
+    """Set ``rd``/``rkd`` on ``entries`` from ``previous`` (name, realm) -> (rating, rank).
+
+    For entries already at their final rank, e.g. updates after merge_entries().
+    """
+    for entry in entries:
+        prev = previous.get((entry["name"], entry["realm"]))
+        if prev:
+            if entry["rating"] != prev[0]:
+                entry["rd"] = entry["rating"] - prev[0]
+            if prev[1] != entry["rank"]:
+                entry["rkd"] = prev[1] - entry["rank"]
@@ -0,0 +1,180 @@
+"""Per-run delta patches between two versions of a bracket leaderboard.
+
+A bracket's version is a hash of its entries. Each run that changes a
+bracket writes ``patches/<bracket>.<from>.<to>.json``::
+
+    {"v": 1, "bracket": "3v3", "from": "...", "to": "...", "count": 1234,
+     "carry": false,
+     "removed": [[realm, name], ...],
+     "upsert": [[index, entry], ...]}
+
+and meta.json lists the last PATCH_CHAIN of them per bracket, so a client
+holding any of those versions can catch up patch by patch. Applying a
+patch (apply_patch() here, applyPatch() in app.js):
+
+1. drop the removed and upserted characters from the old entries,
+2. put every upserted entry at its index in the new list,
+3. fill the other slots with the remaining old entries in their old order,
+   with ``rank`` recomputed from the new order. After a full build their
+   ``rd`` is dropped (their rating didn't change) and ``rkd`` becomes the
+   rank change; with ``carry`` (an incremental merge, which leaves other
+   entries' changes alone) both are kept as they were.
+
+An entry that step 3 wouldn't reproduce is upserted: changed stats or
+identity, and unchanged entries whose order relative to the others moved
+(ties reordered). diff_leaderboard() picks whichever of the two modes
+upserts fewer entries, and every patch is checked with apply_patch()
+before it is written.
+"""
+
+import hashlib
+import json
+import os
+from bisect import bisect_left
+from pathlib import Path
+
+FORMAT_VERSION = 1
+# Six-hourly runs: three days of patches.
+PATCH_CHAIN = 12
+# Recomputed by the client for entries that aren't upserted.
+DERIVED_FIELDS = ("rank", "rd", "rkd")
+
+
+def leaderboard_version(entries: list[dict]) -> str:
+    raw = json.dumps(entries, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _key(entry: dict) -> tuple[str, str]:
+    return entry["realm"], entry["name"]
+
+
+def _stable(entry: dict) -> dict:
+    return {k: v for k, v in entry.items() if k not in DERIVED_FIELDS}
+
+
+def _reproduced(old: dict, new: dict, carry: bool) -> bool:
+    """True if filling ``new``'s slot from ``old`` gives ``new``, given its rank is recomputed."""
+    if carry:
+        return {**old, "rank": new["rank"]} == new
+    return (_stable(old) == _stable(new) and "rd" not in new
+            and new.get("rkd", 0) == old.get("rank", 0) - new["rank"])
+
+
+def _longest_increasing(values: list[int]) -> set[int]:
+    """Positions in ``values`` of one longest strictly increasing subsequence."""
+    tails, tail_pos, parent = [], [], [-1] * len(values)
+    for i, v in enumerate(values):
+        j = bisect_left(tails, v)
+        if j == len(tails):
+            tails.append(v)
+            tail_pos.append(i)
+        else:
+            tails[j] = v
+            tail_pos[j] = i
+        parent[i] = tail_pos[j - 1] if j else -1
+    keep = set()
+    i = tail_pos[-1] if tail_pos else -1
+    while i != -1:
+        keep.add(i)
+        i = parent[i]
+    return keep
+
+
+def diff_leaderboard(old: list[dict], new: list[dict]) -> dict:
+    """The patch turning ``old`` into ``new`` (see the module docstring)."""
+    old_pos = {_key(e): i for i, e in enumerate(old)}
+    new_keys = {_key(e) for e in new}
+    best = None
+    for carry in (False, True):
+        # Reproducible entries in new order, with their old positions.
+        same = [(i, old_pos[_key(e)]) for i, e in enumerate(new)
+                if _key(e) in old_pos and _reproduced(old[old_pos[_key(e)]], e, carry)]
+        in_order = _longest_increasing([p for _, p in same])
+        kept = {same[j][0] for j in in_order}
+        if best is None or len(kept) > len(best[1]):
+            best = (carry, kept)
+    carry, kept = best
+    return {
+        "v": FORMAT_VERSION,
+        "from": leaderboard_version(old),
+        "to": leaderboard_version(new),
+        "count": len(new),
+        "carry": carry,
+        "removed": [list(_key(e)) for e in old if _key(e) not in new_keys],
+        "upsert": [[i, e] for i, e in enumerate(new) if i not in kept],
+    }
+
+
+def apply_patch(old: list[dict], patch: dict) -> list[dict] | None:
+    """``old`` with ``patch`` applied, or None if the patch doesn't fit."""
+    gone = {tuple(k) for k in patch["removed"]} | {_key(e) for _, e in patch["upsert"]}
+    old_rank = {_key(e): e.get("rank", 0) for e in old}
+    rest = iter([e for e in old if _key(e) not in gone])
+    out = [None] * patch["count"]
+    for i, entry in patch["upsert"]:
+        if not 0 <= i < len(out):
+            return None
+        out[i] = entry
+    upserted = {i for i, _ in patch["upsert"]}
+    carry = patch.get("carry", False)
+    rank = 0
+    for i in range(len(out)):
+        if out[i] is None:
+            e = next(rest, None)
+            if e is None:
+                return None
+            out[i] = e if carry else _stable(e)
+        if i == 0 or out[i]["rating"] != out[i - 1]["rating"]:
+            rank = i + 1
+        if i not in upserted:
+            e = out[i]
+            if carry:
+                out[i] = {**e, "rank": rank}
+                continue
+            rkd = old_rank[_key(e)] - rank
+            # Same key order as leaderboard_entries.build_entries().
+            out[i] = {**e, "rank": rank, **({"rkd": rkd} if rkd else {})}
+    if next(rest, None) is not None:
+        return None
+    return out
+
+
+def write_patch(directory: Path, bracket: str, old: list[dict] | None, new: list[dict],
+                previous: dict | None) -> dict:
+    """Write the patch from ``old`` to ``new`` and prune patches no longer listed.
+
+    ``previous`` is the bracket's meta.json entry from the last run.
+    Returns ``{"version", "patches"}`` for the new meta.json entry, where
+    ``patches`` is the chain (oldest first) ending at the new version.
+    """
+    directory = Path(directory)
+    version = leaderboard_version(new)
+    chain = list((previous or {}).get("patches", []))
+    if old is not None and chain and chain[-1]["to"] != leaderboard_version(old):
+        chain = []  # the old file isn't the version the chain ends at
+    if old is not None and leaderboard_version(old) != version:
+        patch = diff_leaderboard(old, new)
+        if apply_patch(old, patch) == new:
+            patch["bracket"] = bracket
+            name = f"{bracket}.{patch['from']}.{version}.json"
+            raw = json.dumps(patch, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp = directory / f"{name}.tmp"
+            tmp.write_bytes(raw)
+            os.replace(tmp, directory / name)
+            chain.append({"from": patch["from"], "to": version, "file": f"{directory.name}/{name}",
+                          "bytes": len(raw), "removed": len(patch["removed"]),
+                          "upsert": len(patch["upsert"])})
+        else:
+            print(f"  [WARN] {bracket}: patch does not reproduce the leaderboard, chain restarted")
+            chain = []
+    elif old is None:
+        chain = []
+    chain = chain[-PATCH_CHAIN:]
+
+    listed = {Path(p["file"]).name for p in chain}
+    for path in directory.glob(f"{bracket}.*.json"):
+        if path.name not in listed:
+            path.unlink()
+    return {"version": version, "patches": chain}
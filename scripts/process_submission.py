@@ -4,7 +4,8 @@ import json
 import os
 import re
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from urllib.parse import quote
 
@@ -12,10 +13,26 @@ sys.stdout.reconfigure(encoding="utf-8")
 
 import requests
 
-CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "sources.json"
+from http_cache import ResponseCache, cache_key
+from rate_limiter import bnet_limiter, limited_get
+from state_store import StateStore
+from token_provider import TokenProvider
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+HTTP_CACHE_DIR = BASE_DIR / ".cache" / "http"
 
 DEFAULT_REALM = "fengus-ferocity"
 MAX_WORKERS = 20
+# How long a verification result is trusted. Misses expire sooner: they are
+# often typos fixed in a follow-up submission, or characters created since.
+VERIFIED_TTL = timedelta(days=14)
+NOT_FOUND_TTL = timedelta(days=1)
+# Fetch the roster of a guild found on a verified character when at least
+# this many characters of the same realm still need a profile call.
+ROSTER_MIN_PENDING = 2
+# Profile checks start in small batches that double up to MAX_WORKERS, so
+# rosters found early can cover the rest of a list from the same guild.
+FIRST_BATCH = 4
 
 REALM_ALIASES = {
     "펜구스": "fengus-ferocity",
@@ -33,6 +50,7 @@ NS_PROFILE = "profile-classicann-kr"
 LOCALE = "ko_KR"
 
 _session = requests.Session()
+_token_provider: TokenProvider | None = None
 
 
 def resolve_realm(raw: str) -> str:
@@ -41,48 +59,75 @@ def resolve_realm(raw: str) -> str:
 
 
 def get_access_token() -> str | None:
+    global _token_provider
     cid = os.environ.get("BLIZZARD_CLIENT_ID", "")
     secret = os.environ.get("BLIZZARD_CLIENT_SECRET", "")
     if not cid or not secret:
         return None
     try:
-        resp = requests.post(OAUTH_URL, data={"grant_type": "client_credentials"}, auth=(cid, secret), timeout=30)
-        resp.raise_for_status()
-        return resp.json()["access_token"]
+        _token_provider = TokenProvider(cid, secret, OAUTH_URL)
+        return _token_provider.token()
     except Exception as e:
+        _token_provider = None
         print(f"  [WARN] OAuth failed, skipping validation: {e}")
         return None
 
 
-def verify_guild(token: str, name: str, realm: str) -> bool:
+def bnet_get(token: str, url: str) -> requests.Response:
+    """GET a profile-namespace URL, renewing the token once if it was rejected."""
+    bearer = _token_provider.token() if _token_provider else token
+    params = {"namespace": NS_PROFILE, "locale": LOCALE}
+    resp = limited_get(_session, bnet_limiter, url, headers={"Authorization": f"Bearer {bearer}"},
+                       params=params, timeout=15)
+    if resp.status_code == 401 and _token_provider:
+        bearer = _token_provider.refresh(bearer)
+        resp = limited_get(_session, bnet_limiter, url, headers={"Authorization": f"Bearer {bearer}"},
+                           params=params, timeout=15)
+    return resp
+
+
+def roster_url(name: str, realm: str) -> str:
     slug = name.lower().strip().replace(" ", "-")
-    url = f"{API_BASE}/data/wow/guild/{realm}/{slug}/roster"
+    return f"{API_BASE}/data/wow/guild/{realm}/{slug}/roster"
+
+
+def roster_members(data: dict) -> list[str]:
+    return [m.get("character", {}).get("name", "") for m in data.get("members", [])]
+
+
+def check_roster(token: str, name: str, realm: str) -> tuple[bool | None, list[str]]:
+    """(exists, member names) of a guild; exists is None if the API couldn't tell (not a 404)."""
     try:
-        resp = _session.get(url, headers={"Authorization": f"Bearer {token}"},
-                            params={"namespace": NS_PROFILE, "locale": LOCALE}, timeout=15)
+        resp = bnet_get(token, roster_url(name, realm))
         if resp.status_code != 200:
             print(f"  [API] Guild '{name}' ({realm}): HTTP {resp.status_code}")
-        return resp.status_code == 200
-    except requests.RequestException as e:
+            return (False if resp.status_code == 404 else None), []
+        return True, roster_members(resp.json())
+    except (requests.RequestException, ValueError) as e:
         print(f"  [API] Guild '{name}' ({realm}): {e}")
-        return False
+        return None, []
 
 
-def verify_character(token: str, name: str, realm: str) -> tuple[bool, str]:
-    """Returns (exists, guild_name)."""
+def fetch_roster(token: str, name: str, realm: str) -> list[str] | None:
+    """Member names of a guild, or None if it doesn't exist (or the request failed)."""
+    found, members = check_roster(token, name, realm)
+    return members if found else None
+
+
+def verify_character(token: str, name: str, realm: str) -> tuple[bool | None, str]:
+    """Returns (exists, guild_name); exists is None if the API couldn't tell (not a 404)."""
     encoded = quote(name.lower())
     url = f"{API_BASE}/profile/wow/character/{realm}/{encoded}"
     try:
-        resp = _session.get(url, headers={"Authorization": f"Bearer {token}"},
-                            params={"namespace": NS_PROFILE, "locale": LOCALE}, timeout=15)
+        resp = bnet_get(token, url)
         if resp.status_code != 200:
             print(f"  [API] Character '{name}' ({realm}): HTTP {resp.status_code}")
-            return False, ""
+            return (False if resp.status_code == 404 else None), ""
         guild_name = resp.json().get("guild", {}).get("name", "")
         return True, guild_name
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         print(f"  [API] Character '{name}' ({realm}): {e}")
-        return False, ""
+        return None, ""
 
 
 def parse_issue_body(body: str) -> dict:
@@ -135,18 +180,164 @@ def parse_issue_body(body: str) -> dict:
     return result
 
 
-def _verify_worker(args):
-    kind, token, name, realm = args
-    if kind == "guild":
-        return kind, name, realm, verify_guild(token, name, realm), ""
-    else:
-        exists, guild_name = verify_character(token, name, realm)
-        return kind, name, realm, exists, guild_name
+class Verifier:
+    """Existence checks for submitted guilds and characters with as few API calls as possible.
+
+    A name is resolved, in order, from a recent verification result in the
+    state store (VERIFIED_TTL, or NOT_FOUND_TTL for misses), from guild
+    rosters already at hand (characters stored from earlier crawls, rosters
+    in the HTTP response cache, rosters fetched for submitted guilds) and
+    only then from a profile request. When a profile names a guild whose
+    roster isn't known yet and other characters of its realm are still
+    waiting, the roster is fetched once and checked before their profiles.
+    Only a 404 counts as a miss: a name the API couldn't answer for (429,
+    5xx, network error) is reported as unknown (None) and not cached.
+    """
+
+    def __init__(self, token: str, store: StateStore, sources: dict):
+        self.token = token
+        self.store = store
+        self.now = datetime.now(timezone.utc)
+        self.cached = store.verifications()
+        self.results: list[tuple] = []
+        self.counts = {"cache": 0, "roster": 0, "api": 0, "roster_fetches": 0, "unknown": 0}
+        # (realm, lower-cased name) -> guild, for characters known to exist.
+        self.members: dict[tuple[str, str], str] = {}
+        self.rosters: set[tuple[str, str]] = set()
+        self.response_cache = ResponseCache(HTTP_CACHE_DIR) if HTTP_CACHE_DIR.exists() else None
+        self.source_guilds = sources.get("guilds", [])
+
+    def _cached(self, kind: str, name: str, realm: str) -> tuple[bool, str] | None:
+        hit = self.cached.get((kind, realm, name.lower()))
+        if hit is None:
+            return None
+        found, guild, checked_at = hit
+        if self.now - datetime.fromisoformat(checked_at) > (VERIFIED_TTL if found else NOT_FOUND_TTL):
+            return None
+        self.counts["cache"] += 1
+        return found, guild
+
+    def _record(self, kind: str, name: str, realm: str, found: bool | None, guild: str = ""):
+        if found is None:
+            self.counts["unknown"] += 1
+            return
+        self.results.append((kind, realm, name, found, guild, self.now.isoformat(timespec="seconds")))
+
+    def _add_roster(self, guild: str, realm: str, members: list[str]):
+        self.rosters.add((realm, guild.lower()))
+        for member in members:
+            if member:
+                self.members.setdefault((realm, member.lower()), guild)
+
+    def _load_known(self, realms: set[str], guilds: list[tuple[str, str]]):
+        """Members of stored characters and cached rosters of listed or submitted guilds on ``realms``."""
+        for key, guild in self.store.character_guilds(realms).items():
+            self.members.setdefault(key, guild)
+        if self.response_cache is None:
+            return
+        for name, realm in [(g["name"], g["realm"]) for g in self.source_guilds] + guilds:
+            if realm not in realms or (realm, name.lower()) in self.rosters:
+                continue
+            data = self.response_cache.load(cache_key(roster_url(name, realm), NS_PROFILE))
+            if data:
+                self._add_roster(name, realm, roster_members(data))
+
+    def _guilds(self, guilds: list[tuple[str, str]]) -> dict[tuple[str, str], bool | None]:
+        out, fetch = {}, []
+        for name, realm in guilds:
+            hit = self._cached("guild", name, realm)
+            if hit is not None:
+                out[(name, realm)] = hit[0]
+            else:
+                fetch.append((name, realm))
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            rosters = executor.map(lambda g: check_roster(self.token, *g), fetch)
+            for (name, realm), (found, members) in zip(fetch, rosters):
+                self.counts["api"] += 1
+                out[(name, realm)] = found
+                self._record("guild", name, realm, found)
+                if found:
+                    self._add_roster(name, realm, members)
+        return out
+
+    def _from_rosters(self, name: str, realm: str) -> tuple[bool, str] | None:
+        guild = self.members.get((realm, name.lower()))
+        if guild is None:
+            return None
+        self.counts["roster"] += 1
+        self._record("character", name, realm, True, guild)
+        return True, guild
+
+    def _characters(self, characters: list[tuple[str, str]]) -> dict[tuple[str, str], tuple[bool | None, str]]:
+        out, pending = {}, []
+        for name, realm in characters:
+            hit = self._cached("character", name, realm) or self._from_rosters(name, realm)
+            if hit is not None:
+                out[(name, realm)] = hit
+            else:
+                pending.append((name, realm))
+
+        done, total, size = 0, len(pending), FIRST_BATCH
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            while pending:
+                batch, pending = pending[:size], pending[size:]
+                size = min(size * 2, MAX_WORKERS)
+                for (name, realm), (found, guild) in zip(
+                        batch, executor.map(lambda c: verify_character(self.token, *c), batch)):
+                    self.counts["api"] += 1
+                    out[(name, realm)] = (found, guild)
+                    self._record("character", name, realm, found, guild)
+                    if found:
+                        self.members[(realm, name.lower())] = guild
+                done += len(batch)
+                print(f"  Verified: {done}/{total}")
+
+                for guild, realm in {(g, r) for (_, r), (f, g) in out.items() if f and g}:
+                    waiting = sum(1 for _, r in pending if r == realm)
+                    if (realm, guild.lower()) in self.rosters or waiting < ROSTER_MIN_PENDING:
+                        continue
+                    members = fetch_roster(self.token, guild, realm)
+                    self.counts["roster_fetches"] += 1
+                    self.rosters.add((realm, guild.lower()))
+                    if members:
+                        self._add_roster(guild, realm, members)
+                still = []
+                for name, realm in pending:
+                    hit = self._from_rosters(name, realm)
+                    if hit is not None:
+                        out[(name, realm)] = hit
+                        done += 1
+                    else:
+                        still.append((name, realm))
+                pending = still
+        return out
+
+    def verify(self, to_verify: list[tuple[str, str, str]]) -> list[tuple[str, str, str, bool | None, str]]:
+        """(kind, name, realm, exists, character's guild) for each (kind, name, realm), in order.
+
+        ``exists`` is None for names the API couldn't answer for.
+        """
+        submitted = [(n, r) for k, n, r in to_verify if k == "guild"]
+        guilds = self._guilds(submitted)
+        characters = [(n, r) for k, n, r in to_verify if k == "character"]
+        if characters:
+            self._load_known({r for _, r in characters}, submitted)
+        found = self._characters(characters)
+        return [(k, n, r, guilds[(n, r)], "") if k == "guild" else (k, n, r, *found[(n, r)])
+                for k, n, r in to_verify]
+
+    def save(self):
+        self.store.record_verifications(self.results)
+
+    def summary(self) -> str:
+        c = self.counts
+        return (f"{c['cache']} from cache, {c['roster']} from rosters, {c['api']} API checks, "
+                f"{c['roster_fetches']} rosters fetched for lookups, {c['unknown']} unknown")
 
 
 def update_sources(new_entries: dict, token: str | None) -> tuple[list[str], list[str]]:
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        sources = json.load(f)
+    store = StateStore()
+    sources = store.sources()
 
     existing_guilds = {(g["name"].lower(), g["realm"]) for g in sources.get("guilds", [])}
     existing_chars = {(c["name"].lower(), c["realm"]) for c in sources.get("characters", [])}
@@ -177,77 +368,66 @@ def update_sources(new_entries: dict, token: str | None) -> tuple[list[str], lis
     added = []
     added_entries = {"guilds": [], "characters": []}
     not_found = []
+    unverified = []
     skipped = list(already_skipped)
 
     if not token:
         for kind, name, realm in to_verify:
             if kind == "guild":
-                sources.setdefault("guilds", []).append({"name": name, "realm": realm})
                 added.append(f"길드: {name} ({realm})")
                 added_entries["guilds"].append({"name": name, "realm": realm})
             else:
-                sources.setdefault("characters", []).append({"name": name, "realm": realm})
                 added.append(f"캐릭터: {name} ({realm})")
                 added_entries["characters"].append({"name": name, "realm": realm})
     else:
-        tasks = [(kind, token, name, realm) for kind, name, realm in to_verify]
-        done = 0
-        total = len(tasks)
         discovered_guilds = []
-
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {executor.submit(_verify_worker, t): t for t in tasks}
-            for future in as_completed(futures):
-                kind, name, realm, exists, char_guild = future.result()
-                done += 1
-                if done % 100 == 0 or done == total:
-                    print(f"  Verified: {done}/{total}")
-
-                if exists:
-                    if kind == "guild":
-                        sources.setdefault("guilds", []).append({"name": name, "realm": realm})
-                        added.append(f"길드: {name} ({realm})")
-                        added_entries["guilds"].append({"name": name, "realm": realm})
-                    else:
-                        sources.setdefault("characters", []).append({"name": name, "realm": realm})
-                        added.append(f"캐릭터: {name} ({realm})")
-                        added_entries["characters"].append({"name": name, "realm": realm})
-                        if char_guild:
-                            discovered_guilds.append({"name": char_guild, "realm": realm})
+        verifier = Verifier(token, store, sources)
+        results = verifier.verify(to_verify)
+        print(f"  Verification: {verifier.summary()}")
+        verifier.save()
+
+        for kind, name, realm, exists, char_guild in results:
+            if exists:
+                if kind == "guild":
+                    added.append(f"길드: {name} ({realm})")
+                    added_entries["guilds"].append({"name": name, "realm": realm})
                 else:
-                    label = '길드' if kind == 'guild' else '캐릭터'
-                    not_found.append(f"{label}: {name} ({realm})")
-                    skipped.append(f"{label}: {name} (존재하지 않음)")
-
-        if discovered_guilds:
-            existing_g = {(g["name"].lower(), g["realm"]) for g in sources.get("guilds", [])}
-            auto_added = 0
-            for g in discovered_guilds:
-                key = (g["name"].lower(), g["realm"])
-                if key not in existing_g:
-                    existing_g.add(key)
-                    sources.setdefault("guilds", []).append(g)
-                    auto_added += 1
-                    print(f"  [AUTO] Guild discovered: {g['name']} ({g['realm']})")
-            if auto_added:
-                print(f"  Auto-discovered {auto_added} new guilds from character data")
+                    added.append(f"캐릭터: {name} ({realm})")
+                    added_entries["characters"].append({"name": name, "realm": realm})
+                    if char_guild:
+                        discovered_guilds.append({"name": char_guild, "realm": realm})
+            elif exists is None:
+                label = '길드' if kind == 'guild' else '캐릭터'
+                unverified.append(f"{label}: {name} ({realm})")
+                skipped.append(f"{label}: {name} (확인 실패)")
+            else:
+                label = '길드' if kind == 'guild' else '캐릭터'
+                not_found.append(f"{label}: {name} ({realm})")
+                skipped.append(f"{label}: {name} (존재하지 않음)")
+
+    store.add_sources("guild", added_entries["guilds"])
+    store.add_sources("character", added_entries["characters"])
+    if token and discovered_guilds:
+        auto_added = store.add_sources("guild", discovered_guilds)
+        for g in auto_added:
+            print(f"  [AUTO] Guild discovered: {g['name']} ({g['realm']})")
+        if auto_added:
+            print(f"  Auto-discovered {len(auto_added)} new guilds from character data")
 
     result_path = Path("/tmp/submission_result.json")
     result_data = {
         "duplicates": already_skipped,
         "not_found": not_found,
+        "unverified": unverified,
         "added": added,
     }
     with open(result_path, "w", encoding="utf-8") as f:
         json.dump(result_data, f, ensure_ascii=False, indent=2)
 
     if added:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(sources, f, ensure_ascii=False, indent=2)
-
-        added_path = CONFIG_PATH.parent / "_added.json"
-        with open(added_path, "w", encoding="utf-8") as f:
-            json.dump(added_entries, f, ensure_ascii=False, indent=2)
+        store.set_pending(added_entries)
+        store.export("sources", "added")
+    store.close()
 
     return added, skipped
 
@@ -272,6 +452,8 @@ def main():
         print("  [WARN] No API credentials, skipping existence check")
 
     added, skipped = update_sources(entries, token)
+    if token:
+        print(f"  Rate limiter: {bnet_limiter.summary()}")
 
     if added:
         print(f"\nAdded {len(added)} new entries:")
@@ -0,0 +1,155 @@
+"""Process-wide adaptive token-bucket rate limiter shared by every API caller."""
+
+import threading
+import time
+
+import requests
+
+from run_stats import run_stats
+
+# Blizzard API quotas per client: 100 requests/second, 36,000 requests/hour.
+BNET_PER_SECOND = 100
+BNET_PER_HOUR = 36000
+
+RATE_LIMIT_RETRIES = 5
+
+
+class RateLimiter:
+    """Token bucket with a second, hour-long bucket and adaptive back-off.
+
+    Every caller takes a token with ``acquire()`` before sending a request.
+    When any caller receives a 429 it reports it with ``throttle()``: all
+    callers then pause until ``Retry-After`` has passed, the refill rate is
+    halved, and it ramps back linearly to the full rate over
+    ``recovery_seconds``.
+    """
+
+    def __init__(self, name: str, per_second: float, per_hour: int | None = None,
+                 headroom: float = 0.9, recovery_seconds: float = 60.0):
+        self.name = name
+        self.max_rate = per_second * headroom
+        self.min_rate = self.max_rate * 0.1
+        self.rate = self.max_rate
+        self.capacity = max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.hour_capacity = per_hour * headroom if per_hour else None
+        self.hour_tokens = self.hour_capacity
+        self.recovery_seconds = recovery_seconds
+
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttle_events = 0
+        self.throttled_seconds = 0.0
+        self.paused_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        self._last = now
+        if elapsed <= 0:
+            return
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * elapsed / self.recovery_seconds)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        if self.hour_capacity is not None:
+            self.hour_tokens = min(self.hour_capacity,
+                                   self.hour_tokens + elapsed * self.hour_capacity / 3600)
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1 and (self.hour_tokens is None or self.hour_tokens >= 1):
+                    self.tokens -= 1
+                    if self.hour_tokens is not None:
+                        self.hour_tokens -= 1
+                    self.requests += 1
+                    self.throttled_seconds += waited
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+                    if self.hour_tokens is not None and self.hour_tokens < 1:
+                        wait = max(wait, (1 - self.hour_tokens) * 3600 / self.hour_capacity)
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, retry_after: float):
+        """Pause every caller after a 429 and cut the refill rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttle_events += 1
+            self.tokens = 0.0
+            # Requests already in flight when the first 429 arrived come back
+            # as 429s too; they extend the pause but don't cut the rate again.
+            if now >= self.paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            until = now + retry_after
+            if until <= self.paused_until:
+                return
+            self.paused_seconds += until - max(now, self.paused_until)
+            self.paused_until = until
+        print(f"  [RATE LIMIT] {self.name}: pausing all workers for {retry_after:g}s "
+              f"(rate now {self.rate:.1f}/s)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "requests": self.requests,
+                "rate_per_second": round(self.rate, 2),
+                "tokens": round(self.tokens, 2),
+                "hour_tokens": round(self.hour_tokens) if self.hour_tokens is not None else None,
+                "throttle_events": self.throttle_events,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "paused_seconds": round(self.paused_seconds, 2),
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        hour = f", hour tokens {s['hour_tokens']}" if s["hour_tokens"] is not None else ""
+        return (f"{self.name}: {s['requests']} requests, {s['throttle_events']} x 429, "
+                f"workers waited {s['throttled_seconds']}s (paused {s['paused_seconds']}s), "
+                f"rate {s['rate_per_second']}/s, tokens {s['tokens']}{hour}")
+
+
+bnet_limiter = RateLimiter("battle.net", BNET_PER_SECOND, BNET_PER_HOUR)
+wowhead_limiter = RateLimiter("wowhead", 20)
+
+
+def limited_get(session: requests.Session, limiter: RateLimiter, url: str,
+                **kwargs) -> requests.Response:
+    """GET through ``limiter``, waiting out 429s together with all other workers.
+
+    Returns the last response, which is still a 429 if the server kept
+    refusing after RATE_LIMIT_RETRIES pauses. Every attempt is recorded in
+    run_stats; a request that raises is recorded with status "error".
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        start = time.monotonic()
+        limiter.acquire()
+        sent = time.monotonic()
+        run_stats.record_wait(url, sent - start, after_429=attempt > 0)
+        if attempt:
+            run_stats.record_retry(url)
+        try:
+            resp = session.get(url, **kwargs)
+        except requests.RequestException:
+            run_stats.record(url, "error", time.monotonic() - sent)
+            raise
+        run_stats.record(url, resp.status_code, time.monotonic() - sent, len(resp.content))
+        if resp.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            return resp
+        try:
+            wait = float(resp.headers.get("Retry-After", 5))
+        except ValueError:
+            wait = 5.0
+        limiter.throttle(wait)
+    return resp
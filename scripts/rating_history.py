@@ -0,0 +1,275 @@
+"""Gzip-compressed log of bracket stats with a base snapshot, and 24h/7d/season deltas per leaderboard.
+
+The log is a series of gzip members, one appended per run that changed
+anything. Each member holds one JSON line::
+
+    {"t": 1760600000, "season": 1,
+     "rows": [[realm, name, bracket, rating, won, lost, played], ...]}
+
+with a row only for the (character, bracket) stats that differ from the
+last row logged for them, so a character whose ratings didn't move costs
+nothing. Records older than RETAIN (the longest finite window plus a day)
+are folded into the base snapshot next to the log::
+
+    {"v": 1, "t": <last folded record>, "season": 1,
+     "rows": [[realm, name, bracket, rating, won, lost, played, season], ...],
+     "first": [[realm, name, bracket, rating], ...]}
+
+holding every key's last values as of ``t`` and its first rating logged
+in ``season``. Both files stay bounded: the snapshot by the number of
+characters, the log by RETAIN. A run reads them once; trends() then
+returns, for every entry of every bracket, the rating and rank change
+since the start of each window.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from search_index import entries_digest
+
+FORMAT_VERSION = 1
+# Window name -> how far back it reaches; None: since the current season began.
+WINDOWS = {"24h": timedelta(hours=24), "7d": timedelta(days=7), "season": None}
+# Log records younger than this are kept as they are; older ones go into the base snapshot.
+RETAIN = max(span for span in WINDOWS.values() if span) + timedelta(days=1)
+
+
+def _season_of(characters: list[dict]) -> int | None:
+    seasons = [b.get("season_id") for c in characters for b in c.get("brackets", {}).values()]
+    seasons = [s for s in seasons if s is not None]
+    return max(seasons) if seasons else None
+
+
+def _ranks(ratings: dict) -> dict:
+    """Competition rank (1, 1, 3) of every key with a non-zero rating, highest first."""
+    order = sorted((r, k) for k, r in ratings.items() if r)
+    ranks = {}
+    rank, last = 0, None
+    for i, (r, k) in enumerate(reversed(order)):
+        if r != last:
+            rank, last = i + 1, r
+        ranks[k] = rank
+    return ranks
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def _empty_base() -> dict:
+    return {"v": FORMAT_VERSION, "t": 0, "season": None, "rows": [], "first": []}
+
+
+class RatingHistory:
+    """The rating log at ``path`` and its base snapshot; a truncated log reads as the records before the damage.
+
+    ``base_path`` defaults to ``<name>.base.json.gz`` next to the log.
+    Log records not newer than the snapshot are skipped, so a run that
+    stops between writing the snapshot and rewriting the log loses nothing.
+    """
+
+    def __init__(self, path: Path, base_path: Path | None = None, retain: timedelta = RETAIN):
+        self.path = Path(path)
+        self.base_path = Path(base_path) if base_path else self.path.with_name(
+            self.path.name.split(".")[0] + ".base.json.gz")
+        self.retain = retain
+        self._base: dict | None = None
+        self._records: list[dict] | None = None
+        self._last: dict[tuple, tuple] | None = None
+        self._damaged = False
+
+    def _read_base(self) -> dict:
+        if not self.base_path.exists():
+            return _empty_base()
+        try:
+            with gzip.open(self.base_path, "rt", encoding="utf-8") as f:
+                base = json.load(f)
+            if base.get("v") == FORMAT_VERSION:
+                return base
+        except (OSError, EOFError, ValueError) as e:
+            print(f"  [WARN] {self.base_path.name}: unreadable ({e})")
+        return _empty_base()
+
+    def _read_log(self):
+        if not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (OSError, EOFError, ValueError) as e:
+            self._damaged = True
+            print(f"  [WARN] {self.path.name}: unreadable after the last good record ({e})")
+
+    def _load(self):
+        if self._records is None:
+            self._base = self._read_base()
+            self._records = [r for r in self._read_log() if r["t"] > self._base["t"]]
+
+    def records(self) -> list[dict]:
+        """Every logged run newer than the base snapshot, oldest first, as the decoded JSON objects."""
+        self._load()
+        return list(self._records)
+
+    def _write_log(self, records: list[dict]):
+        """Rewrite the log as ``records``, so appends don't land after a damaged or folded member."""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            for record in records:
+                f.write(gzip.compress((_dumps(record) + "\n").encode("utf-8"), compresslevel=9, mtime=0))
+        os.replace(tmp, self.path)
+        self._damaged = False
+
+    def last_values(self) -> dict[tuple, tuple]:
+        """(realm, name, bracket) -> last logged (rating, won, lost, played)."""
+        if self._last is None:
+            self._load()
+            self._last = {(realm, name, bracket): tuple(values[:4])
+                          for realm, name, bracket, *values in self._base["rows"]}
+            for record in self._records:
+                for realm, name, bracket, *values in record["rows"]:
+                    self._last[(realm, name, bracket)] = tuple(values)
+        return self._last
+
+    def append(self, characters: list[dict], at: datetime | None = None) -> int:
+        """Log the bracket stats of ``characters`` that changed; returns how many rows were written.
+
+        Characters not in ``characters`` (not fetched this run) keep their
+        last logged values. Records older than ``retain`` are then folded
+        into the base snapshot.
+        """
+        last = self.last_values()
+        rows = []
+        for char in characters:
+            for bracket, b in char.get("brackets", {}).items():
+                key = (char["realm"], char["name"], bracket)
+                values = (b.get("rating", 0), b.get("won", 0), b.get("lost", 0), b.get("played", 0))
+                if last.get(key) != values:
+                    last[key] = values
+                    rows.append([*key, *values])
+        if not rows:
+            return 0
+        if self._damaged:
+            self._write_log(self._records)
+        at = at or datetime.now(timezone.utc)
+        record = {"t": int(at.timestamp()), "season": _season_of(characters), "rows": rows}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Appending a gzip member leaves earlier members untouched; readers
+        # decompress the concatenation as one stream.
+        with open(self.path, "ab") as f:
+            f.write(gzip.compress((_dumps(record) + "\n").encode("utf-8"), compresslevel=9, mtime=0))
+            f.flush()
+            os.fsync(f.fileno())
+        self._records.append(record)
+        self._compact(at)
+        return len(rows)
+
+    def _compact(self, now: datetime):
+        """Fold the records older than ``retain`` into the base snapshot and drop them from the log."""
+        cutoff = (now - self.retain).timestamp()
+        old = [r for r in self._records if r["t"] < cutoff]
+        if not old:
+            return
+        base = self._base
+        last = {(realm, name, bracket): values for realm, name, bracket, *values in base["rows"]}
+        first = {(realm, name, bracket): rating for realm, name, bracket, rating in base["first"]}
+        season = base["season"]
+        for record in old:
+            record_season = record.get("season")
+            if record_season is not None and record_season != season:
+                season, first = record_season, {}
+            for realm, name, bracket, *values in record["rows"]:
+                key = (realm, name, bracket)
+                last[key] = [*values, record_season]
+                first.setdefault(key, values[0])
+        self._base = {"v": FORMAT_VERSION, "t": max(r["t"] for r in old), "season": season,
+                      "rows": [[*k, *v] for k, v in sorted(last.items())],
+                      "first": [[*k, r] for k, r in sorted(first.items())]}
+        tmp = self.base_path.with_name(self.base_path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(_dumps(self._base).encode("utf-8"), compresslevel=9, mtime=0))
+        os.replace(tmp, self.base_path)
+        self._records = [r for r in self._records if r["t"] > self._base["t"]]
+        self._write_log(self._records)
+
+    def trends(self, leaderboards: dict[str, list[dict]], now: datetime | None = None,
+               windows: dict[str, timedelta | None] = WINDOWS) -> dict[str, dict[str, dict]]:
+        """Rating and rank change of every entry over each window, from the snapshot and log read once.
+
+        A character's baseline for a window is its last logged rating at the
+        window's start, or its first one inside the window if it was logged
+        later; for ``season`` it is the first rating logged in the current
+        season. Only records from the current season (the latest record's)
+        are used. Baseline ranks are ranks among all characters logged for
+        the bracket at that point. Windows must not reach back past the
+        snapshot (``retain`` is longer than every finite window). Returns
+        ``{bracket: {window: {"rd": [...], "rkd": [...]}}}`` with lists in
+        ``leaderboards[bracket]`` order, 0 where nothing changed.
+        """
+        now = now or datetime.now(timezone.utc)
+        cutoffs = {w: (now - span).timestamp() if span is not None else None for w, span in windows.items()}
+        self._load()
+        records, snapshot = self._records, self._base
+        season = records[-1].get("season") if records else snapshot["season"]
+
+        def current(s):
+            return season is None or s in (season, None)
+
+        at_snapshot = {b: {} for b in leaderboards}
+        for realm, name, bracket, rating, _won, _lost, _played, s in snapshot["rows"]:
+            if bracket in leaderboards and current(s):
+                at_snapshot[bracket][(name, realm)] = rating
+        season_first = {b: {} for b in leaderboards}
+        if current(snapshot["season"]):
+            for realm, name, bracket, rating in snapshot["first"]:
+                if bracket in leaderboards:
+                    season_first[bracket][(name, realm)] = rating
+        base = {w: {b: dict(season_first[b] if cutoff is None else at_snapshot[b]) for b in leaderboards}
+                for w, cutoff in cutoffs.items()}
+
+        for record in records:
+            if not current(record.get("season")):
+                continue
+            t = record["t"]
+            for realm, name, bracket, rating, *_ in record["rows"]:
+                if bracket not in leaderboards:
+                    continue
+                key = (name, realm)
+                for w, cutoff in cutoffs.items():
+                    ratings = base[w][bracket]
+                    if cutoff is not None and t <= cutoff:
+                        ratings[key] = rating
+                    else:
+                        ratings.setdefault(key, rating)
+
+        out = {}
+        for bracket, entries in leaderboards.items():
+            out[bracket] = {}
+            for w in windows:
+                ratings = base[w][bracket]
+                ranks = _ranks(ratings)
+                rd, rkd = [], []
+                for e in entries:
+                    key = (e["name"], e["realm"])
+                    old = ratings.get(key)
+                    rd.append(e["rating"] - old if old else 0)
+                    rkd.append(ranks[key] - e["rank"] if key in ranks else 0)
+                out[bracket][w] = {"rd": rd, "rkd": rkd}
+        return out
+
+
+def write_trends(directory: Path, bracket: str, entries: list[dict], trends: dict[str, dict]) -> dict:
+    """Write ``<bracket>.trends.json`` for app.js; returns the meta.json entry."""
+    directory = Path(directory)
+    name = f"{bracket}.trends.json"
+    doc = {"v": FORMAT_VERSION, "count": len(entries), "digest": entries_digest(entries),
+           "windows": trends}
+    raw = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    tmp = directory / f"{name}.tmp"
+    tmp.write_bytes(raw)
+    os.replace(tmp, directory / name)
+    return {"file": name, "digest": doc["digest"], "windows": list(trends)}
@@ -0,0 +1,140 @@
+"""JSON-backed index of characters that only need to be re-queried occasionally."""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+def _entry_key(name: str, realm: str) -> str:
+    return f"{realm}/{name.lower()}"
+
+
+class RecheckIndex:
+    """Characters to leave out of a crawl until their re-check is due.
+
+    Entries are keyed by ``realm/name`` and also matched by character id, so
+    a renamed character is still recognised. Each entry records when the
+    character was last checked and how many consecutive checks found it in
+    the indexed state (``misses``). Due times are spread by up to
+    ``jitter`` of the interval per character, so entries recorded in the same
+    run don't all come due in the same later run.
+    """
+
+    def __init__(self, path: Path, interval: timedelta, jitter: float = 0.5):
+        self.path = Path(path)
+        self.interval = interval
+        self.jitter = jitter
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        self._by_id = {e["id"]: k for k, e in self._entries.items() if e.get("id")}
+
+    def _find(self, char: dict) -> str | None:
+        key = _entry_key(char["name"], char["realm"])
+        if key in self._entries:
+            return key
+        return self._by_id.get(char.get("id") or 0)
+
+    def _spread(self, key: str) -> float:
+        digest = hashlib.sha1(key.encode("utf-8")).digest()
+        return 1 + self.jitter * digest[0] / 255
+
+    def interval_for(self, entry: dict) -> timedelta:
+        return self.interval
+
+    def should_skip(self, char: dict, now: datetime | None = None) -> bool:
+        """True if ``char`` is indexed and its re-check is not yet due."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            key = self._find(char)
+            if key is None:
+                return False
+            entry = self._entries[key]
+            checked_at = datetime.fromisoformat(entry["checked_at"])
+            if now - checked_at >= self.interval_for(entry) * self._spread(key):
+                return False
+            self.skipped += 1
+            return True
+
+    def record(self, char: dict):
+        """Mark ``char`` as checked now and still in the indexed state."""
+        key = _entry_key(char["name"], char["realm"])
+        with self._lock:
+            old_key = self._find(char)
+            entry = self._entries.pop(old_key, {}) if old_key else {}
+            char_id = char.get("id") or entry.get("id", 0)
+            self._entries[key] = {
+                "id": char_id,
+                "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "misses": entry.get("misses", 0) + 1,
+            }
+            if char_id:
+                self._by_id[char_id] = key
+
+    def discard(self, char: dict):
+        """Drop ``char`` from the index (it is no longer in the indexed state)."""
+        with self._lock:
+            key = self._find(char)
+            if key is None:
+                return
+            entry = self._entries.pop(key)
+            self._by_id.pop(entry.get("id") or 0, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class TombstoneIndex(RecheckIndex):
+    """Characters whose profile answered 404 (deleted, renamed or transferred).
+
+    Each consecutive miss doubles the wait before the next check, from
+    ``interval`` up to ``max_interval``. Entries are matched by
+    ``realm/name`` only: a character found under another name with a
+    tombstoned id is alive, and its old name is recorded as ``renamed_to``
+    and re-checked at ``max_interval`` from then on.
+    """
+
+    def __init__(self, path: Path, interval: timedelta, max_interval: timedelta, jitter: float = 0.5):
+        super().__init__(path, interval, jitter)
+        self.max_interval = max_interval
+
+    def _find(self, char: dict) -> str | None:
+        key = _entry_key(char["name"], char["realm"])
+        return key if key in self._entries else None
+
+    def interval_for(self, entry: dict) -> timedelta:
+        if entry.get("renamed_to"):
+            return self.max_interval
+        return min(self.interval * 2 ** max(entry.get("misses", 1) - 1, 0), self.max_interval)
+
+    def record(self, char: dict):
+        old_key = self._find(char)
+        renamed_to = self._entries[old_key].get("renamed_to") if old_key else None
+        super().record(char)
+        if renamed_to:
+            self._entries[_entry_key(char["name"], char["realm"])]["renamed_to"] = renamed_to
+
+    def discard(self, char: dict):
+        """Drop ``char``'s tombstone, and mark a tombstone under its old name as renamed."""
+        super().discard(char)
+        key = _entry_key(char["name"], char["realm"])
+        with self._lock:
+            old_key = self._by_id.get(char.get("id") or 0)
+            if old_key and old_key != key:
+                self._entries[old_key]["renamed_to"] = key
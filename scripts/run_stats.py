@@ -0,0 +1,138 @@
+"""Per-endpoint request metrics collected over a run and written to data/_run_stats.json."""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+# First matching pattern names the endpoint class of a request URL.
+ENDPOINT_PATTERNS = [
+    ("roster", re.compile(r"/data/wow/guild/[^/]+/[^/]+/roster")),
+    ("pvp-bracket", re.compile(r"/profile/wow/character/[^/]+/[^/]+/pvp-bracket/")),
+    ("specializations", re.compile(r"/profile/wow/character/[^/]+/[^/]+/specializations")),
+    ("equipment", re.compile(r"/profile/wow/character/[^/]+/[^/]+/equipment")),
+    ("media", re.compile(r"/profile/wow/character/[^/]+/[^/]+/character-media")),
+    ("profile", re.compile(r"/profile/wow/character/[^/]+/[^/]+/?$")),
+    ("item-media", re.compile(r"/data/wow/media/item/")),
+    ("pvp-reward", re.compile(r"/data/wow/pvp-season/")),
+    ("tooltip", re.compile(r"/tooltip/spell/")),
+    ("icon", re.compile(r"/icons/.+\.jpg$")),
+]
+
+PERCENTILES = (50, 90, 99)
+
+
+def endpoint_class(url: str) -> str:
+    path = url.split("?", 1)[0]
+    for name, pattern in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return name
+    return "other"
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[idx]
+
+
+class _Endpoint:
+    __slots__ = ("statuses", "latencies", "bytes", "retries", "limiter_wait", "rate_limit_sleep")
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.latencies: list[float] = []
+        self.bytes = 0
+        self.retries = 0
+        self.limiter_wait = 0.0
+        self.rate_limit_sleep = 0.0
+
+
+class RunStats:
+    """Thread-safe request counters, grouped by endpoint_class() of the URL.
+
+    Each HTTP attempt is one request: a request retried after a 429 or an
+    error counts twice and also bumps ``retries``. ``limiter_wait`` is the
+    time spent waiting for a rate-limiter token before a first attempt and
+    ``rate_limit_sleep`` the wait before an attempt that follows a 429, both
+    summed over workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, _Endpoint] = {}
+
+    def _get(self, url: str) -> _Endpoint:
+        # Caller holds the lock.
+        name = endpoint_class(url)
+        ep = self._endpoints.get(name)
+        if ep is None:
+            ep = self._endpoints[name] = _Endpoint()
+        return ep
+
+    def record(self, url: str, status: int | str, latency: float, nbytes: int = 0):
+        with self._lock:
+            ep = self._get(url)
+            ep.statuses[str(status)] += 1
+            ep.latencies.append(latency)
+            ep.bytes += nbytes
+
+    def record_wait(self, url: str, seconds: float, after_429: bool):
+        with self._lock:
+            ep = self._get(url)
+            if after_429:
+                ep.rate_limit_sleep += seconds
+            else:
+                ep.limiter_wait += seconds
+
+    def record_retry(self, url: str):
+        with self._lock:
+            self._get(url).retries += 1
+
+    def endpoints(self) -> dict:
+        with self._lock:
+            items = [(name, ep, sorted(ep.latencies)) for name, ep in self._endpoints.items()]
+        out = {}
+        for name, ep, lat in sorted(items, key=lambda t: -sum(t[2])):
+            out[name] = {
+                "requests": len(lat),
+                "status": dict(sorted(ep.statuses.items())),
+                "latency_ms": {
+                    **{f"p{p}": round(_percentile(lat, p) * 1000, 1) for p in PERCENTILES},
+                    "max": round(lat[-1] * 1000, 1) if lat else 0.0,
+                    "mean": round(sum(lat) / len(lat) * 1000, 1) if lat else 0.0,
+                },
+                "total_seconds": round(sum(lat), 2),
+                "bytes": ep.bytes,
+                "retries": ep.retries,
+                "limiter_wait_seconds": round(ep.limiter_wait, 2),
+                "rate_limit_sleep_seconds": round(ep.rate_limit_sleep, 2),
+            }
+        return out
+
+    def summary_lines(self) -> list[str]:
+        lines = []
+        for name, s in self.endpoints().items():
+            lat = s["latency_ms"]
+            lines.append(f"  {name:<16}{s['requests']:>7} req  p50 {lat['p50']:>7.1f}ms  "
+                         f"p90 {lat['p90']:>7.1f}ms  p99 {lat['p99']:>7.1f}ms  "
+                         f"{s['bytes'] / 1024 / 1024:>7.1f} MB  {s['retries']} retries  "
+                         f"429 sleep {s['rate_limit_sleep_seconds']}s")
+        return lines
+
+    def write(self, path: Path, extra: dict | None = None):
+        """Write endpoint metrics plus ``extra`` run-level fields to ``path``."""
+        out = dict(extra or {})
+        out["endpoints"] = self.endpoints()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+
+run_stats = RunStats()
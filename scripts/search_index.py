@@ -0,0 +1,126 @@
+"""Prebuilt substring search index and sort permutations for a leaderboard file.
+
+Keys are every suffix of the lower-cased, NFC-normalised tokens of each
+entry's name, guild, class and realm name, with Hangul syllables
+decomposed into compatibility jamo, so a query typed syllable by syllable
+(including the intermediate IME states) anywhere in a token is a prefix
+of a key. Tokens containing Hangul also get their chosung (initial
+consonant) suffixes. app.js decomposes the query the same way and
+binary-searches the sorted keys; before the index loads it matches
+against the same keys built per entry (entryKeys() mirrors entry_keys()).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import unicodedata
+from pathlib import Path
+
+FORMAT_VERSION = 2
+SEARCH_FIELDS = ("name", "guild", "class", "realm_name")
+
+HANGUL_BASE = 0xAC00
+HANGUL_LAST = 0xD7A3
+CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+# Compound vowels and finals are split so that partially typed syllables match.
+JUNGSUNG = ["ㅏ", "ㅐ", "ㅑ", "ㅒ", "ㅓ", "ㅔ", "ㅕ", "ㅖ", "ㅗ", "ㅗㅏ", "ㅗㅐ", "ㅗㅣ", "ㅛ", "ㅜ",
+            "ㅜㅓ", "ㅜㅔ", "ㅜㅣ", "ㅠ", "ㅡ", "ㅡㅣ", "ㅣ"]
+JONGSUNG = ["", "ㄱ", "ㄲ", "ㄱㅅ", "ㄴ", "ㄴㅈ", "ㄴㅎ", "ㄷ", "ㄹ", "ㄹㄱ", "ㄹㅁ", "ㄹㅂ", "ㄹㅅ",
+            "ㄹㅌ", "ㄹㅍ", "ㄹㅎ", "ㅁ", "ㅂ", "ㅂㅅ", "ㅅ", "ㅆ", "ㅇ", "ㅈ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ"]
+COMPOUND_JAMO = {
+    "ㄳ": "ㄱㅅ", "ㄵ": "ㄴㅈ", "ㄶ": "ㄴㅎ", "ㄺ": "ㄹㄱ", "ㄻ": "ㄹㅁ", "ㄼ": "ㄹㅂ", "ㄽ": "ㄹㅅ",
+    "ㄾ": "ㄹㅌ", "ㄿ": "ㄹㅍ", "ㅀ": "ㄹㅎ", "ㅄ": "ㅂㅅ", "ㅘ": "ㅗㅏ", "ㅙ": "ㅗㅐ", "ㅚ": "ㅗㅣ",
+    "ㅝ": "ㅜㅓ", "ㅞ": "ㅜㅔ", "ㅟ": "ㅜㅣ", "ㅢ": "ㅡㅣ",
+}
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+def decompose(text: str) -> str:
+    """Hangul syllables (and compound jamo) as a flat compatibility-jamo string."""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if HANGUL_BASE <= code <= HANGUL_LAST:
+            idx = code - HANGUL_BASE
+            out.append(CHOSUNG[idx // 588] + JUNGSUNG[idx % 588 // 28] + JONGSUNG[idx % 28])
+        else:
+            out.append(COMPOUND_JAMO.get(ch, ch))
+    return "".join(out)
+
+
+def chosung(text: str) -> str | None:
+    """Initial consonants of ``text``'s syllables, or None if it has no Hangul syllable."""
+    if not any(HANGUL_BASE <= ord(ch) <= HANGUL_LAST for ch in text):
+        return None
+    return "".join(CHOSUNG[(ord(ch) - HANGUL_BASE) // 588]
+                   if HANGUL_BASE <= ord(ch) <= HANGUL_LAST else ch for ch in text)
+
+
+def _suffixes(chars: list[str]) -> list[str]:
+    return ["".join(chars[i:]) for i in range(len(chars))]
+
+
+def entry_keys(entry: dict) -> set[str]:
+    """Search keys of ``entry``: a query token matches if it is a prefix of one of them."""
+    keys = set()
+    for field in SEARCH_FIELDS:
+        value = normalize(entry.get(field, ""))
+        tokens = value.split()
+        if len(tokens) > 1:
+            tokens.append("".join(tokens))
+        for token in tokens:
+            keys.update(_suffixes([decompose(ch) for ch in token]))
+            initials = chosung(token)
+            if initials:
+                keys.update(_suffixes(list(initials)))
+    keys.discard("")
+    return keys
+
+
+def entries_digest(entries: list[dict]) -> str:
+    """Short hash of the entry order, to pair an index with its leaderboard file."""
+    h = hashlib.sha1()
+    for e in entries:
+        h.update(f"{e['realm']}/{e['name']}\n".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def build_search_index(entries: list[dict]) -> dict:
+    """Sorted prefix keys with posting lists of entry positions, plus sort permutations.
+
+    ``postings[i]`` lists, in ascending order, the positions in ``entries``
+    that have ``keys[i]``. ``order.winrate`` lists positions by winrate,
+    highest first, ties in file order. Entries are already in rating order,
+    so no rating permutation is stored.
+    """
+    postings: dict[str, list[int]] = {}
+    for pos, entry in enumerate(entries):
+        for key in entry_keys(entry):
+            postings.setdefault(key, []).append(pos)
+    keys = sorted(postings)
+    winrate = sorted(range(len(entries)), key=lambda i: -(entries[i].get("winrate") or 0))
+    return {
+        "v": FORMAT_VERSION,
+        "count": len(entries),
+        "digest": entries_digest(entries),
+        "keys": keys,
+        "postings": [postings[k] for k in keys],
+        "order": {"winrate": winrate},
+    }
+
+
+def write_search_index(directory: Path, bracket: str, entries: list[dict]) -> dict:
+    """Write ``<bracket>.search.json`` and its gzip copy; returns the meta.json entry."""
+    directory = Path(directory)
+    name = f"{bracket}.search.json"
+    index = build_search_index(entries)
+    raw = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    for file_name, data in ((name, raw), (f"{name}.gz", gzip.compress(raw, compresslevel=9, mtime=0))):
+        tmp = directory / f"{file_name}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, directory / file_name)
+    return {"file": name, "gzip": f"{name}.gz", "digest": index["digest"], "keys": len(index["keys"])}
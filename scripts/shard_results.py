@@ -0,0 +1,112 @@
+"""Result files of a crawl split over several processes with ``--shard i/N``.
+
+Every shard process resolves the same guild rosters and deduplicates the
+same character list, then keeps only the characters whose
+``fnv1a32(realm/name) % N`` is its own index, so the N shards cover the
+list exactly once without coordinating. Each writes
+``shard-<i>-of-<N>.json.gz`` into the run's shard directory::
+
+    {"v": 1, "shard": 1, "of": 4, "finished_at": "...",
+     "unique": 12345,                        # characters in the whole list
+     "skipped": {"non_arena": 10, "tombstones": 2},
+     "results": [[char, pvp or null], ...],
+     "not_found": [profile URL, ...],        # 404s, for the tombstone index
+     "icons": {key: icon cache entry, ...},  # icon lookups made by the shard
+     "recheck": {"non_arena_recheck_days": 7, ...}}  # intervals the shard ran with
+
+and its run statistics next to it as ``shard-<i>-of-<N>.stats.json``.
+``fetch_leaderboard.py merge`` loads all N files and writes the outputs a
+single-process run would (see fetch_leaderboard.publish()).
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+from pathlib import Path
+
+from character_shards import fnv1a32, shard_key
+
+FORMAT_VERSION = 1
+_NAME = re.compile(r"shard-(\d+)-of-(\d+)\.json\.gz$")
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """``"i/N"`` (1 <= i <= N) as ``(i, N)``; an argparse ``type``."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {spec!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_label(shard: tuple[int, int]) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+
+def owns(shard: tuple[int, int], char: dict) -> bool:
+    """True if ``char`` belongs to ``shard``."""
+    index, count = shard
+    return fnv1a32(shard_key(char["name"], char["realm"])) % count == index - 1
+
+
+def write_result(directory: Path, shard: tuple[int, int], doc: dict) -> Path:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{shard_label(shard)}.json.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    doc = {"v": FORMAT_VERSION, "shard": shard[0], "of": shard[1], **doc}
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+
+def load_results(directory: Path) -> list[dict]:
+    """Every shard's result document in shard order.
+
+    Raises ValueError unless the directory holds exactly one complete set
+    (shards 1..N of a single N); merging a partial set would silently
+    drop characters from the leaderboards.
+    """
+    found = {}
+    for path in Path(directory).glob("shard-*-of-*.json.gz"):
+        m = _NAME.match(path.name)
+        if m:
+            found[(int(m.group(1)), int(m.group(2)))] = path
+    counts = {count for _, count in found}
+    if len(counts) != 1:
+        raise ValueError(f"{directory}: expected the shard files of one run, found "
+                         f"{sorted(shard_label(s) for s in found) or 'none'}")
+    count = counts.pop()
+    missing = [i for i in range(1, count + 1) if (i, count) not in found]
+    if missing:
+        raise ValueError(f"{directory}: missing shard(s) {', '.join(map(str, missing))} of {count}")
+    docs = []
+    for i in range(1, count + 1):
+        with gzip.open(found[(i, count)], "rt", encoding="utf-8") as f:
+            doc = json.load(f)
+        if doc.get("v") != FORMAT_VERSION:
+            raise ValueError(f"{found[(i, count)].name}: unsupported format {doc.get('v')!r}")
+        docs.append(doc)
+    return docs
+
+
+def stats_path(directory: Path, shard: tuple[int, int]) -> Path:
+    """Where a shard process writes its run statistics (merged into _run_stats.json)."""
+    return Path(directory) / f"{shard_label(shard)}.stats.json"
+
+
+def load_stats(directory: Path) -> list[dict]:
+    """The run statistics the shards of ``directory`` wrote, in shard order."""
+    stats = []
+    for path in Path(directory).glob("shard-*-of-*.stats.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stats.append((int(path.name.split("-")[1]), json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return [doc for _, doc in sorted(stats, key=lambda s: s[0])]
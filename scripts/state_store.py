@@ -0,0 +1,685 @@
+"""SQLite store for pipeline state: characters, sources, pending additions and icon names.
+
+The JSON files the site and the workflows commit stay the published
+artifacts, but the scripts read and write state through this store:
+
+    data/all_characters.json  <- characters, bracket_stats, spec_groups,
+                                 spec_trees, talents, equipment
+    data/_icon_cache.json     <- icon_mappings
+    config/sources.json       <- sources
+    config/_added.json        <- pending
+
+plus cache-only tables with no file (submission verification results).
+The database lives in ``.cache/`` and is not committed. Every time it
+writes or reads one of the files it records the file's SHA-1, and
+opening the store re-imports any file whose content no longer matches
+(a missing or stale database, a hand-edited sources.json, a data commit
+from another workflow). export() rewrites a file only when its bytes
+change.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import textwrap
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATE_DB_PATH = BASE_DIR / ".cache" / "state.sqlite3"
+DATA_DIR = BASE_DIR / "data"
+CONFIG_DIR = BASE_DIR / "config"
+
+SCHEMA_VERSION = 1
+ICON_CACHE_VERSION = 2
+SOURCE_KINDS = {"realms": "realm", "guilds": "guild", "characters": "character"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+  name TEXT PRIMARY KEY,
+  digest TEXT
+);
+
+CREATE TABLE IF NOT EXISTS characters (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  digest TEXT NOT NULL,
+  name TEXT NOT NULL,
+  realm_name TEXT,
+  level INTEGER,
+  class TEXT,
+  race TEXT,
+  faction TEXT,
+  guild TEXT,
+  details_at TEXT,
+  avatar TEXT,
+  has_spec_groups INTEGER NOT NULL DEFAULT 0,
+  has_equipment INTEGER NOT NULL DEFAULT 0,
+  extra TEXT,
+  PRIMARY KEY (realm, name_key)
+);
+CREATE INDEX IF NOT EXISTS idx_characters_position ON characters(position);
+CREATE INDEX IF NOT EXISTS idx_characters_guild ON characters(realm, guild);
+
+CREATE TABLE IF NOT EXISTS bracket_stats (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  bracket TEXT NOT NULL,
+  rating INTEGER NOT NULL DEFAULT 0,
+  won INTEGER NOT NULL DEFAULT 0,
+  lost INTEGER NOT NULL DEFAULT 0,
+  played INTEGER NOT NULL DEFAULT 0,
+  season_id INTEGER,
+  PRIMARY KEY (realm, name_key, bracket),
+  FOREIGN KEY (realm, name_key) REFERENCES characters ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_bracket_stats_rating ON bracket_stats(bracket, rating DESC);
+
+CREATE TABLE IF NOT EXISTS spec_groups (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  grp INTEGER NOT NULL,
+  active INTEGER NOT NULL,
+  PRIMARY KEY (realm, name_key, grp),
+  FOREIGN KEY (realm, name_key) REFERENCES characters ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS spec_trees (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  grp INTEGER NOT NULL,
+  tree INTEGER NOT NULL,
+  name TEXT,
+  points INTEGER,
+  PRIMARY KEY (realm, name_key, grp, tree),
+  FOREIGN KEY (realm, name_key) REFERENCES characters ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS talents (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  grp INTEGER NOT NULL,
+  tree INTEGER NOT NULL,
+  pos INTEGER NOT NULL,
+  name TEXT,
+  rank INTEGER,
+  spell_id INTEGER,
+  icon TEXT,
+  PRIMARY KEY (realm, name_key, grp, tree, pos),
+  FOREIGN KEY (realm, name_key) REFERENCES characters ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_talents_spell ON talents(spell_id);
+
+CREATE TABLE IF NOT EXISTS equipment (
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  pos INTEGER NOT NULL,
+  slot TEXT,
+  slot_type TEXT,
+  name TEXT,
+  quality TEXT,
+  quality_type TEXT,
+  item_id INTEGER,
+  enchants TEXT,
+  icon TEXT,
+  PRIMARY KEY (realm, name_key, pos),
+  FOREIGN KEY (realm, name_key) REFERENCES characters ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_equipment_item ON equipment(item_id);
+
+CREATE TABLE IF NOT EXISTS icon_mappings (
+  key TEXT PRIMARY KEY,
+  icon TEXT NOT NULL,
+  at TEXT,
+  fails INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+  kind TEXT NOT NULL,
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  name TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  PRIMARY KEY (kind, realm, name_key)
+);
+
+CREATE TABLE IF NOT EXISTS pending (
+  kind TEXT NOT NULL,
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  name TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  PRIMARY KEY (kind, realm, name_key)
+);
+
+CREATE TABLE IF NOT EXISTS verifications (
+  kind TEXT NOT NULL,
+  realm TEXT NOT NULL,
+  name_key TEXT NOT NULL,
+  found INTEGER NOT NULL,
+  guild TEXT,
+  checked_at TEXT NOT NULL,
+  PRIMARY KEY (kind, realm, name_key)
+);
+"""
+
+CHARACTER_FIELDS = ("name", "realm", "realm_name", "level", "class", "race", "faction", "guild")
+KNOWN_KEYS = set(CHARACTER_FIELDS) | {"brackets", "details_at", "spec_groups", "equipment", "avatar"}
+EQUIPMENT_FIELDS = ("slot", "slot_type", "name", "quality", "quality_type", "item_id")
+CHILD_TABLES = ("bracket_stats", "spec_groups", "spec_trees", "talents", "equipment")
+
+
+def character_digest(char: dict) -> str:
+    public = {k: v for k, v in char.items() if not k.startswith("_")}
+    raw = json.dumps(public, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _file_digest(path: Path) -> str | None:
+    try:
+        return hashlib.sha1(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _character_rows(char: dict, position: int) -> dict[str, list[tuple]]:
+    """Rows of every table for one all_characters.json record."""
+    key = (char["realm"], char["name"].lower())
+    extra = {k: v for k, v in char.items() if k not in KNOWN_KEYS and not k.startswith("_")}
+    rows = {t: [] for t in ("characters",) + CHILD_TABLES}
+    rows["characters"].append(key + (
+        position, character_digest(char), char["name"], char.get("realm_name"), char.get("level"),
+        char.get("class"), char.get("race"), char.get("faction"), char.get("guild"),
+        char.get("details_at"), char.get("avatar"),
+        int("spec_groups" in char), int("equipment" in char),
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+    ))
+    for bracket, b in char.get("brackets", {}).items():
+        rows["bracket_stats"].append(key + (bracket, b.get("rating", 0), b.get("won", 0),
+                                            b.get("lost", 0), b.get("played", 0), b.get("season_id")))
+    for g, group in enumerate(char.get("spec_groups", [])):
+        rows["spec_groups"].append(key + (g, int(bool(group.get("active")))))
+        for t, tree in enumerate(group.get("trees", [])):
+            rows["spec_trees"].append(key + (g, t, tree.get("name"), tree.get("points")))
+            for p, talent in enumerate(tree.get("talents", [])):
+                rows["talents"].append(key + (g, t, p, talent.get("name"), talent.get("rank"),
+                                              talent.get("spell_id"), talent.get("icon")))
+    for p, eq in enumerate(char.get("equipment", [])):
+        enchants = eq.get("enchants")
+        rows["equipment"].append(key + (p,) + tuple(eq.get(f) for f in EQUIPMENT_FIELDS) + (
+            json.dumps(enchants, ensure_ascii=False) if enchants else None, eq.get("icon")))
+    return rows
+
+
+def _grouped(cursor) -> Iterator[tuple[int, list]]:
+    """(character position, rows) from a cursor whose first column is the position."""
+    for position, rows in itertools.groupby(cursor, key=lambda r: r[0]):
+        yield position, list(rows)
+
+
+class _Lookahead:
+    def __init__(self, groups: Iterator[tuple[int, list]]):
+        self._groups = groups
+        self._head = next(groups, None)
+
+    def take(self, position: int) -> list:
+        """Rows for ``position``; positions must be asked for in ascending order."""
+        while self._head is not None and self._head[0] < position:
+            self._head = next(self._groups, None)
+        if self._head is not None and self._head[0] == position:
+            rows = self._head[1]
+            self._head = next(self._groups, None)
+            return rows
+        return []
+
+
+class StateStore:
+    """The pipeline's state in one SQLite file, synced with its JSON artifacts.
+
+    Opening the store imports any artifact whose file changed since the
+    store last wrote or read it. Writes go to the database; call export()
+    to refresh the JSON files.
+    """
+
+    def __init__(self, path: Path = STATE_DB_PATH, data_dir: Path = DATA_DIR,
+                 config_dir: Path = CONFIG_DIR):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.files = {
+            "all_characters": Path(data_dir) / "all_characters.json",
+            "icon_cache": Path(data_dir) / "_icon_cache.json",
+            "sources": Path(config_dir) / "sources.json",
+            "added": Path(config_dir) / "_added.json",
+        }
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            self._drop_all()
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.imported = self.sync_from_files()
+
+    def _drop_all(self):
+        tables = [r[0] for r in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        self.db.execute("PRAGMA foreign_keys = OFF")
+        for table in tables:
+            self.db.execute(f"DROP TABLE IF EXISTS {table}")
+        self.db.execute("PRAGMA foreign_keys = ON")
+
+    def close(self):
+        self.db.close()
+
+    # -- artifacts -------------------------------------------------------
+
+    def _recorded_digest(self, name: str) -> str | None:
+        row = self.db.execute("SELECT digest FROM artifacts WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _record_digest(self, name: str, digest: str | None):
+        self.db.execute("INSERT INTO artifacts (name, digest) VALUES (?, ?) "
+                        "ON CONFLICT (name) DO UPDATE SET digest = excluded.digest", (name, digest))
+
+    def sync_from_files(self) -> list[str]:
+        """Import every artifact whose file differs from what the store last saw; returns their names."""
+        imported = []
+        importers = {"all_characters": self._import_characters, "icon_cache": self._import_icon_cache,
+                     "sources": self._import_sources, "added": self._import_pending}
+        for name, path in self.files.items():
+            digest = _file_digest(path)
+            if digest == self._recorded_digest(name):
+                continue
+            data = None
+            if digest is not None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except ValueError:
+                    print(f"  [WARN] {path.name}: not valid JSON, keeping the stored state")
+                    continue
+            with self.db:
+                importers[name](data)
+                self._record_digest(name, digest)
+            imported.append(name)
+        if imported:
+            print(f"State store: imported {', '.join(imported)}")
+        return imported
+
+    def export(self, *names: str) -> list[str]:
+        """Rewrite the named artifacts (all by default) whose content changed; returns the rewritten."""
+        exporters = {"all_characters": self._export_characters, "icon_cache": self._export_icon_cache,
+                     "sources": self._export_sources, "added": self._export_pending}
+        written = []
+        for name in names or tuple(self.files):
+            path = self.files[name]
+            chunks = exporters[name]()
+            if chunks is None:
+                if path.exists():
+                    path.unlink()
+                    written.append(name)
+                with self.db:
+                    self._record_digest(name, None)
+                continue
+            tmp = path.with_name(path.name + ".tmp")
+            h = hashlib.sha1()
+            with open(tmp, "w", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    h.update(chunk.encode("utf-8"))
+            digest = h.hexdigest()
+            if digest == _file_digest(path):
+                tmp.unlink()
+            else:
+                os.replace(tmp, path)
+                written.append(name)
+            with self.db:
+                self._record_digest(name, digest)
+        return written
+
+    # -- characters ------------------------------------------------------
+
+    def _insert_character_rows(self, rows: dict[str, list[tuple]]):
+        for table, values in rows.items():
+            if values:
+                marks = ", ".join("?" * len(values[0]))
+                self.db.executemany(f"INSERT INTO {table} VALUES ({marks})", values)
+
+    def _import_characters(self, data: list | None):
+        self.db.execute("DELETE FROM characters")
+        for position, char in enumerate(data or []):
+            self._insert_character_rows(_character_rows(char, position))
+
+    def replace_characters(self, characters: list[dict]) -> dict[str, int]:
+        """Make the stored characters exactly ``characters``, in that order.
+
+        Only characters whose record changed are rewritten; the rest just
+        get their new position. Returns counts of inserted/updated/
+        unchanged/deleted characters.
+        """
+        stored = {(r[0], r[1]): (r[2], r[3]) for r in
+                  self.db.execute("SELECT realm, name_key, digest, position FROM characters")}
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        seen = set()
+        with self.db:
+            for position, char in enumerate(characters):
+                key = (char["realm"], char["name"].lower())
+                if key in seen:
+                    continue
+                seen.add(key)
+                old = stored.get(key)
+                digest = character_digest(char)
+                if old and old[0] == digest:
+                    self.db.execute("UPDATE characters SET position = ? WHERE realm = ? AND name_key = ?",
+                                    (position,) + key)
+                    counts["unchanged"] += 1
+                    continue
+                if old:
+                    self.db.execute("DELETE FROM characters WHERE realm = ? AND name_key = ?", key)
+                self._insert_character_rows(_character_rows(char, position))
+                counts["updated" if old else "inserted"] += 1
+            gone = [k for k in stored if k not in seen]
+            self.db.executemany("DELETE FROM characters WHERE realm = ? AND name_key = ?", gone)
+            counts["deleted"] = len(gone)
+        return counts
+
+    def add_characters(self, characters: Iterable[dict]) -> int:
+        """Append the characters that aren't stored yet; returns how many were added."""
+        added = 0
+        with self.db:
+            position = self.db.execute("SELECT COALESCE(MAX(position), -1) FROM characters").fetchone()[0]
+            for char in characters:
+                key = (char["realm"], char["name"].lower())
+                if self.db.execute("SELECT 1 FROM characters WHERE realm = ? AND name_key = ?",
+                                   key).fetchone():
+                    continue
+                position += 1
+                self._insert_character_rows(_character_rows(char, position))
+                added += 1
+        return added
+
+    def character_guilds(self, realms: Iterable[str]) -> dict[tuple[str, str], str]:
+        """(realm, lower-cased name) -> guild of every stored character on ``realms``."""
+        realms = list(realms)
+        marks = ", ".join("?" * len(realms))
+        return {(r, n): g or "" for r, n, g in self.db.execute(
+            f"SELECT realm, name_key, guild FROM characters WHERE realm IN ({marks})", realms)}
+
+    def character_keys(self) -> set[tuple[str, str]]:
+        """(lower-cased name, realm) of every stored character, like fetch_leaderboard.character_key()."""
+        return {(n, r) for r, n in self.db.execute("SELECT realm, name_key FROM characters")}
+
+    def count_characters(self, with_brackets: bool = False) -> int:
+        if with_brackets:
+            sql = "SELECT COUNT(DISTINCT realm || '/' || name_key) FROM bracket_stats"
+        else:
+            sql = "SELECT COUNT(*) FROM characters"
+        return self.db.execute(sql).fetchone()[0]
+
+    def _brackets_by_position(self) -> _Lookahead:
+        return _Lookahead(_grouped(self.db.execute(
+            "SELECT c.position, b.bracket, b.rating, b.won, b.lost, b.played, b.season_id "
+            "FROM bracket_stats b JOIN characters c USING (realm, name_key) "
+            "ORDER BY c.position, b.bracket")))
+
+    @staticmethod
+    def _brackets(rows: list) -> dict:
+        return {r[1]: {"rating": r[2], "won": r[3], "lost": r[4], "played": r[5], "season_id": r[6]}
+                for r in rows}
+
+    def leaderboard_characters(self) -> list[dict]:
+        """Identity fields and bracket stats of every character: all build_leaderboards() needs."""
+        brackets = self._brackets_by_position()
+        out = []
+        for row in self.db.execute(
+                "SELECT position, name, realm, realm_name, class, race, faction, guild "
+                "FROM characters ORDER BY position"):
+            char = dict(zip(("name", "realm", "realm_name", "class", "race", "faction", "guild"), row[1:]))
+            char["brackets"] = self._brackets(brackets.take(row[0]))
+            out.append(char)
+        return out
+
+    def equipment_icon_counts(self) -> dict[str, dict[str, int]]:
+        """{class: {equipment icon path: characters wearing it}} over every stored character."""
+        counts: dict[str, dict[str, int]] = {}
+        for cls, icon, n in self.db.execute(
+                "SELECT c.class, e.icon, COUNT(DISTINCT c.position) FROM equipment e "
+                "JOIN characters c USING (realm, name_key) WHERE e.icon IS NOT NULL "
+                "GROUP BY c.class, e.icon ORDER BY c.class, e.icon"):
+            counts.setdefault(cls, {})[icon] = n
+        return counts
+
+    def characters(self) -> Iterator[dict]:
+        """Full all_characters.json records, in stored order.
+
+        Each child table is read once, ordered by character position, and
+        merged in step with the characters.
+        """
+        def by_position(sql: str) -> _Lookahead:
+            return _Lookahead(_grouped(self.db.execute(sql)))
+
+        brackets = self._brackets_by_position()
+        groups = by_position("SELECT c.position, s.grp, s.active FROM spec_groups s "
+                             "JOIN characters c USING (realm, name_key) ORDER BY c.position, s.grp")
+        trees = by_position("SELECT c.position, t.grp, t.tree, t.name, t.points FROM spec_trees t "
+                            "JOIN characters c USING (realm, name_key) "
+                            "ORDER BY c.position, t.grp, t.tree")
+        talents = by_position("SELECT c.position, t.grp, t.tree, t.name, t.rank, t.spell_id, t.icon "
+                              "FROM talents t JOIN characters c USING (realm, name_key) "
+                              "ORDER BY c.position, t.grp, t.tree, t.pos")
+        equipment = by_position("SELECT c.position, e.slot, e.slot_type, e.name, e.quality, "
+                                "e.quality_type, e.item_id, e.enchants, e.icon FROM equipment e "
+                                "JOIN characters c USING (realm, name_key) ORDER BY c.position, e.pos")
+        cursor = self.db.execute(
+            "SELECT position, name, realm, realm_name, level, class, race, faction, guild, "
+            "details_at, avatar, has_spec_groups, has_equipment, extra FROM characters ORDER BY position")
+        for row in cursor:
+            position = row[0]
+            char = dict(zip(CHARACTER_FIELDS, row[1:9]))
+            char["brackets"] = self._brackets(brackets.take(position))
+            if row[9] is not None:
+                char["details_at"] = row[9]
+            if row[11]:
+                tree_rows = trees.take(position)
+                talent_rows = talents.take(position)
+                spec_groups = []
+                for g in groups.take(position):
+                    group_trees = []
+                    for t in (t for t in tree_rows if t[1] == g[1]):
+                        entries = []
+                        for r in talent_rows:
+                            if r[1] == g[1] and r[2] == t[2]:
+                                talent = {"name": r[3], "rank": r[4], "spell_id": r[5]}
+                                if r[6] is not None:
+                                    talent["icon"] = r[6]
+                                entries.append(talent)
+                        group_trees.append({"name": t[3], "points": t[4], "talents": entries})
+                    spec_groups.append({"active": bool(g[2]), "trees": group_trees})
+                char["spec_groups"] = spec_groups
+            if row[12]:
+                items = []
+                for r in equipment.take(position):
+                    item = dict(zip(EQUIPMENT_FIELDS, r[1:7]))
+                    if r[7] is not None:
+                        item["enchants"] = json.loads(r[7])
+                    if r[8] is not None:
+                        item["icon"] = r[8]
+                    items.append(item)
+                char["equipment"] = items
+            if row[10] is not None:
+                char["avatar"] = row[10]
+            if row[13]:
+                char.update(json.loads(row[13]))
+            yield char
+
+    def _export_characters(self) -> Iterator[str]:
+        # Same bytes as json.dump(characters, f, ensure_ascii=False, indent=2),
+        # one record at a time.
+        first = True
+        for char in self.characters():
+            body = textwrap.indent(json.dumps(char, ensure_ascii=False, indent=2), "  ")
+            yield ("[\n" if first else ",\n") + body
+            first = False
+        yield "[]" if first else "\n]"
+
+    # -- icon names ------------------------------------------------------
+
+    def _import_icon_cache(self, data: dict | None):
+        self.db.execute("DELETE FROM icon_mappings")
+        data = data or {}
+        if data.get("v") == ICON_CACHE_VERSION:
+            self.set_meta("icon_namespace", data.get("namespace"))
+            entries = data.get("entries", {})
+        else:
+            # Version 1: a flat {key: icon name or ""}; empty names are due for a retry.
+            at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            entries = {k: ({"icon": v, "at": at} if v else {"icon": "", "at": None, "fails": 1})
+                       for k, v in data.items() if isinstance(v, str)}
+        self._upsert_icons(entries)
+
+    def icon_entries(self) -> dict[str, dict]:
+        out = {}
+        for key, icon, at, fails in self.db.execute("SELECT key, icon, at, fails FROM icon_mappings"):
+            entry = {"icon": icon, "at": at}
+            if fails is not None:
+                entry["fails"] = fails
+            out[key] = entry
+        return out
+
+    def _upsert_icons(self, entries: dict[str, dict]):
+        self.db.executemany(
+            "INSERT INTO icon_mappings (key, icon, at, fails) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET icon = excluded.icon, at = excluded.at, "
+            "fails = excluded.fails",
+            [(k, e["icon"], e.get("at"), e.get("fails")) for k, e in entries.items()])
+
+    def icon_namespace(self) -> str | None:
+        """Static namespace the stored item icon names were looked up in."""
+        return self.get_meta("icon_namespace")
+
+    def save_icons(self, entries: dict[str, dict], namespace: str, delete: Iterable[str] = ()):
+        """Upsert icon entries, drop the ``delete`` keys and record their namespace."""
+        with self.db:
+            self.db.executemany("DELETE FROM icon_mappings WHERE key = ?", [(k,) for k in delete])
+            self._upsert_icons(entries)
+            self.set_meta("icon_namespace", namespace)
+
+    def _export_icon_cache(self) -> Iterator[str]:
+        doc = {"v": ICON_CACHE_VERSION, "namespace": self.icon_namespace(),
+               "entries": self.icon_entries()}
+        yield json.dumps(doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+    def get_meta(self, key: str) -> str | None:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str | None):
+        self.db.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # -- sources and pending additions ------------------------------------
+
+    def _import_entries(self, table: str, data: dict | None):
+        """Replace ``table`` with the entries of ``data``; repeats (names compared case-insensitively)
+        keep their first occurrence and are reported, as exporting the table will leave them out."""
+        self.db.execute(f"DELETE FROM {table}")
+        rows, seen, duplicates = [], set(), []
+        for section, kind in SOURCE_KINDS.items():
+            for entry in (data or {}).get(section, []):
+                if kind == "realm":
+                    row = (kind, entry, entry, entry, len(rows))
+                else:
+                    row = (kind, entry["realm"], entry["name"].lower(), entry["name"], len(rows))
+                if row[:3] in seen:
+                    duplicates.append(f"{kind} {row[3]} ({row[1]})" if kind != "realm" else f"realm {row[1]}")
+                    continue
+                seen.add(row[:3])
+                rows.append(row)
+        self.db.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)", rows)
+        if duplicates:
+            print(f"  [WARN] {table}: skipped {len(duplicates)} duplicate entries, "
+                  f"dropped when the file is next written: {', '.join(duplicates)}")
+
+    def _entries(self, table: str, sections=tuple(SOURCE_KINDS)) -> dict:
+        out = {s: [] for s in sections}
+        names = {kind: section for section, kind in SOURCE_KINDS.items()}
+        for kind, realm, name in self.db.execute(
+                f"SELECT kind, realm, name FROM {table} ORDER BY position"):
+            section = names[kind]
+            if section in out:
+                out[section].append(name if kind == "realm" else {"name": name, "realm": realm})
+        return out
+
+    def _add_entries(self, table: str, kind: str, entries: Iterable[dict]) -> list[dict]:
+        added = []
+        with self.db:
+            position = self.db.execute(f"SELECT COALESCE(MAX(position), -1) FROM {table}").fetchone()[0]
+            for entry in entries:
+                position += 1
+                cur = self.db.execute(f"INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?, ?)",
+                                      (kind, entry["realm"], entry["name"].lower(), entry["name"],
+                                       position))
+                if cur.rowcount:
+                    added.append(entry)
+        return added
+
+    def _import_sources(self, data: dict | None):
+        self._import_entries("sources", data)
+
+    def sources(self) -> dict:
+        """sources.json as a dict: {"realms": [...], "guilds": [...], "characters": [...]}."""
+        return self._entries("sources")
+
+    def add_sources(self, kind: str, entries: Iterable[dict]) -> list[dict]:
+        """Add ``guild`` or ``character`` sources not listed yet (case-insensitive); returns the added."""
+        return self._add_entries("sources", kind, entries)
+
+    def _export_sources(self) -> Iterator[str]:
+        yield json.dumps(self.sources(), ensure_ascii=False, indent=2)
+
+    def _import_pending(self, data: dict | None):
+        self._import_entries("pending", data)
+
+    def pending(self) -> dict:
+        """_added.json as a dict: {"guilds": [...], "characters": [...]}."""
+        return self._entries("pending", ("guilds", "characters"))
+
+    def set_pending(self, entries: dict):
+        with self.db:
+            self._import_entries("pending", entries)
+
+    def clear_pending(self):
+        with self.db:
+            self.db.execute("DELETE FROM pending")
+
+    def _export_pending(self) -> Iterator[str] | None:
+        pending = self.pending()
+        if not pending["guilds"] and not pending["characters"]:
+            return None
+        return iter([json.dumps(pending, ensure_ascii=False, indent=2)])
+
+    # -- submission verification cache -------------------------------------
+
+    def verifications(self) -> dict[tuple[str, str, str], tuple[bool, str, str]]:
+        """(kind, realm, lower-cased name) -> (found, guild, checked_at ISO time)."""
+        return {(k, r, n): (bool(f), g or "", at) for k, r, n, f, g, at in self.db.execute(
+            "SELECT kind, realm, name_key, found, guild, checked_at FROM verifications")}
+
+    def record_verifications(self, rows: Iterable[tuple[str, str, str, bool, str, str]]):
+        """Upsert (kind, realm, name, found, guild, checked_at) verification results."""
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO verifications VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, realm, name_key) DO UPDATE SET found = excluded.found, "
+                "guild = excluded.guild, checked_at = excluded.checked_at",
+                [(k, r, n.lower(), int(f), g, at) for k, r, n, f, g, at in rows])
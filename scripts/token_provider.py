@@ -0,0 +1,89 @@
+"""Battle.net client-credentials token, shared between scripts through a disk cache."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+TOKEN_CACHE_PATH = Path(__file__).resolve().parent.parent / ".cache" / "oauth_token.json"
+# Refresh this long before the token's stated expiry.
+REFRESH_MARGIN = 300
+
+
+class TokenProvider:
+    """The current access token for one client, refreshed before it expires.
+
+    The token and its expiry are written to ``cache_path`` (readable by the
+    owner only, never committed or uploaded), so scripts run one after
+    another in the same job reuse it instead of each requesting their own.
+    Requests that get a 401 call ``refresh(failed)``: the first caller with
+    that token fetches a new one, concurrent callers reuse it.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, oauth_url: str,
+                 cache_path: Path = TOKEN_CACHE_PATH):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.oauth_url = oauth_url
+        self.cache_path = Path(cache_path)
+        # Cached tokens are only reused for the same client and endpoint.
+        self._owner = hashlib.sha1(f"{oauth_url}\n{client_id}".encode("utf-8")).hexdigest()
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self.refreshes = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("owner") == self._owner and cached.get("access_token"):
+            self._token = cached["access_token"]
+            self._expires_at = float(cached.get("expires_at", 0))
+
+    def _save(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"owner": self._owner, "access_token": self._token,
+                           "expires_at": self._expires_at}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"  [WARN] Could not cache the OAuth token: {e}")
+
+    def _fetch(self):
+        resp = requests.post(self.oauth_url, data={"grant_type": "client_credentials"},
+                             auth=(self.client_id, self.client_secret), timeout=30)
+        resp.raise_for_status()
+        body = resp.json()
+        self._token = body["access_token"]
+        self._expires_at = time.time() + float(body.get("expires_in", 0))
+        self.refreshes += 1
+        self._save()
+
+    def token(self) -> str:
+        """A token valid for at least REFRESH_MARGIN more seconds."""
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_at - REFRESH_MARGIN:
+                self._fetch()
+            return self._token
+
+    def refresh(self, failed: str) -> str:
+        """A new token after ``failed`` was rejected; a no-op if another thread already replaced it."""
+        with self._lock:
+            if self._token == failed:
+                self._fetch()
+            return self._token
+
+    @property
+    def expires_in(self) -> float:
+        return max(self._expires_at - time.time(), 0.0)
@@ -0,0 +1,36 @@
+-- Fast path for "latest rating per character per bracket".
+--
+-- Replaces the correlated ORDER BY ... LIMIT 1 subquery in leaderboard_latest
+-- with DISTINCT ON over an index ordered by (character_id, bracket,
+-- recorded_at DESC). The old (character_id, bracket) index is a prefix of the
+-- new one and is dropped.
+
+CREATE INDEX IF NOT EXISTS idx_snapshots_latest
+  ON rating_snapshots(character_id, bracket, recorded_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_snapshots_char_bracket;
+
+CREATE OR REPLACE VIEW leaderboard_latest AS
+SELECT
+  c.id AS character_id,
+  c.name,
+  c.realm,
+  c.class,
+  c.race,
+  c.faction,
+  c.guild,
+  rs.bracket,
+  rs.rating,
+  rs.won,
+  rs.lost,
+  rs.played,
+  rs.recorded_at
+FROM characters c
+JOIN (
+  SELECT DISTINCT ON (character_id, bracket)
+    character_id, bracket, rating, won, lost, played, recorded_at
+  FROM rating_snapshots
+  ORDER BY character_id, bracket, recorded_at DESC, id DESC
+) rs ON rs.character_id = c.id;
+
+ANALYZE rating_snapshots;
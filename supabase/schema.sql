@@ -23,8 +23,9 @@ CREATE TABLE IF NOT EXISTS rating_snapshots (
   recorded_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_snapshots_char_bracket
-  ON rating_snapshots(character_id, bracket);
+-- Serves "latest snapshot per (character, bracket)" as an index-ordered scan
+CREATE INDEX IF NOT EXISTS idx_snapshots_latest
+  ON rating_snapshots(character_id, bracket, recorded_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_snapshots_recorded
   ON rating_snapshots(recorded_at);
 
@@ -47,6 +48,9 @@ CREATE POLICY "Service insert snapshots"
   ON rating_snapshots FOR INSERT TO service_role WITH CHECK (true);
 
 -- View: latest rating per character per bracket
+-- DISTINCT ON walks idx_snapshots_latest once instead of running a sorted
+-- subquery per snapshot row; filters on character_id / bracket are pushed
+-- down into the subquery.
 CREATE OR REPLACE VIEW leaderboard_latest AS
 SELECT
   c.id AS character_id,
@@ -63,11 +67,9 @@ SELECT
   rs.played,
   rs.recorded_at
 FROM characters c
-JOIN rating_snapshots rs ON rs.character_id = c.id
-WHERE rs.id = (
-  SELECT rs2.id
-  FROM rating_snapshots rs2
-  WHERE rs2.character_id = c.id AND rs2.bracket = rs.bracket
-  ORDER BY rs2.recorded_at DESC
-  LIMIT 1
-);
+JOIN (
+  SELECT DISTINCT ON (character_id, bracket)
+    character_id, bracket, rating, won, lost, played, recorded_at
+  FROM rating_snapshots
+  ORDER BY character_id, bracket, recorded_at DESC, id DESC
+) rs ON rs.character_id = c.id;
@@ -0,0 +1,78 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import search_index as si  # noqa: E402
+
+ENTRIES = [
+    {"name": "홍길동", "guild": "달빛 기사단", "class": "전사", "realm_name": "펜구스의 흉포"},
+    {"name": "Arthas", "guild": "Knights of the Ebon Blade", "class": "죽음의 기사", "realm_name": "Moldar"},
+    {"name": "괢똙", "guild": "", "class": "사제", "realm_name": "몰다르의 투지"},
+    {"name": "ÉLISE", "guild": "les Cœurs", "class": "마법사", "realm_name": ""},
+]
+QUERIES = ["길동", "길도", "ㄱㄷ", "기사", "빛 기", "RTHA", "ebon", "놬", "ㄸ", "élise", "cœurs", "흉포 전"]
+
+# Pulls the search functions out of app.js and runs them on stdin's JSON.
+HARNESS = """
+const src = require("fs").readFileSync(process.argv[1], "utf8");
+function grab(pattern) {
+  const start = src.indexOf(pattern);
+  if (start < 0) throw new Error(pattern);
+  if (pattern.startsWith("var ")) return src.slice(start, src.indexOf(";", start) + 1);
+  let depth = 0;
+  for (let k = src.indexOf("{", start); ; k++) {
+    if (src[k] === "{") depth++;
+    else if (src[k] === "}" && --depth === 0) return src.slice(start, k + 1);
+  }
+}
+const names = ["var CHOSUNG", "var JUNGSUNG", "var JONGSUNG", "var COMPOUND_JAMO", "var SEARCH_FIELDS",
+  "function decomposeJamo(", "function chosungOf(", "function addSuffixes(", "function entryKeys(",
+  "function queryTokens(", "function lowerBound(", "function lookupPrefix(", "function intersectSorted(",
+  "function searchIds("];
+eval(names.map(grab).join("\\n") + "\\nvar scanKeys = new WeakMap(); var state = {sort: {}};\\n" +
+     grab("function filterByScan("));
+const input = JSON.parse(require("fs").readFileSync(0, "utf8"));
+process.stdout.write(JSON.stringify({
+  keys: input.entries.map(e => entryKeys(e).sort()),
+  queries: input.queries.map(queryTokens),
+  index: input.queries.map(q => searchIds(input.index, q)),
+  scan: input.queries.map(q => filterByScan(input.entries, q).map(e => input.entries.indexOf(e))),
+}));
+"""
+
+
+@pytest.fixture(scope="module")
+def js():
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node not installed")
+    payload = {"entries": ENTRIES, "queries": QUERIES, "index": si.build_search_index(
+        [dict(e, realm="r", winrate=0) for e in ENTRIES])}
+    proc = subprocess.run([node, "-e", HARNESS, str(ROOT / "app.js")], input=json.dumps(payload),
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def test_entry_keys_match_app_js(js):
+    assert js["keys"] == [sorted(si.entry_keys(e)) for e in ENTRIES]
+
+
+def test_query_decomposition_matches_index_keys(js):
+    expected = [[si.decompose(t) for t in si.normalize(q).split()] for q in QUERIES]
+    assert js["queries"] == expected
+
+
+def test_index_and_scan_find_the_same_entries(js):
+    assert js["index"] == js["scan"]
+    found = dict(zip(QUERIES, js["scan"]))
+    assert found["길도"] == [0]
+    assert found["기사"] == [0, 1]
+    assert found["RTHA"] == [1]
+    assert found["ㄱㄷ"] == [0]
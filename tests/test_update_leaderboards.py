@@ -0,0 +1,44 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import fetch_leaderboard as fl  # noqa: E402
+
+
+def character(name, rating):
+    return {"name": name, "realm": "azshara", "brackets": {"3v3": {"rating": rating, "won": 1, "lost": 1, "played": 2}}}
+
+
+def write_bracket(data_dir, characters):
+    entries = fl.build_entries(characters, "3v3")
+    with open(data_dir / "3v3.json", "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    return entries
+
+
+def test_rank_change_is_measured_against_the_merged_leaderboard(tmp_path, monkeypatch):
+    monkeypatch.setattr(fl, "DATA_DIR", tmp_path)
+    others = [character(f"c{i}", 2500 - i * 10) for i in range(9)]
+    write_bracket(tmp_path, [*others, character("climber", 2000)])
+
+    merged = fl.update_leaderboards([character("climber", 2495)], ["3v3"])["3v3"]
+
+    climber = next(e for e in merged if e["name"] == "climber")
+    assert climber["rank"] == 2
+    assert climber["rd"] == 495
+    assert climber["rkd"] == 8
+    assert [e["rank"] for e in merged] == list(range(1, 11))
+    assert all("rkd" not in e for e in merged if e["name"] != "climber")
+
+
+def test_unchanged_character_has_no_change_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(fl, "DATA_DIR", tmp_path)
+    chars = [character(f"c{i}", 2500 - i * 10) for i in range(5)]
+    write_bracket(tmp_path, chars)
+
+    merged = fl.update_leaderboards([chars[3]], ["3v3"])["3v3"]
+
+    assert merged[3]["name"] == "c3"
+    assert "rd" not in merged[3] and "rkd" not in merged[3]